@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from logger import logger
+
+# File in the user data directory holding the statistics.
+ACCESS_STATS_FILENAME = "access_stats.json"
+
+# An access counts half as much after this many seconds.
+HALF_LIFE = 14 * 24 * 3600.0
+
+# Entries whose decayed score falls below this are dropped when saving.
+MIN_SCORE = 0.05
+
+# At most this many distinct queries are kept, the highest scoring first. In memory
+# they are trimmed back to this many whenever twice as many have accumulated.
+MAX_QUERIES = 200
+
+
+class AccessStats:
+    """
+    Counts how often each collection is opened and each query is run, with exponential decay.
+
+    Every access adds 1 to a score that halves every `half_life` seconds, so the
+    ranking follows what the user does lately. Only a score and a timestamp are
+    kept per entry, updated in O(1) on every access, and at most twice
+    MAX_QUERIES queries are held. Queries are (kind, text) pairs such as
+    ("fuzzy", "hary poter") or ("query", '{"category": "book"}').
+    """
+
+    def __init__(self, filename: str, half_life: float = HALF_LIFE, clock: Callable[[], float] = time.time) -> None:
+        """
+        Initialize empty statistics; call load() to read saved ones.
+
+        Args:
+            filename (str): The JSON file the statistics are saved to.
+            half_life (float): Seconds after which an access counts half as much.
+            clock (Callable[[], float]): Returns the current time in seconds.
+        """
+        self.filename: str = filename
+        self.half_life: float = half_life
+        self.clock: Callable[[], float] = clock
+        self._collections: Dict[str, List[float]] = {}
+        self._queries: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record_collection(self, name: str) -> None:
+        """Count an access to a collection."""
+        with self._lock:
+            self._bump(self._collections, name)
+
+    def record_query(self, kind: str, text: str = "") -> None:
+        """Count a query of some kind, e.g. ("search", term)."""
+        with self._lock:
+            self._bump(self._queries, (kind, text))
+            if len(self._queries) > 2 * MAX_QUERIES:
+                kept = self._ranked(self._queries)[:MAX_QUERIES]
+                self._queries = {query: self._queries[query] for query, _ in kept}
+
+    def hot_collections(self, limit: int) -> List[str]:
+        """Return up to `limit` collection names, most used first."""
+        with self._lock:
+            return [name for name, _ in self._ranked(self._collections)[:limit]]
+
+    def hot_queries(self, limit: int) -> List[Tuple[str, str]]:
+        """Return up to `limit` (kind, text) queries, most used first."""
+        with self._lock:
+            return [query for query, _ in self._ranked(self._queries)[:limit]]
+
+    def load(self) -> bool:
+        """
+        Read saved statistics, replacing the current ones.
+
+        Returns:
+            bool: True if the file was read, False if it is missing or unreadable.
+        """
+        try:
+            if not os.path.exists(self.filename):
+                return False
+            with open(self.filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            collections = {name: [float(score), float(at)] for name, score, at in data.get("collections", [])}
+            queries = {(kind, text): [float(score), float(at)] for kind, text, score, at in data.get("queries", [])}
+            with self._lock:
+                self._collections, self._queries = collections, queries
+            logger.info(f"Loaded access statistics for {len(collections)} collections and {len(queries)} queries")
+            return True
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error loading access statistics from {self.filename}: {str(e)}")
+            return False
+
+    def save(self) -> bool:
+        """
+        Atomically write the statistics, dropping entries that have decayed away.
+
+        Returns:
+            bool: True if the file was written, False otherwise.
+        """
+        # Scores are written decayed to the time of saving.
+        now = self.clock()
+        with self._lock:
+            collections = [[name, score, now] for name, score in self._ranked(self._collections)
+                           if score >= MIN_SCORE]
+            queries = [[kind, text, score, now] for (kind, text), score in self._ranked(self._queries)[:MAX_QUERIES]
+                       if score >= MIN_SCORE]
+        temp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            fd, temp_path = tempfile.mkstemp(prefix=".access-stats-", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"collections": collections, "queries": queries}, f)
+            os.replace(temp_path, self.filename)
+            return True
+        except OSError as e:
+            logger.error(f"Error saving access statistics to {self.filename}: {str(e)}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+    def _bump(self, entries: Dict, key: object) -> None:
+        now = self.clock()
+        entry = entries.get(key)
+        if entry is None:
+            entries[key] = [1.0, now]
+        else:
+            entry[0] = entry[0] * self._decay(now - entry[1]) + 1.0
+            entry[1] = now
+
+    def _ranked(self, entries: Dict) -> List[Tuple[object, float]]:
+        """Return (key, score decayed to now) pairs, highest score first."""
+        now = self.clock()
+        scored = [(key, score * self._decay(now - at)) for key, (score, at) in entries.items()]
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored
+
+    def _decay(self, elapsed: float) -> float:
+        return 0.5 ** (max(0.0, elapsed) / self.half_life)
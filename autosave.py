@@ -0,0 +1,164 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from logger import logger
+
+# Called with a state ("dirty", "saving", "saved" or "error") and details about it.
+StatusCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class AutosaveService:
+    """
+    Persists the library in the background after it changes.
+
+    The service listens for collection changes on a CollectionManager and keeps
+    the set of collections that are dirty since the last save. A burst of edits
+    is coalesced into one save once no change has arrived for `delay` seconds,
+    or at the latest `max_delay` seconds after the first unsaved change. Saves
+    run on a background thread from a consistent snapshot of the collections.
+    """
+
+    def __init__(self, manager: Any, filename: str, delay: float = 2.0, max_delay: float = 30.0,
+                 status_callback: Optional[StatusCallback] = None) -> None:
+        """
+        Initialize the service without starting it.
+
+        Args:
+            manager (CollectionManager): The manager whose collections are saved.
+            filename (str): The library file to write. Format and compression follow its extension.
+            delay (float): Quiet period in seconds before a save starts.
+            max_delay (float): Longest time in seconds a change may stay unsaved during constant edits.
+            status_callback (Optional[StatusCallback]): Receives status updates; it runs on
+                whichever thread changed state, so GUI code must hand it over to the Tk thread.
+        """
+        self.manager = manager
+        self.filename: str = filename
+        self.delay: float = delay
+        self.max_delay: float = max_delay
+        self.status_callback: Optional[StatusCallback] = status_callback
+        self.last_save_duration: Optional[float] = None
+        self.save_count: int = 0
+        self._dirty: Set[str] = set()
+        self._first_change: Optional[float] = None
+        self._last_change: float = 0.0
+        self._condition = threading.Condition()
+        self._save_lock = threading.Lock()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def dirty_collections(self) -> Set[str]:
+        """Return the names of the collections changed since the last save."""
+        with self._condition:
+            return set(self._dirty)
+
+    def start(self) -> None:
+        """Start listening for changes and the background save thread."""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self.manager.add_change_listener(self.mark_dirty)
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+        logger.info(f"Autosave started for {self.filename} with a {self.delay}s quiet period")
+
+    def mark_dirty(self, collection_name: str) -> None:
+        """Record that a collection changed and (re)start the quiet-period timer."""
+        with self._condition:
+            now = time.monotonic()
+            newly_dirty = not self._dirty
+            self._dirty.add(collection_name)
+            self._last_change = now
+            if self._first_change is None:
+                self._first_change = now
+            self._condition.notify()
+        if newly_dirty:
+            self._report("dirty", {"collections": [collection_name]})
+
+    def flush(self) -> bool:
+        """
+        Save immediately if anything is dirty, on the calling thread.
+
+        Returns:
+            bool: True if nothing needed saving or the save succeeded.
+        """
+        with self._condition:
+            dirty = self._take_dirty()
+        return self._save(dirty) if dirty else True
+
+    def stop(self, flush: bool = True) -> bool:
+        """
+        Stop the background thread, optionally saving outstanding changes first.
+
+        Args:
+            flush (bool): Save dirty collections before returning.
+
+        Returns:
+            bool: False if the final save failed, True otherwise.
+        """
+        self.manager.remove_change_listener(self.mark_dirty)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        result = self.flush() if flush else True
+        logger.info(f"Autosave stopped after {self.save_count} saves")
+        return result
+
+    def _take_dirty(self) -> Set[str]:
+        """Return and clear the dirty set. The caller must hold the condition."""
+        dirty, self._dirty = self._dirty, set()
+        self._first_change = None
+        return dirty
+
+    def _run(self) -> None:
+        """Wait for a quiet period after changes, then save, until stopped."""
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if self._dirty:
+                        now = time.monotonic()
+                        due = min(self._last_change + self.delay, self._first_change + self.max_delay)
+                        if now >= due:
+                            break
+                        self._condition.wait(due - now)
+                    else:
+                        self._condition.wait()
+                if self._stopping:
+                    return
+                dirty = self._take_dirty()
+            self._save(dirty)
+
+    def _save(self, dirty: Set[str]) -> bool:
+        """Write a snapshot of the library, putting the collections back on the dirty set on failure."""
+        with self._save_lock:
+            self._report("saving", {"collections": sorted(dirty)})
+            start = time.perf_counter()
+            try:
+                if not self.manager.save_to_file(self.filename):
+                    raise IOError("save_to_file reported a failure; see the log for details")
+            except Exception as e:
+                with self._condition:
+                    self._dirty |= dirty
+                    if self._first_change is None:
+                        self._first_change = time.monotonic()
+                    self._last_change = time.monotonic()
+                logger.error(f"Autosave to {self.filename} failed: {str(e)}")
+                self._report("error", {"collections": sorted(dirty), "error": str(e)})
+                return False
+            duration = time.perf_counter() - start
+            self.last_save_duration = duration
+            self.save_count += 1
+            logger.info(f"Autosaved {len(dirty)} changed collections to {self.filename} in {duration:.3f}s")
+            self._report("saved", {"collections": sorted(dirty), "duration": duration})
+            return True
+
+    def _report(self, state: str, details: Dict[str, Any]) -> None:
+        if self.status_callback is not None:
+            try:
+                self.status_callback(state, details)
+            except Exception as e:
+                logger.error(f"Error in autosave status callback: {str(e)}")
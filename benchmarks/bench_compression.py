@@ -0,0 +1,55 @@
+"""
+Compare file size against save and load time for each compression codec.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_compression --items 100000 --levels 1 6 9
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+from benchmarks.bench_parallel_search import build_manager
+from benchmarks.bench_snapshot import timed
+from compression import DEFAULT_LEVELS
+from logger import logger
+from model import CollectionManager
+
+SUFFIXES = {"none": "", "gzip": ".gz", "bz2": ".bz2", "lzma": ".xz"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--levels", type=int, nargs="*", default=[],
+                        help="compression levels to try; each codec's default if omitted")
+    parser.add_argument("--formats", nargs="+", default=["json", "snapshot"], choices=["json", "snapshot"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    manager = build_manager(args.items, args.collections, args.seed)
+    print(f"{manager._item_count} items")
+    print(f"{'format':>9} {'codec':>6} {'level':>5} {'size MB':>9} {'ratio':>7} {'save s':>8} {'load s':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_format in args.formats:
+            extension = ".tlsnap" if file_format == "snapshot" else ".json"
+            baseline = None
+            for codec, suffix in SUFFIXES.items():
+                levels = [None] if codec == "none" else (args.levels or [DEFAULT_LEVELS[codec]])
+                for level in levels:
+                    path = os.path.join(temp_dir, f"library{extension}{suffix}")
+                    save = timed(manager.save_to_file, path, file_format, codec, level)
+                    loader = CollectionManager(lambda: temp_dir, parallel_search_threshold=None)
+                    load = timed(loader.load_from_file, path)
+                    size = os.path.getsize(path)
+                    baseline = baseline or size
+                    print(f"{file_format:>9} {codec:>6} {'-' if level is None else level:>5} "
+                          f"{size / 1e6:>9.2f} {baseline / size:>7.1f} {save:>8.3f} {load:>8.3f}")
+                    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark parallel sharded search against the single-threaded scan.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parallel_search --items 1000000 --queries 20
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from benchmarks.synthetic import WORDS, generate_library, install
+from logger import logger
+from model import CollectionManager
+from parallel_search import ShardedSearchPool
+
+
+def build_manager(items: int, collections: int, seed: int) -> CollectionManager:
+    """Create a CollectionManager filled with deterministic synthetic items."""
+    library = generate_library(collections, max(1, items // collections), seed=seed)
+    return install(CollectionManager(tempfile.gettempdir, parallel_search_threshold=None), library)
+
+
+def time_queries(search, queries: List[str]) -> float:
+    """Return the mean latency in seconds of running every query once."""
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    manager = build_manager(args.items, args.collections, args.seed)
+    rng = random.Random(args.seed)
+    queries = [rng.choice(WORDS) + " " + rng.choice(WORDS)[:2] for _ in range(args.queries)]
+
+    baseline = time_queries(manager.search_items, queries)
+    print(f"{manager._item_count} items, {len(queries)} queries")
+    print(f"{'workers':>8} {'mean ms':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {baseline * 1000:>10.1f} {1.0:>8.2f}")
+
+    workers = 1
+    while workers <= args.max_workers:
+        pool = ShardedSearchPool(workers)
+        pool.load(manager.collections)
+        pool.search("warm-up")
+        mean = time_queries(pool.search, queries)
+        pool.close()
+        print(f"{workers:>8} {mean * 1000:>10.1f} {baseline / mean:>8.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
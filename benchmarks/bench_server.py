@@ -0,0 +1,142 @@
+"""
+Load-test the local HTTP/JSON API and report throughput and latency percentiles.
+
+Starts a server on a synthetic library unless --port points at a running one.
+Run from the repository root:
+
+    python -m benchmarks.bench_server --items 100000 --connections 16 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.bench_parallel_search import WORDS, build_manager
+from logger import logger
+from paths import LIBRARY_FILENAME
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                  body: Optional[bytes] = None) -> Tuple[int, bytes]:
+    """Send one keep-alive request and return its status code and body."""
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body or b'')}\r\n\r\n"
+    writer.write(head.encode("latin-1") + (body or b""))
+    response_head = await reader.readuntil(b"\r\n\r\n")
+    lines = response_head.decode("latin-1").split("\r\n")
+    length = next(int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:"))
+    return int(lines[0].split(" ")[1]), await reader.readexactly(length)
+
+
+def next_request(rng: random.Random, collections: List[str], write_ratio: float,
+                 sequence: int) -> Tuple[str, str, str, Optional[bytes]]:
+    """Return (kind, method, path, body) for a request drawn from the benchmark's mix."""
+    roll = rng.random()
+    if roll < write_ratio:
+        item = {"name": f"bench item {sequence}", "category": "Book", "price": round(rng.uniform(1, 100), 2)}
+        name = rng.choice(collections).replace(" ", "%20")
+        return "bulk add", "POST", f"/collections/{name}/items", json.dumps({"items": [item]}).encode()
+    roll = rng.random()
+    if roll < 0.6:
+        return "search", "GET", f"/search?q={rng.choice(WORDS)}&limit=20", None
+    if roll < 0.9:
+        name = rng.choice(collections).replace(" ", "%20")
+        return "items", "GET", f"/collections/{name}/items?order_by=price&offset={rng.randrange(100)}&limit=20", None
+    return "collections", "GET", "/collections", None
+
+
+async def run_load(host: str, port: int, connections: int, total: int, write_ratio: float,
+                   seed: int) -> Tuple[float, Dict[str, List[float]], int]:
+    """Drive `total` requests over `connections` keep-alive connections."""
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await request(reader, writer, "GET", "/collections")
+    writer.close()
+    collections = [c["name"] for c in json.loads(body)]
+    latencies: Dict[str, List[float]] = {}
+    errors = 0
+    issued = 0
+
+    async def client(index: int) -> None:
+        nonlocal errors, issued
+        rng = random.Random(seed + index)
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while issued < total:
+                issued += 1
+                kind, method, path, body = next_request(rng, collections, write_ratio, issued)
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, method, path, body)
+                latencies.setdefault(kind, []).append(time.perf_counter() - start)
+                if status >= 400:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(connections)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def start_server(items: int, collections: int, seed: int, data_dir: str) -> Tuple[subprocess.Popen, int]:
+    """Save a synthetic library and start a server process on a free port."""
+    build_manager(items, collections, seed).save_to_file(os.path.join(data_dir, LIBRARY_FILENAME))
+    process = subprocess.Popen(
+        [sys.executable, "server.py", "--data-dir", data_dir, "--port", "0", "--no-autosave", "--log-level", "WARNING"],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Listening on"):
+        process.kill()
+        raise RuntimeError(f"Server failed to start: {line!r}")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="use a running server instead of starting one")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="fraction of requests that bulk-add an item")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as data_dir:
+        process = None
+        port = args.port
+        if port is None:
+            process, port = start_server(args.items, args.collections, args.seed, data_dir)
+        try:
+            elapsed, latencies, errors = asyncio.run(
+                run_load(args.host, port, args.connections, args.requests, args.write_ratio, args.seed))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    completed = sum(len(values) for values in latencies.values())
+    print(f"{completed} requests over {args.connections} connections in {elapsed:.2f}s: "
+          f"{completed / elapsed:.0f} req/s, {errors} errors")
+    print(f"{'kind':>12} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, values in sorted(latencies.items()) + [("all", [v for vs in latencies.values() for v in vs])]:
+        values = sorted(values)
+        print(f"{kind:>12} {len(values):>7} {percentile(values, 0.5) * 1000:>8.2f} {percentile(values, 0.9) * 1000:>8.2f} "
+              f"{percentile(values, 0.99) * 1000:>8.2f} {values[-1] * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare load and save times of the JSON format and the binary snapshot format.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_snapshot --sizes 10000 100000 1000000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import List
+
+from benchmarks.bench_parallel_search import build_manager
+from logger import logger
+from model import CollectionManager
+
+
+def timed(function, *args) -> float:
+    """Return the wall-clock seconds taken by one call."""
+    start = time.perf_counter()
+    if not function(*args):
+        raise RuntimeError(f"{function.__name__}{args} failed")
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    print(f"{'items':>9} {'format':>9} {'size MB':>9} {'save s':>8} {'load s':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            manager = build_manager(size, args.collections, args.seed)
+            rows: List[tuple] = []
+            for file_format, filename in (("json", "library.json"), ("snapshot", "library.tlsnap")):
+                path = os.path.join(temp_dir, filename)
+                save = timed(manager.save_to_file, path, file_format)
+                loader = CollectionManager(lambda: temp_dir, parallel_search_threshold=None)
+                load = timed(loader.load_from_file, path)
+                if loader.collections != manager.collections:
+                    raise RuntimeError(f"{file_format} round trip changed the data")
+                rows.append((file_format, os.path.getsize(path) / 1e6, save, load))
+            for file_format, megabytes, save, load in rows:
+                print(f"{size:>9} {file_format:>9} {megabytes:>9.1f} {save:>8.3f} {load:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
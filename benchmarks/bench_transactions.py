@@ -0,0 +1,80 @@
+"""
+Compare adding items with individual Controller calls against one transaction.
+
+Each run adds --items items to a new collection and to an existing collection
+of --existing items, with autosave on, and reports the cost per operation and
+the number of saves, including the time to persist the result. Run from the
+repository root:
+
+    python -m benchmarks.bench_transactions --items 2000 --existing 20000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from controller import Controller
+from logger import logger
+
+
+def make_items(prefix: str, count: int) -> List[Dict[str, Any]]:
+    return [{"name": f"{prefix} {i}", "category": "Book", "price": float(i % 100)} for i in range(count)]
+
+
+def individual(controller: Controller, items: List[Dict[str, Any]]) -> None:
+    controller.add_collection("New")
+    for item in items:
+        controller.add_item("New", item)
+        controller.add_item("Existing", dict(item, name=f"Extra {item['name']}"))
+
+
+def batched(controller: Controller, items: List[Dict[str, Any]]) -> None:
+    with controller.transaction() as txn:
+        txn.add_collection("New")
+        for item in items:
+            txn.add_item("New", item)
+            txn.add_item("Existing", dict(item, name=f"Extra {item['name']}"))
+
+
+def run(mode: Callable[[Controller, List[Dict[str, Any]]], None], items: int, existing: int) -> Tuple[float, int]:
+    """Return (seconds, saves) for one run in a fresh library with autosave enabled."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        controller = Controller(lambda: data_dir)
+        try:
+            with controller.transaction() as txn:
+                txn.add_collection("Existing")
+                for item in make_items("Old", existing):
+                    txn.add_item("Existing", item)
+            controller.enable_autosave(os.path.join(data_dir, "library.json"), delay=0.05)
+            controller.flush_autosave()
+            saves = []
+            controller.autosave.status_callback = lambda state, details: saves.append(state) if state == "saved" else None
+            start = time.perf_counter()
+            mode(controller, make_items("Item", items))
+            controller.flush_autosave()
+            return time.perf_counter() - start, len(saves)
+        finally:
+            controller.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--existing", type=int, default=20000)
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING"],
+                        help="the application logs every individual call at INFO and DEBUG")
+    args = parser.parse_args()
+
+    logger.logger.setLevel(getattr(logging, args.log_level))
+    operations = 1 + 2 * args.items
+    print(f"{operations} operations, {args.existing} items already in the target collection")
+    print(f"{'mode':>12} {'total ms':>10} {'us/op':>8} {'saves':>6}")
+    for label, mode in [("individual", individual), ("transaction", batched)]:
+        seconds, saves = run(mode, args.items, args.existing)
+        print(f"{label:>12} {seconds * 1000:>10.1f} {seconds / operations * 1e6:>8.1f} {saves:>6}")
+
+
+if __name__ == "__main__":
+    main()
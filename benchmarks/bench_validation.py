@@ -0,0 +1,98 @@
+"""
+Compare the compiled schema validators against the checks they replace.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_validation --items 1000000
+"""
+import argparse
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_parallel_search import build_manager
+from logger import logger
+from schema import ITEM_SCHEMA, collection_validator, item_validator, shallow_collection_validator
+
+
+def previous_load_check(collections: List[Dict[str, Any]]) -> None:
+    """CollectionManager.load_from_file before the schema layer: top-level type check only."""
+    if not all(isinstance(collection, dict) for collection in collections):
+        raise ValueError("Not all items in loaded data are dictionaries")
+
+
+def data_manager_checks(collections: List[Dict[str, Any]]) -> None:
+    """DataManager's per-collection key check plus its per-call add_item field check for every item."""
+    for collection in collections:
+        required_keys = ['name', 'items', 'created_at', 'last_modified']
+        if not (all(key in collection for key in required_keys) and isinstance(collection['items'], list)):
+            raise ValueError("Not all items in loaded data are valid collections")
+        for item in collection["items"]:
+            required_fields = ['name', 'category', 'price']
+            if not all(field in item for field in required_fields):
+                raise ValueError(f"Item must contain all required fields: {', '.join(required_fields)}")
+
+
+def interpreted_schema(collections: List[Dict[str, Any]]) -> None:
+    """The same item rules as the compiled validator, interpreted field by field for every item."""
+    kinds = {"string": (str,), "number": (int, float)}
+    for collection in collections:
+        for item in collection["items"]:
+            if not isinstance(item, dict):
+                raise ValueError("expected an object")
+            for field in ITEM_SCHEMA.fields:
+                if field.name not in item:
+                    if field.required:
+                        raise ValueError(f"{field.name}: missing required field")
+                    continue
+                value = item[field.name]
+                if isinstance(value, bool) or not isinstance(value, kinds[field.kind]):
+                    raise ValueError(f"{field.name}: expected {field.kind}")
+
+
+def compiled_per_item(collections: List[Dict[str, Any]]) -> None:
+    """The compiled single-item validator called once per item, as add_item does."""
+    check = item_validator.check
+    for collection in collections:
+        for item in collection["items"]:
+            if check(item) is not None:
+                raise ValueError("invalid item")
+
+
+def timed(function: Callable[[List[Dict[str, Any]]], None], data: List[Dict[str, Any]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    collections = build_manager(args.items, args.collections, args.seed).collections
+    items = sum(len(c["items"]) for c in collections)
+    candidates = [
+        ("previous load check (no item checks)", previous_load_check),
+        ("DataManager checks (keys only)", data_manager_checks),
+        ("interpreted schema", interpreted_schema),
+        ("compiled, one call per item", compiled_per_item),
+        ("compiled bulk (eager load)", collection_validator.validate_many),
+        ("compiled shallow (deferred load)", shallow_collection_validator.validate_many),
+    ]
+    print(f"{items} items in {len(collections)} collections")
+    print(f"{'check':>38} {'ms':>9} {'M items/s':>10}")
+    for label, function in candidates:
+        seconds = timed(function, collections, args.repeat)
+        print(f"{label:>38} {seconds * 1000:>9.1f} {items / seconds / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Time the core model and controller operations on synthetic libraries and catch regressions.
+
+Every operation is timed at each library size on a library from
+benchmarks.synthetic, and the median seconds per call over --repeats runs is
+recorded as "<layer>.<operation>@<items>". Results are written as JSON. With
+--compare, they are checked against a stored baseline, and the exit status is 1
+if a metric got slower than the baseline by more than --threshold. Run from the
+repository root:
+
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --output baseline.json
+    python -m benchmarks.suite --sizes 1000 100000 --compare baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.synthetic import CATEGORIES, WORDS, generate_library, install, zipf_weights
+from controller import Controller
+from logger import logger
+from model import CollectionManager
+
+# Operations that mutate the library run this many times per repeat, whatever its size.
+ADDS_PER_REPEAT = 200
+
+# A metric only counts as regressed if it also got slower by at least this many seconds,
+# so sub-microsecond jitter on very fast operations is not reported.
+NOISE_FLOOR = 1e-6
+
+
+def median_seconds(operation: Callable[[], Any], calls: int, repeats: int) -> float:
+    """Return the median over `repeats` runs of the seconds per call of `operation`, called `calls` times a run."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        samples.append((time.perf_counter() - start) / calls)
+    return statistics.median(samples)
+
+
+def new_manager(data_dir: str) -> CollectionManager:
+    # The search pool is left off so results do not depend on the number of cores.
+    return CollectionManager(lambda: data_dir, parallel_search_threshold=None)
+
+
+def bench_size(items: int, args: argparse.Namespace, data_dir: str) -> Dict[str, float]:
+    """Time every operation on one library of `items` items and return the metrics."""
+    per_collection = max(1, items // args.collections)
+    library = generate_library(args.collections, per_collection, tuple(args.name_words),
+                               zipf_weights(CATEGORIES, args.category_skew), args.seed)
+    items = args.collections * per_collection
+    terms = [f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7 + 3) % len(WORDS)][:2]}" for i in range(args.queries)]
+    typos = [word[:-1] + word[-1] * 2 for word in WORDS[:args.queries]]
+    middle = f"Collection {args.collections // 2}"
+    repeats = args.repeats
+    metrics: Dict[str, float] = {}
+
+    def record(name: str, operation: Callable[[], Any], calls: int = 1, times: int = repeats,
+               operations_per_call: int = 1) -> None:
+        metrics[f"{name}@{items}"] = median_seconds(operation, calls, times) / operations_per_call
+        print(f"{items:>9} {name:<42} {metrics[f'{name}@{items}'] * 1e3:>12.4f} ms", flush=True)
+
+    def each(function: Callable[[str], Any], arguments: List[str]) -> Callable[[], None]:
+        position = [0]
+
+        def call() -> None:
+            function(arguments[position[0] % len(arguments)])
+            position[0] += 1
+        return call
+
+    manager = install(new_manager(data_dir), library)
+    # One-off costs are measured once, on the first use.
+    record("model.fuzzy_index_build", lambda: manager.fuzzy_search(typos[0]), times=1)
+    record("model.sorted_index_build", lambda: manager.get_items_in_collection(middle, "price", 0, 1), times=1)
+    record("model.search_items", each(manager.search_items, terms), len(terms))
+    record("model.fuzzy_search", each(manager.fuzzy_search, typos), len(typos))
+    record("model.get_items_in_collection", lambda: manager.get_items_in_collection(middle))
+    record("model.get_items_ordered_page",
+           lambda: manager.get_items_in_collection(middle, order_by="price", offset=per_collection // 2, limit=50))
+    record("model.query", lambda: manager.query({"category": CATEGORIES[-1], "max_price": 10.0}, limit=50))
+    for file_format, filename in (("json", "library.json"), ("snapshot", "library.tlsnap")):
+        path = os.path.join(data_dir, filename)
+        record(f"model.save_to_file[{file_format}]", lambda: manager.save_to_file(path, file_format))
+        record(f"model.load_from_file[{file_format}]", lambda: new_manager(data_dir).load_from_file(path))
+    counter = iter(range(10 ** 9))
+    record("model.add_item",
+           lambda: manager.add_item(middle, {"name": f"Added {next(counter)}", "category": "Book", "price": 1.0}),
+           ADDS_PER_REPEAT)
+    manager.close()
+
+    controller = Controller(lambda: data_dir)
+    try:
+        install(controller.collection_manager, library)
+        controller.collection_manager.parallel_search_threshold = None
+        record("controller.search_items", each(controller.search_items, terms), len(terms))
+        record("controller.get_items_in_collection", lambda: controller.get_items_in_collection(middle))
+        record("controller.add_item",
+               lambda: controller.add_item(middle, {"name": f"Added {next(counter)}", "category": "Book"}),
+               ADDS_PER_REPEAT)
+
+        def transaction() -> None:
+            with controller.transaction() as txn:
+                for _ in range(ADDS_PER_REPEAT):
+                    txn.add_item(middle, {"name": f"Added {next(counter)}", "category": "Book"})
+        record("controller.transaction_add_item", transaction, operations_per_call=ADDS_PER_REPEAT)
+    finally:
+        controller.close()
+    return metrics
+
+
+def compare_results(current: Dict[str, float], baseline: Dict[str, float], threshold: float,
+                    noise_floor: float = NOISE_FLOOR) -> List[Tuple[str, float, float]]:
+    """
+    Find the metrics that got slower than their baseline.
+
+    Args:
+        current (Dict[str, float]): Seconds per call by metric name, from this run.
+        baseline (Dict[str, float]): Seconds per call by metric name, from the stored run.
+        threshold (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+        noise_floor (float): Slowdowns of fewer seconds than this are ignored.
+
+    Returns:
+        List[Tuple[str, float, float]]: (metric, baseline seconds, current seconds) for every
+            regressed metric measured in both runs.
+    """
+    regressions = []
+    for name in sorted(current.keys() & baseline.keys()):
+        old, new = baseline[name], current[name]
+        if new > old * (1 + threshold) and new - old > noise_floor:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--name-words", type=int, nargs=2, default=[3, 3], metavar=("MIN", "MAX"))
+    parser.add_argument("--category-skew", type=float, default=0.0, help="Zipf exponent; 0 is uniform")
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    metrics: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        for size in args.sizes:
+            metrics.update(bench_size(size, args, data_dir))
+    results = {
+        "meta": {"created_at": datetime.now().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "arguments": {key: value for key, value in vars(args).items()
+                                                                if key not in ("output", "compare")}},
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {len(metrics)} metrics to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare_results(metrics, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old * 1e3:.4f} ms -> {new * 1e3:.4f} ms ({new / old - 1:+.0%})")
+        compared = len(metrics.keys() & baseline.keys())
+        print(f"{len(regressions)} of {compared} metrics regressed by more than {args.threshold:.0%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Generate deterministic synthetic libraries for benchmarks.
+
+The same arguments and seed always produce the same library. Write one to a
+file for manual testing from the repository root:
+
+    python -m benchmarks.synthetic --collections 50 --items 20000 --category-skew 1.0 --output library.json
+"""
+import argparse
+import itertools
+import logging
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from logger import logger
+from model import CollectionManager
+
+WORDS: List[str] = ["harry", "potter", "ring", "lord", "star", "wars", "dune", "song",
+                    "ice", "fire", "blue", "night", "river", "king", "queen", "game"]
+
+# The categories a new CollectionManager offers.
+CATEGORIES: List[str] = ["Book", "Movie", "Music", "Game"]
+
+TIMESTAMP = "2024-01-01T00:00:00"
+
+
+def zipf_weights(categories: Sequence[str], skew: float) -> Dict[str, float]:
+    """Weight categories by 1 / rank ** skew: 0 is uniform, 1 makes the first twice as common as the second."""
+    return {category: 1.0 / (rank + 1) ** skew for rank, category in enumerate(categories)}
+
+
+def generate_library(collections: int, items_per_collection: int, name_words: Tuple[int, int] = (3, 3),
+                     category_weights: Optional[Dict[str, float]] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Build a library of random but reproducible collections.
+
+    Args:
+        collections (int): Number of collections, named "Collection 0", "Collection 1", ...
+        items_per_collection (int): Number of items in each collection.
+        name_words (Tuple[int, int]): Inclusive range of words in an item name. Every name
+            also ends with a unique "<collection>-<item>" suffix.
+        category_weights (Optional[Dict[str, float]]): Relative frequency of each category;
+            uniform over CATEGORIES if omitted.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[Dict[str, Any]]: Valid collections, as load_from_file would produce them.
+    """
+    rng = random.Random(seed)
+    weights = category_weights or zipf_weights(CATEGORIES, 0.0)
+    categories = list(weights)
+    cumulative = list(itertools.accumulate(weights.values()))
+    low, high = name_words
+    library: List[Dict[str, Any]] = []
+    for c in range(collections):
+        items = []
+        for i in range(items_per_collection):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+            items.append({"name": f"{words} {c}-{i}",
+                          "category": rng.choices(categories, cum_weights=cumulative)[0],
+                          "price": round(rng.uniform(1, 100), 2)})
+        library.append({"name": f"Collection {c}", "items": items, "created_at": TIMESTAMP,
+                        "last_modified": TIMESTAMP})
+    return library
+
+
+def install(manager: CollectionManager, library: List[Dict[str, Any]]) -> CollectionManager:
+    """Add generated collections to an empty manager, with item ids and indexes in step."""
+    manager.replace_collections({collection["name"]: collection for collection in library}, {})
+    return manager
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collections", type=int, default=50)
+    parser.add_argument("--items", type=int, default=2000, help="items per collection")
+    parser.add_argument("--name-words", type=int, nargs=2, default=[3, 3], metavar=("MIN", "MAX"))
+    parser.add_argument("--category-skew", type=float, default=0.0, help="Zipf exponent; 0 is uniform")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="a .json, .tlsnap or compressed library file")
+    args = parser.parse_args()
+
+    logger.logger.setLevel(logging.WARNING)
+    library = generate_library(args.collections, args.items, tuple(args.name_words),
+                               zipf_weights(CATEGORIES, args.category_skew), args.seed)
+    manager = install(CollectionManager(lambda: ".", parallel_search_threshold=None), library)
+    if not manager.save_to_file(args.output):
+        raise SystemExit(f"Could not write {args.output}")
+    print(f"Wrote {args.collections * args.items} items in {args.collections} collections to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
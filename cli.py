@@ -0,0 +1,373 @@
+"""
+Headless command-line interface to The Library.
+
+Runs batch operations against the same library file as the GUI without
+importing any GUI module, and prints one JSON document per command so it
+can be used from cron jobs and pipelines:
+
+    python cli.py stats
+    python cli.py search "potter" --fuzzy --limit 5
+    python cli.py match wanted-titles.txt
+    python cli.py import backup.json --merge
+    python cli.py diff laptop-library.json
+    python cli.py export backup.tlsnap.gz
+    python cli.py export-items books.csv.gz --category Book
+    python cli.py compact --format snapshot
+    python cli.py verify
+
+The exit status is 0 on success, 1 if the command failed, verification
+found problems or diff found differences, and 2 for invalid arguments.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from paths import LIBRARY_FILENAME, get_user_data_dir
+
+# Verification stops listing individual problems after this many.
+MAX_REPORTED_PROBLEMS = 100
+
+
+class CLIError(Exception):
+    """A command could not be completed; reported as JSON with exit status 1."""
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with one subcommand per operation."""
+    parser = argparse.ArgumentParser(prog="the-library", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="user data directory; defaults to the GUI's")
+    parser.add_argument("--library", help=f"library file; defaults to {LIBRARY_FILENAME} in the data directory")
+    parser.add_argument("--pretty", action="store_true", help="indent the JSON output")
+    parser.add_argument("--verbose", action="store_true", help="log informational messages to stderr")
+    parser.add_argument("--profile", nargs="?", const="all", choices=["cpu", "memory", "all"],
+                        help="write CPU and/or allocation reports of each library operation to "
+                             "the 'profiles' folder in the data directory")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    import_parser = commands.add_parser("import", help="replace or extend the library with a file's collections")
+    import_parser.add_argument("source", help="JSON or snapshot file, optionally compressed")
+    import_parser.add_argument("--merge", action="store_true",
+                               help="add new collections and items instead of replacing the library")
+    import_parser.set_defaults(handler=cmd_import)
+
+    diff_parser = commands.add_parser("diff", help="compare the library with another library file")
+    diff_parser.add_argument("other", help="JSON or snapshot file, optionally compressed")
+    diff_parser.add_argument("--summary", action="store_true", help="report counts instead of the missing items")
+    diff_parser.set_defaults(handler=cmd_diff)
+
+    export_parser = commands.add_parser("export", help="write the library to another file")
+    export_parser.add_argument("destination")
+    _add_output_options(export_parser)
+    export_parser.set_defaults(handler=cmd_export)
+
+    items_parser = commands.add_parser("export-items", help="stream items to a CSV, JSONL or columnar file")
+    items_parser.add_argument("destination", help="output file; .gz, .bz2 or .xz compresses it")
+    items_parser.add_argument("--format", choices=["csv", "jsonl", "columnar"], default=None,
+                              help="inferred from a .csv, .jsonl or .tlcols extension if omitted")
+    items_parser.add_argument("--collection", help="only export this collection")
+    items_parser.add_argument("--category", help="only export items in this category")
+    items_parser.add_argument("--search", help="only export items matching this search term")
+    items_parser.set_defaults(handler=cmd_export_items)
+
+    search_parser = commands.add_parser("search", help="search item names and categories")
+    search_parser.add_argument("term")
+    search_parser.add_argument("--fuzzy", action="store_true", help="rank by similarity and tolerate typos")
+    search_parser.add_argument("--limit", type=int, default=None, help="maximum number of results")
+    search_parser.set_defaults(handler=cmd_search)
+
+    match_parser = commands.add_parser("match", help="check a want-list of search terms against the library")
+    match_parser.add_argument("wants", help="text file with one search term per line, optionally compressed")
+    match_parser.add_argument("--items", action="store_true", help="list the matching items of every term")
+    match_parser.set_defaults(handler=cmd_match)
+
+    stats_parser = commands.add_parser("stats", help="summarize the library")
+    stats_parser.set_defaults(handler=cmd_stats)
+
+    compact_parser = commands.add_parser("compact", help="drop duplicate items and rewrite the library file")
+    _add_output_options(compact_parser)
+    compact_parser.set_defaults(handler=cmd_compact)
+
+    verify_parser = commands.add_parser("verify", help="check a library file for structural problems")
+    verify_parser.add_argument("file", nargs="?", help="file to check; defaults to the library file")
+    verify_parser.set_defaults(handler=cmd_verify)
+    return parser
+
+
+def _add_output_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--format", choices=["json", "snapshot"], default=None,
+                        help="file format; inferred from the filename if omitted")
+    parser.add_argument("--compression", choices=["none", "gzip", "bz2", "lzma"], default=None,
+                        help="compression codec; inferred from the filename if omitted")
+    parser.add_argument("--level", type=int, default=None, help="compression level")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run one CLI command and print its result as JSON.
+
+    Args:
+        argv (Optional[List[str]]): Command-line arguments; sys.argv[1:] if None.
+
+    Returns:
+        int: The process exit status.
+    """
+    args = build_parser().parse_args(argv)
+    _configure_logging(args.verbose)
+    library_file = _library_file(args)
+    controller = None
+    try:
+        controller = _open_controller(args)
+        if args.profile:
+            controller.enable_profiling(cpu=args.profile != "memory", memory=args.profile != "cpu")
+        status, result = args.handler(controller, library_file, args)
+    except CLIError as e:
+        status, result = 1, {"ok": False, "error": str(e)}
+    except Exception as e:
+        from logger import logger
+        logger.exception(f"Unexpected error running '{args.command}': {str(e)}")
+        status, result = 1, {"ok": False, "error": f"unexpected error: {str(e)}"}
+    finally:
+        if controller is not None:
+            controller.close()
+    json.dump(result, sys.stdout, indent=2 if args.pretty else None, default=str)
+    sys.stdout.write("\n")
+    return status
+
+
+def _configure_logging(verbose: bool) -> None:
+    """Keep stdout clean for JSON: console logging goes to stderr, warnings and up unless verbose."""
+    from logger import logger
+    for handler in logger.logger.handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setStream(sys.stderr)
+            handler.setLevel(logging.DEBUG if verbose else logging.WARNING)
+
+
+def _library_file(args: argparse.Namespace) -> str:
+    if args.library:
+        return os.path.abspath(args.library)
+    return os.path.join(args.data_dir or get_user_data_dir(), LIBRARY_FILENAME)
+
+
+def _open_controller(args: argparse.Namespace) -> Any:
+    """Create a Controller; imported here so `--help` and argument errors stay instant."""
+    from controller import Controller
+    data_dir = os.path.abspath(args.data_dir) if args.data_dir else None
+    if data_dir is not None:
+        os.makedirs(data_dir, exist_ok=True)
+    controller = Controller((lambda: data_dir) if data_dir else get_user_data_dir)
+    # A one-shot process answers a single query, which never repays starting the search pool.
+    controller.collection_manager.parallel_search_threshold = None
+    return controller
+
+
+def _load_library(controller: Any, library_file: str, must_exist: bool = False) -> None:
+    """Load the library file into the controller; a missing file is an empty library."""
+    if not os.path.exists(library_file):
+        if must_exist:
+            raise CLIError(f"Library file '{library_file}' does not exist")
+        return
+    if not controller.load_from_file(library_file):
+        raise CLIError(f"Could not load library file '{library_file}'; see the log for details")
+
+
+def _save_library(controller: Any, filename: str, args: argparse.Namespace,
+                  default_format: Optional[str] = None, default_compression: Optional[str] = None) -> None:
+    file_format = getattr(args, "format", None) or default_format
+    compression = getattr(args, "compression", None) or default_compression
+    if not controller.save_to_file(filename, file_format, compression, getattr(args, "level", None)):
+        raise CLIError(f"Could not write '{filename}'; see the log for details")
+
+
+def _counts(collections: List[Dict[str, Any]]) -> Dict[str, int]:
+    return {"collections": len(collections), "items": sum(len(c["items"]) for c in collections)}
+
+
+def _item_key(item: Dict[str, Any]) -> str:
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def _detect_format(filename: str) -> Tuple[str, str]:
+    """Return the (file format, compression) an existing library file is stored in."""
+    from compression import open_decompressed
+    from snapshot import MAGIC, is_snapshot
+    with open(filename, "rb") as raw:
+        stream, codec = open_decompressed(raw)
+        head = stream.read(len(MAGIC))
+    return ("snapshot" if is_snapshot(head) else "json"), (codec or "none")
+
+
+def cmd_import(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Replace the library with a file's collections, or merge them in with --merge."""
+    if not os.path.exists(args.source):
+        raise CLIError(f"Source file '{args.source}' does not exist")
+    added = {"collections": 0, "items": 0}
+    if args.merge:
+        _load_library(controller, library_file)
+        added = controller.merge_from_file(args.source)
+        if added is None:
+            raise CLIError(f"Could not load '{args.source}'; see the log for details")
+    else:
+        if not controller.load_from_file(args.source):
+            raise CLIError(f"Could not load '{args.source}'; see the log for details")
+        added = _counts(controller.get_collections())
+    _save_library(controller, library_file, args)
+    return 0, {"ok": True, "library": library_file, "merged": args.merge, "added": added,
+               "total": _counts(controller.get_collections())}
+
+
+def cmd_diff(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Compare the library with another file; exits 1 when they differ, like diff(1)."""
+    if not os.path.exists(args.other):
+        raise CLIError(f"File '{args.other}' does not exist")
+    _load_library(controller, library_file)
+    result = controller.diff_with_file(args.other)
+    if result is None:
+        raise CLIError(f"Could not load '{args.other}'; see the log for details")
+    if args.summary:
+        for side in ("only_here", "only_there"):
+            delta = result[side]
+            result[side] = {"collections": len(delta["collections"]), "items": delta["item_count"]}
+    return (0 if result["identical"] else 1), {"ok": True, "library": library_file, "other": args.other, **result}
+
+
+def cmd_export(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Write the library to another file, in any supported format and compression."""
+    _load_library(controller, library_file, must_exist=True)
+    destination = os.path.abspath(args.destination)
+    _save_library(controller, destination, args)
+    return 0, {"ok": True, "destination": destination, "bytes": os.path.getsize(destination),
+               **_counts(controller.get_collections())}
+
+
+def cmd_export_items(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Stream filtered items to a CSV, JSONL or columnar file and report throughput."""
+    _load_library(controller, library_file, must_exist=True)
+    destination = os.path.abspath(args.destination)
+
+    def progress(rows: int, total: int) -> None:
+        if args.verbose:
+            print(f"exported {rows}/{total} rows", file=sys.stderr)
+
+    job = controller.start_export(destination, args.format, args.collection, args.category, args.search,
+                                  progress, background=False)
+    if job is None or job.error is not None:
+        raise CLIError(f"Could not export to '{destination}'" + (f": {job.error}" if job else "; see the log for details"))
+    return 0, {"ok": True, "destination": destination, "format": job.file_format, "rows": job.rows_written,
+               "seconds": round(job.seconds, 3), "rows_per_second": round(job.rows_per_second),
+               "bytes": os.path.getsize(destination)}
+
+
+def cmd_search(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Search the library, by substring or with fuzzy ranking."""
+    if args.limit is not None and args.limit < 0:
+        raise CLIError("--limit must not be negative")
+    _load_library(controller, library_file)
+    if args.fuzzy:
+        results = controller.fuzzy_search(args.term, limit=10 if args.limit is None else args.limit)
+    else:
+        results = controller.search_items(args.term)
+        if args.limit is not None:
+            results = results[:args.limit]
+    return 0, {"ok": True, "term": args.term, "fuzzy": args.fuzzy, "count": len(results), "results": results}
+
+
+def cmd_match(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Report how many items match each term of a want-list, scanning the library once."""
+    if not os.path.exists(args.wants):
+        raise CLIError(f"Want-list '{args.wants}' does not exist")
+    _load_library(controller, library_file)
+    matches = controller.match_want_list(args.wants)
+    if matches is None:
+        raise CLIError(f"Could not read want-list '{args.wants}'; see the log for details")
+    result = {"ok": True, "terms": len(matches), "matched_terms": sum(1 for items in matches.values() if items),
+              "hits": {term: len(items) for term, items in matches.items()}}
+    if args.items:
+        result["items"] = {term: items for term, items in matches.items() if items}
+    return 0, result
+
+
+def cmd_stats(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Summarize collection sizes, categories and price range."""
+    _load_library(controller, library_file)
+    collections = controller.get_collections()
+    categories: Dict[str, int] = {}
+    prices: List[float] = []
+    for collection in collections:
+        for item in collection["items"]:
+            category = item.get("category")
+            categories[category] = categories.get(category, 0) + 1
+            price = item.get("price")
+            if isinstance(price, (int, float)) and not isinstance(price, bool):
+                prices.append(price)
+    exists = os.path.exists(library_file)
+    return 0, {
+        "ok": True,
+        "library": library_file,
+        "bytes": os.path.getsize(library_file) if exists else 0,
+        "format": dict(zip(("format", "compression"), _detect_format(library_file))) if exists else None,
+        **_counts(collections),
+        "per_collection": {c["name"]: len(c["items"]) for c in collections},
+        "categories": categories,
+        "price": {"min": min(prices), "max": max(prices), "total": sum(prices)} if prices else None,
+    }
+
+
+def cmd_compact(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Drop duplicate items and rewrite the library, keeping its format unless told otherwise."""
+    _load_library(controller, library_file, must_exist=True)
+    bytes_before = os.path.getsize(library_file)
+    file_format, compression = _detect_format(library_file)
+    removed = controller.remove_duplicate_items()
+    _save_library(controller, library_file, args, file_format, compression)
+    return 0, {"ok": True, "library": library_file, "duplicates_removed": removed,
+               "bytes_before": bytes_before, "bytes_after": os.path.getsize(library_file),
+               **_counts(controller.get_collections())}
+
+
+def cmd_verify(controller: Any, library_file: str, args: argparse.Namespace) -> Tuple[int, Dict[str, Any]]:
+    """Check that a library file loads and report every invalid or duplicate item in it."""
+    filename = os.path.abspath(args.file) if args.file else library_file
+    if not os.path.exists(filename):
+        raise CLIError(f"File '{filename}' does not exist")
+    # Item checks are deferred so that all of them can be reported below, not just the first.
+    controller.collection_manager.defer_validation = True
+    if not controller.load_from_file(filename):
+        return 1, {"ok": False, "file": filename, "problems": ["file could not be loaded; see the log for details"]}
+    collections = controller.get_collections()
+    problems = _verify_collections(collections)
+    return (1 if problems else 0), {
+        "ok": not problems,
+        "file": filename,
+        **_counts(collections),
+        "problem_count": len(problems),
+        "problems": problems[:MAX_REPORTED_PROBLEMS],
+    }
+
+
+def _verify_collections(collections: List[Dict[str, Any]]) -> List[str]:
+    """Return a description of every schema violation and duplicate in the loaded collections."""
+    from schema import item_validator
+    problems: List[str] = []
+    names = set()
+    for ci, collection in enumerate(collections):
+        if collection["name"] in names:
+            problems.append(f"collections[{ci}].name: duplicate collection name '{collection['name']}'")
+        names.add(collection["name"])
+        path = f"collections[{ci}].items"
+        problems.extend(str(error) for error in item_validator.errors(collection["items"], path))
+        seen = set()
+        for ii, item in enumerate(collection["items"]):
+            key = _item_key(item)
+            if key in seen:
+                problems.append(f"{path}[{ii}]: duplicate item")
+            seen.add(key)
+    return problems
+
+
+if __name__ == "__main__":
+    sys.exit(main())
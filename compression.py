@@ -0,0 +1,105 @@
+import bz2
+import gzip
+import lzma
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+# Supported codecs, keyed by name, with the magic bytes that open their streams.
+MAGIC_BYTES: Dict[str, bytes] = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "lzma": b"\xfd7zXZ\x00",
+}
+
+# File extensions that select a codec when saving without an explicit one.
+EXTENSIONS: Dict[str, str] = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+
+# Compression levels used when none is configured.
+DEFAULT_LEVELS: Dict[str, int] = {"gzip": 6, "bz2": 9, "lzma": 6}
+
+_READERS: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    "gzip": lambda raw: gzip.GzipFile(fileobj=raw, mode="rb"),
+    "bz2": lambda raw: bz2.BZ2File(raw, "rb"),
+    "lzma": lambda raw: lzma.LZMAFile(raw, "rb"),
+}
+
+_WRITERS: Dict[str, Callable[[BinaryIO, int], BinaryIO]] = {
+    "gzip": lambda raw, level: gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level),
+    "bz2": lambda raw, level: bz2.BZ2File(raw, "wb", compresslevel=level),
+    "lzma": lambda raw, level: lzma.LZMAFile(raw, "wb", preset=level),
+}
+
+
+def detect_codec(head: bytes) -> Optional[str]:
+    """Return the codec whose magic bytes start `head`, or None for uncompressed data."""
+    for codec, magic in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def codec_for_filename(filename: str) -> Optional[str]:
+    """Return the codec implied by a filename's extension, or None."""
+    for extension, codec in EXTENSIONS.items():
+        if filename.endswith(extension):
+            return codec
+    return None
+
+
+def strip_codec_extension(filename: str) -> str:
+    """Return the filename without a trailing compression extension."""
+    for extension in EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+def check_codec(codec: Optional[str], level: Optional[int] = None) -> None:
+    """
+    Validate a codec name and compression level.
+
+    Raises:
+        ValueError: If the codec is unknown or the level is out of range.
+    """
+    if codec is None:
+        return
+    if codec not in MAGIC_BYTES:
+        raise ValueError(f"Unknown compression codec '{codec}'; expected one of: {', '.join(MAGIC_BYTES)}")
+    if level is not None:
+        low = 0 if codec in ("gzip", "lzma") else 1
+        if not isinstance(level, int) or not low <= level <= 9:
+            raise ValueError(f"Compression level for {codec} must be an integer from {low} to 9")
+
+
+def open_decompressed(raw: BinaryIO) -> Tuple[BinaryIO, Optional[str]]:
+    """
+    Wrap a seekable binary file in a streaming decompressor if its magic bytes call for one.
+
+    Args:
+        raw (BinaryIO): The file, positioned at its start.
+
+    Returns:
+        Tuple[BinaryIO, Optional[str]]: A readable stream of the decompressed bytes and the
+        detected codec, or the file itself and None if it is not compressed.
+    """
+    head = raw.read(max(len(magic) for magic in MAGIC_BYTES.values()))
+    raw.seek(0)
+    codec = detect_codec(head)
+    if codec is None:
+        return raw, None
+    return _READERS[codec](raw), codec
+
+
+def open_compressor(raw: BinaryIO, codec: str, level: Optional[int] = None) -> BinaryIO:
+    """
+    Wrap a binary file in a streaming compressor.
+
+    Args:
+        raw (BinaryIO): The file to write compressed bytes to.
+        codec (str): "gzip", "bz2" or "lzma".
+        level (Optional[int]): Compression level; the codec default if None.
+
+    Returns:
+        BinaryIO: A writable stream. Close it before closing `raw`.
+    """
+    check_codec(codec, level)
+    return _WRITERS[codec](raw, DEFAULT_LEVELS[codec] if level is None else level)
@@ -1,7 +1,19 @@
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional
 from model import CollectionManager
+from autosave import AutosaveService, StatusCallback
+from exporters import ExportJob, ExportProgressCallback
+from streaming_loader import ProgressCallback
+from compression import open_decompressed
+from transaction import Transaction
+from file_watcher import ChangeCallback, LibraryWatcher
+from access_stats import ACCESS_STATS_FILENAME, AccessStats
+from profiler import PROFILES_DIRNAME, OperationProfiler, profile_modes_from_env, profiled
 from logger import logger
+import io
 import json
+import os
+import threading
 
 class Controller:
     """
@@ -9,9 +21,31 @@ class Controller:
     """
 
     @logger.log_execution_time
-    def __init__(self, get_user_data_dir: callable) -> None:
+    def __init__(self, get_user_data_dir: callable, memory_budget: Optional[int] = None,
+                 track_access: bool = False) -> None:
+        """
+        Args:
+            get_user_data_dir (callable): Returns the directory for settings and other user data.
+            memory_budget (Optional[int]): Bytes of item data to keep in memory; None keeps everything.
+            track_access (bool): Record which collections and queries are used, in the user data
+                directory, so warm_up() can prepare them ahead of the next use.
+
+        Profiling starts right away if the THE_LIBRARY_PROFILE environment variable asks for it.
+        """
         self.get_user_data_dir: callable = get_user_data_dir
-        self.collection_manager: CollectionManager = CollectionManager(self.get_user_data_dir)
+        self.collection_manager: CollectionManager = CollectionManager(self.get_user_data_dir,
+                                                                       memory_budget=memory_budget)
+        self.autosave: Optional[AutosaveService] = None
+        self.watcher: Optional[LibraryWatcher] = None
+        self.access_stats: Optional[AccessStats] = None
+        self._warm_up_thread: Optional[threading.Thread] = None
+        if track_access:
+            self.access_stats = AccessStats(os.path.join(self.get_user_data_dir(), ACCESS_STATS_FILENAME))
+            self.access_stats.load()
+        self.profiler: OperationProfiler = OperationProfiler(os.path.join(self.get_user_data_dir(), PROFILES_DIRNAME))
+        modes = profile_modes_from_env()
+        if modes is not None:
+            self.enable_profiling(*modes)
         logger.info("Controller initialized successfully")
 
     @logger.log_execution_time
@@ -80,6 +114,7 @@ class Controller:
             return False
 
     @logger.log_execution_time
+    @profiled
     def add_item(self, collection_name: str, item: Dict[str, Any]) -> bool:
         """
         Add a new item to a specified collection.
@@ -105,6 +140,135 @@ class Controller:
             return False
 
     @logger.log_execution_time
+    @profiled
+    def update_item(self, item_id: int, changes: Dict[str, Any]) -> bool:
+        """
+        Change fields of an item, keeping its id and its place in its collection.
+
+        Args:
+            item_id (int): The id of the item, from get_item_ids.
+            changes (Dict[str, Any]): The fields to set; the other fields keep their values.
+
+        Returns:
+            bool: True if the item was updated successfully, False otherwise.
+        """
+        try:
+            logger.info(f"Attempting to update item {item_id}")
+            return self.collection_manager.update_item(item_id, changes)
+        except Exception as e:
+            logger.error(f"Error updating item: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    @profiled
+    def delete_item(self, item_id: int) -> bool:
+        """
+        Delete an item from its collection.
+
+        Args:
+            item_id (int): The id of the item, from get_item_ids.
+
+        Returns:
+            bool: True if the item was deleted successfully, False otherwise.
+        """
+        try:
+            logger.info(f"Attempting to delete item {item_id}")
+            return self.collection_manager.delete_item(item_id)
+        except Exception as e:
+            logger.error(f"Error deleting item: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    def get_item_ids(self, collection_name: str) -> List[int]:
+        """
+        Retrieve the ids of a collection's items, in the order get_items_in_collection returns them.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            List[int]: One id per item.
+        """
+        try:
+            return self.collection_manager.item_ids(collection_name)
+        except Exception as e:
+            logger.error(f"Error retrieving item ids: {str(e)}", exc_info=True)
+            return []
+
+    @contextmanager
+    def transaction(self) -> Iterator[Transaction]:
+        """
+        Group several edits into one all-or-nothing change.
+
+        Operations staged on the yielded Transaction are validated together and
+        applied when the block exits. Each changed collection is announced once,
+        and with autosave enabled the result is saved once before returning. If the
+        block raises, nothing is applied:
+
+            with controller.transaction() as txn:
+                txn.add_collection("Comics")
+                for item in items:
+                    txn.add_item("Comics", item)
+
+        Raises:
+            TransactionError: If a staged operation is invalid; the library is left unchanged.
+        """
+        txn = Transaction(self.collection_manager)
+        try:
+            yield txn
+        except BaseException:
+            txn.rollback()
+            raise
+        if txn.operations:
+            txn.commit()
+            self.flush_autosave()
+        else:
+            txn.rollback()
+
+    @logger.log_execution_time
+    @profiled
+    def load_from_file(self, filename: str, progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """
+        Load the library from a file.
+
+        Args:
+            filename (str): The JSON or snapshot file to load.
+            progress_callback (Optional[ProgressCallback]): Called with (bytes read, total bytes,
+                collections loaded) as loading progresses. It runs on the loading thread.
+
+        Returns:
+            bool: True if the library was loaded successfully, False otherwise.
+        """
+        try:
+            return self.collection_manager.load_from_file(filename, progress_callback)
+        except Exception as e:
+            logger.error(f"Error loading library: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    @profiled
+    def save_to_file(self, filename: str, file_format: Optional[str] = None,
+                     compression: Optional[str] = None, compression_level: Optional[int] = None) -> bool:
+        """
+        Save the library to a file.
+
+        Args:
+            filename (str): The file to write.
+            file_format (Optional[str]): "json" or "snapshot"; inferred from the filename if omitted.
+            compression (Optional[str]): "gzip", "bz2", "lzma" or "none"; inferred from the filename if omitted.
+            compression_level (Optional[int]): Compression level; the codec default if omitted.
+
+        Returns:
+            bool: True if the library was saved successfully, False otherwise.
+        """
+        try:
+            return self.collection_manager.save_to_file(filename, file_format, compression, compression_level)
+        except Exception as e:
+            logger.error(f"Error saving library: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    @profiled
     def get_collections(self) -> List[Dict[str, Any]]:
         """
         Retrieve all collections from the library.
@@ -119,18 +283,29 @@ class Controller:
             return []
 
     @logger.log_execution_time
-    def get_items_in_collection(self, collection_name: str) -> List[Dict[str, Any]]:
+    @profiled
+    def get_items_in_collection(self, collection_name: str, order_by: Optional[str] = None,
+                                offset: int = 0, limit: Optional[int] = None,
+                                descending: bool = False) -> List[Dict[str, Any]]:
         """
-        Retrieve all items in a specified collection.
+        Retrieve items in a specified collection, optionally ordered and paginated.
 
         Args:
             collection_name (str): The name of the collection to retrieve items from.
+            order_by (Optional[str]): "price" or "name" to order the items, None for insertion order.
+            offset (int): Number of items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            descending (bool): Reverse the order.
 
         Returns:
             List[Dict[str, Any]]: A list of items in the specified collection.
         """
         try:
-            return self.collection_manager.get_items_in_collection(collection_name)
+            if offset == 0:
+                self._record_collection(collection_name)
+            if order_by is not None:
+                self._record_query("order", order_by)
+            return self.collection_manager.get_items_in_collection(collection_name, order_by, offset, limit, descending)
         except KeyError:
             logger.error(f"Collection '{collection_name}' not found.")
             return []
@@ -139,6 +314,53 @@ class Controller:
             return []
 
     @logger.log_execution_time
+    @profiled
+    def get_items_in_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                                 collection_name: Optional[str] = None, offset: int = 0,
+                                 limit: Optional[int] = None, descending: bool = False) -> List[Dict[str, Any]]:
+        """
+        Retrieve items whose price lies within a range, ordered by price.
+
+        Args:
+            min_price (Optional[float]): Inclusive lower bound, or None for no lower bound.
+            max_price (Optional[float]): Inclusive upper bound, or None for no upper bound.
+            collection_name (Optional[str]): Restrict the query to one collection. None queries the whole library.
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            descending (bool): Return the most expensive items first.
+
+        Returns:
+            List[Dict[str, Any]]: The matching items.
+        """
+        try:
+            return self.collection_manager.get_items_in_price_range(
+                min_price, max_price, collection_name, offset, limit, descending)
+        except Exception as e:
+            logger.error(f"Error retrieving items by price range: {str(e)}", exc_info=True)
+            return []
+
+    @logger.log_execution_time
+    def count_items_in_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                                   collection_name: Optional[str] = None) -> int:
+        """
+        Count items whose price lies within a range, e.g. to size a paginated view.
+
+        Args:
+            min_price (Optional[float]): Inclusive lower bound, or None for no lower bound.
+            max_price (Optional[float]): Inclusive upper bound, or None for no upper bound.
+            collection_name (Optional[str]): Restrict the count to one collection.
+
+        Returns:
+            int: The number of matching items.
+        """
+        try:
+            return self.collection_manager.count_items_in_price_range(min_price, max_price, collection_name)
+        except Exception as e:
+            logger.error(f"Error counting items by price range: {str(e)}", exc_info=True)
+            return 0
+
+    @logger.log_execution_time
+    @profiled
     def search_items(self, search_term: str) -> List[Dict[str, Any]]:
         """
         Search for items in the library based on a search term.
@@ -150,6 +372,8 @@ class Controller:
             List[Dict[str, Any]]: A list of items matching the search term.
         """
         try:
+            if isinstance(search_term, str):
+                self._record_query("search", search_term.lower())
             return self.collection_manager.search_items(search_term)
         except ValueError as e:
             logger.error(f"Invalid search term: {str(e)}")
@@ -158,6 +382,146 @@ class Controller:
             logger.error(f"Error searching items: {str(e)}", exc_info=True)
             return []
 
+    @logger.log_execution_time
+    @profiled
+    def faceted_search(self, search_term: str, category: Optional[str] = None, offset: int = 0,
+                       limit: Optional[int] = None, fuzzy: bool = False) -> Dict[str, Any]:
+        """
+        Search for items and count the hits per category, e.g. to show "Book (1,203)" filters.
+
+        Args:
+            search_term (str): The term to search for in item names or categories.
+            category (Optional[str]): Only return hits in this category; the counts still cover every hit.
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            fuzzy (bool): Match item names approximately instead of by substring.
+
+        Returns:
+            Dict[str, Any]: The page of "items", the "total" number of matching items and the
+                hit counts per category in "facets", largest first.
+        """
+        try:
+            if isinstance(search_term, str) and offset == 0:
+                self._record_query("fuzzy" if fuzzy else "search", search_term.lower())
+                self._record_query("facets")
+            return self.collection_manager.faceted_search(search_term, category, offset, limit, fuzzy)
+        except Exception as e:
+            logger.error(f"Error during faceted search: {str(e)}", exc_info=True)
+            return {"items": [], "total": 0, "facets": {}}
+
+    @logger.log_execution_time
+    @profiled
+    def fuzzy_search(self, search_term: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Search for items whose names approximately match a search term.
+
+        Args:
+            search_term (str): The approximate item name, typos allowed.
+            limit (int): The maximum number of items to return.
+
+        Returns:
+            List[Dict[str, Any]]: The closest matching items, best first.
+        """
+        try:
+            if isinstance(search_term, str):
+                self._record_query("fuzzy", search_term.lower())
+            return self.collection_manager.fuzzy_search(search_term, limit)
+        except ValueError as e:
+            logger.error(f"Invalid fuzzy search: {str(e)}")
+            return []
+        except Exception as e:
+            logger.error(f"Error during fuzzy search: {str(e)}", exc_info=True)
+            return []
+
+    @logger.log_execution_time
+    def suggest(self, prefix: str, limit: int = 8) -> List[str]:
+        """
+        Suggest item and collection names that complete a prefix.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of suggestions.
+
+        Returns:
+            List[str]: The suggested names, best first.
+        """
+        try:
+            # Prefixes change with every keystroke; only the use of autocomplete is worth counting.
+            self._record_query("suggest")
+            return self.collection_manager.suggest(prefix, limit)
+        except Exception as e:
+            logger.error(f"Error suggesting completions: {str(e)}", exc_info=True)
+            return []
+
+    @logger.log_execution_time
+    @profiled
+    def query(self, filters: Dict[str, Any], offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Find items matching a combined filter expression.
+
+        Args:
+            filters (Dict[str, Any]): Any of "collection", "category", "min_price",
+                "max_price" and "name_contains", e.g. {"category": "Book", "max_price": 10}.
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+
+        Returns:
+            List[Dict[str, Any]]: The matching items in library order.
+        """
+        try:
+            if offset == 0 and isinstance(filters, dict):
+                self._record_query("query", json.dumps(filters, sort_keys=True, default=str))
+            return self.collection_manager.query(filters, offset, limit)
+        except Exception as e:
+            logger.error(f"Error running query: {str(e)}", exc_info=True)
+            return []
+
+    @logger.log_execution_time
+    def explain_query(self, filters: Dict[str, Any]) -> str:
+        """
+        Describe the plan the query planner would use for a filter expression.
+
+        Args:
+            filters (Dict[str, Any]): The filter expression, as accepted by query().
+
+        Returns:
+            str: The plan explanation, or an error description if the filters are invalid.
+        """
+        try:
+            return self.collection_manager.plan_query(filters).explain()
+        except (TypeError, ValueError, KeyError) as e:
+            logger.error(f"Invalid query: {str(e)}")
+            return f"Invalid query: {str(e)}"
+        except Exception as e:
+            logger.error(f"Error explaining query: {str(e)}", exc_info=True)
+            return f"Error explaining query: {str(e)}"
+
+    @logger.log_execution_time
+    @profiled
+    def match_want_list(self, filename: str) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Check a want-list against the library in one pass.
+
+        Args:
+            filename (str): A UTF-8 text file with one search term per line, optionally
+                gzip, bz2 or xz compressed. It is streamed, not read into memory at once.
+
+        Returns:
+            Optional[Dict[str, List[Dict[str, Any]]]]: The items matching each term,
+                or None if the file could not be read.
+        """
+        try:
+            with open(filename, "rb") as raw:
+                stream, _ = open_decompressed(raw)
+                lines = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+                return self.collection_manager.match_terms(lines)
+        except OSError as e:
+            logger.error(f"Error reading want-list '{filename}': {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error matching want-list '{filename}': {str(e)}", exc_info=True)
+            return None
+
     @logger.log_execution_time
     def get_categories(self) -> List[str]:
         """
@@ -170,4 +534,297 @@ class Controller:
             return self.collection_manager.get_categories()
         except Exception as e:
             logger.error(f"Error retrieving categories: {str(e)}", exc_info=True)
-            return []
\ No newline at end of file
+            return []
+
+    @logger.log_execution_time
+    @profiled
+    def remove_duplicate_items(self) -> int:
+        """
+        Remove repeated copies of the same item within each collection.
+
+        Returns:
+            int: The number of items removed.
+        """
+        try:
+            return self.collection_manager.remove_duplicate_items()
+        except Exception as e:
+            logger.error(f"Error removing duplicate items: {str(e)}", exc_info=True)
+            return 0
+
+    @logger.log_execution_time
+    @profiled
+    def diff_with_file(self, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Compare the library with another library file using content hashes.
+
+        Args:
+            filename (str): The library file to compare against.
+
+        Returns:
+            Optional[Dict[str, Any]]: Both root hashes, whether they match, and the deltas
+                "only_here" and "only_there"; None if the file could not be loaded.
+        """
+        try:
+            other = self._load_other(filename)
+            if other is None:
+                return None
+            try:
+                return {"root": self.collection_manager.root_hash(), "other_root": other.root_hash(),
+                        "identical": self.collection_manager.root_hash() == other.root_hash(),
+                        "only_here": self.collection_manager.diff(other), "only_there": other.diff(self.collection_manager)}
+            finally:
+                other.close()
+        except Exception as e:
+            logger.error(f"Error comparing with '{filename}': {str(e)}", exc_info=True)
+            return None
+
+    @logger.log_execution_time
+    @profiled
+    def merge_from_file(self, filename: str) -> Optional[Dict[str, int]]:
+        """
+        Add the collections and items of another library file that this library lacks.
+
+        Args:
+            filename (str): The library file to merge in.
+
+        Returns:
+            Optional[Dict[str, int]]: The number of "collections" and "items" added,
+                or None if the file could not be loaded.
+        """
+        try:
+            other = self._load_other(filename)
+            if other is None:
+                return None
+            try:
+                return self.collection_manager.apply_delta(other.diff(self.collection_manager))
+            finally:
+                other.close()
+        except Exception as e:
+            logger.error(f"Error merging '{filename}': {str(e)}", exc_info=True)
+            return None
+
+    def _load_other(self, filename: str) -> Optional[CollectionManager]:
+        """Load another library file into a separate manager for comparison."""
+        other = CollectionManager(self.get_user_data_dir, parallel_search_threshold=None)
+        if not other.load_from_file(filename):
+            return None
+        return other
+
+    @logger.log_execution_time
+    def get_paging_stats(self) -> Dict[str, Any]:
+        """
+        Return the collection manager's memory budget statistics.
+
+        Returns:
+            Dict[str, Any]: Resident size, eviction and fault statistics, or an empty dict if paging is off.
+        """
+        try:
+            return self.collection_manager.paging_stats()
+        except Exception as e:
+            logger.error(f"Error retrieving paging statistics: {str(e)}", exc_info=True)
+            return {}
+
+    @logger.log_execution_time
+    def start_export(self, filename: str, file_format: Optional[str] = None, collection: Optional[str] = None,
+                     category: Optional[str] = None, search: Optional[str] = None,
+                     progress_callback: Optional[ExportProgressCallback] = None,
+                     background: bool = True) -> Optional[ExportJob]:
+        """
+        Export matching items to a CSV, JSONL or columnar file.
+
+        Args:
+            filename (str): The file to write; a .gz, .bz2 or .xz suffix compresses it.
+            file_format (Optional[str]): "csv", "jsonl" or "columnar"; inferred from the filename if omitted.
+            collection (Optional[str]): Only export this collection.
+            category (Optional[str]): Only export items in this category.
+            search (Optional[str]): Only export items matching this search term.
+            progress_callback (Optional[ExportProgressCallback]): Called with (rows written, rows to write).
+            background (bool): Run on a worker thread and return immediately.
+
+        Returns:
+            Optional[ExportJob]: The job, finished unless `background` is set, or None if it could not be created.
+        """
+        try:
+            job = ExportJob(self.collection_manager, filename, file_format, collection, category, search,
+                            progress_callback)
+            if background:
+                job.start()
+            else:
+                job.run()
+            return job
+        except ValueError as e:
+            logger.error(f"Error starting export: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error starting export: {str(e)}", exc_info=True)
+            return None
+
+    @logger.log_execution_time
+    def enable_autosave(self, filename: str, delay: float = 2.0,
+                        status_callback: Optional[StatusCallback] = None) -> bool:
+        """
+        Start saving the library to a file in the background whenever it changes.
+
+        Args:
+            filename (str): The library file to keep up to date.
+            delay (float): Seconds without further changes before a save starts.
+            status_callback (Optional[StatusCallback]): Receives save status updates from the saving thread.
+
+        Returns:
+            bool: True if autosave was started, False otherwise.
+        """
+        try:
+            if self.autosave is not None:
+                self.autosave.stop()
+            self.autosave = AutosaveService(self.collection_manager, filename, delay=delay,
+                                            status_callback=status_callback)
+            self.autosave.start()
+            return True
+        except Exception as e:
+            logger.error(f"Error enabling autosave: {str(e)}", exc_info=True)
+            self.autosave = None
+            return False
+
+    @logger.log_execution_time
+    def flush_autosave(self) -> bool:
+        """
+        Save pending changes immediately instead of waiting for the quiet period.
+
+        Returns:
+            bool: True if nothing was pending or the save succeeded, False otherwise.
+        """
+        try:
+            return self.autosave.flush() if self.autosave is not None else True
+        except Exception as e:
+            logger.error(f"Error flushing autosave: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    def watch_library(self, filename: str, interval: float = 1.0,
+                      on_change: Optional[ChangeCallback] = None) -> bool:
+        """
+        Start reloading collections that other programs change in the library file.
+
+        Call after the library was loaded from `filename`. Collections with unsaved
+        local changes are never overwritten; they are reported as conflicts.
+
+        Args:
+            filename (str): The library file to watch.
+            interval (float): Seconds between checks of the file.
+            on_change (Optional[ChangeCallback]): Receives the names of the collections added,
+                updated, removed or in conflict, on the watcher thread.
+
+        Returns:
+            bool: True if the watcher was started, False otherwise.
+        """
+        try:
+            if self.watcher is not None:
+                self.watcher.stop()
+            self.watcher = LibraryWatcher(self.collection_manager, filename, interval=interval, on_change=on_change)
+            self.watcher.start()
+            return True
+        except Exception as e:
+            logger.error(f"Error watching library file: {str(e)}", exc_info=True)
+            self.watcher = None
+            return False
+
+    @logger.log_execution_time
+    def warm_up(self, collections: int = 3, queries: int = 10,
+                background: bool = True) -> Optional[threading.Thread]:
+        """
+        Prepare the most used collections and the indexes of the most used queries.
+
+        Uses the statistics kept with `track_access`; without them there is nothing
+        to prepare. Meant to run right after the library is loaded, so the first use
+        of a favourite collection does not pay for validation, paging in or index
+        builds while the rest of the library stays cold.
+
+        Args:
+            collections (int): How many of the most used collections to prepare.
+            queries (int): How many of the most used queries to prepare for.
+            background (bool): Run on a daemon thread and return immediately.
+
+        Returns:
+            Optional[threading.Thread]: The warm-up thread if one was started, else None.
+        """
+        try:
+            if self.access_stats is None:
+                return None
+            hot_collections = self.access_stats.hot_collections(collections)
+            hot_queries = self.access_stats.hot_queries(queries)
+            if not hot_collections and not hot_queries:
+                return None
+            logger.info(f"Warming up collections {hot_collections} and {len(hot_queries)} queries")
+            if not background:
+                self.collection_manager.warm_up(hot_collections, hot_queries)
+                return None
+            self._warm_up_thread = threading.Thread(target=self.collection_manager.warm_up,
+                                                    args=(hot_collections, hot_queries), name="warm-up", daemon=True)
+            self._warm_up_thread.start()
+            return self._warm_up_thread
+        except Exception as e:
+            logger.error(f"Error warming up: {str(e)}", exc_info=True)
+            return None
+
+    def _record_collection(self, collection_name: str) -> None:
+        if self.access_stats is not None:
+            self.access_stats.record_collection(collection_name)
+
+    def _record_query(self, kind: str, text: str = "") -> None:
+        if self.access_stats is not None:
+            self.access_stats.record_query(kind, text)
+
+    @logger.log_execution_time
+    def enable_profiling(self, cpu: bool = True, memory: bool = True) -> bool:
+        """
+        Profile the main library operations from now on.
+
+        Each call to an operation such as search_items or save_to_file writes a
+        cProfile file and/or an allocation report to the "profiles" folder in the
+        user data directory; only the newest reports are kept.
+
+        Args:
+            cpu (bool): Record CPU profiles with cProfile.
+            memory (bool): Record the memory each call allocates with tracemalloc.
+
+        Returns:
+            bool: True if profiling was enabled, False otherwise.
+        """
+        try:
+            self.profiler.enable(cpu, memory)
+            return self.profiler.enabled
+        except Exception as e:
+            logger.error(f"Error enabling profiling: {str(e)}", exc_info=True)
+            return False
+
+    @logger.log_execution_time
+    def disable_profiling(self) -> None:
+        """Stop profiling operations."""
+        try:
+            self.profiler.disable()
+        except Exception as e:
+            logger.error(f"Error disabling profiling: {str(e)}", exc_info=True)
+
+    @logger.log_execution_time
+    def close(self) -> None:
+        """
+        Save pending changes and release resources held by the model, such as search worker processes.
+        """
+        try:
+            if self.watcher is not None:
+                self.watcher.stop()
+                self.watcher = None
+            if self.autosave is not None:
+                self.autosave.stop(flush=True)
+                self.autosave = None
+            if self._warm_up_thread is not None:
+                # It may be starting the search pool, which close() has to stop.
+                self._warm_up_thread.join()
+                self._warm_up_thread = None
+            if self.access_stats is not None:
+                self.access_stats.save()
+            self.profiler.disable()
+            self.collection_manager.close()
+            logger.info("Controller closed")
+        except Exception as e:
+            logger.error(f"Error closing controller: {str(e)}", exc_info=True)
@@ -3,6 +3,12 @@ import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from logger import logger
+from schema import COLLECTION_SCHEMA, ITEM_SCHEMA, compile_schema
+
+# DataManager requires every item field and collection timestamp.
+_item_validator = compile_schema(ITEM_SCHEMA.require("category", "price"))
+_collection_validator = compile_schema(COLLECTION_SCHEMA.require("created_at", "last_modified"), deep=False)
+
 
 class DataManager:
     """
@@ -86,9 +92,7 @@ class DataManager:
             if not collection:
                 raise ValueError(f"Collection '{collection_name}' not found")
             
-            required_fields = ['name', 'category', 'price']
-            if not all(field in item for field in required_fields):
-                raise ValueError(f"Item must contain all required fields: {', '.join(required_fields)}")
+            _item_validator.validate(item, "item")
             
             if any(existing_item['name'] == item['name'] for existing_item in collection["items"]):
                 logger.warning(f"Item '{item['name']}' already exists in collection '{collection_name}'")
@@ -195,8 +199,7 @@ class DataManager:
             if not isinstance(loaded_data, list):
                 raise ValueError("Loaded data is not a list")
             
-            if not all(isinstance(item, dict) and self._validate_collection(item) for item in loaded_data):
-                raise ValueError("Not all items in loaded data are valid collections")
+            _collection_validator.validate_many(loaded_data, "collections")
             
             self.collections = loaded_data
             logger.info(f"Successfully loaded {len(self.collections)} collections from {filename}")
@@ -224,8 +227,7 @@ class DataManager:
         Returns:
             bool: True if the collection is valid, False otherwise.
         """
-        required_keys = ['name', 'items', 'created_at', 'last_modified']
-        return all(key in collection for key in required_keys) and isinstance(collection['items'], list)
+        return _collection_validator.check(collection) is None
 
     @logger.log_execution_time
     def get_categories(self) -> List[str]:
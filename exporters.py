@@ -0,0 +1,326 @@
+import csv
+import io
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from logger import logger
+from compression import codec_for_filename, open_compressor, strip_codec_extension
+
+EXPORT_FORMATS = ("csv", "jsonl", "columnar")
+
+# Fields exported by the tabular formats. JSONL keeps every item field.
+COLUMNS = ("collection", "name", "category", "price")
+
+# Columnar layout (all integers little-endian):
+#
+#   header  COLUMNAR_MAGIC
+#   chunks  row count u32, then the collection, name and category columns
+#           (each: row count u32 end offsets + byte length u32 + UTF-8 data),
+#           then the price column (row count float64, NaN when missing)
+#   footer  a zero row count
+COLUMNAR_MAGIC = b"TLCOLS\x00\x01"
+CHUNK_ROWS = 65536
+
+# Called with (rows written, rows to write).
+ExportProgressCallback = Callable[[int, int], None]
+
+_U32 = struct.Struct("<I")
+
+
+def iter_export_rows(collections: List[Dict[str, Any]], collection: Optional[str] = None,
+                     category: Optional[str] = None,
+                     search: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Lazily yield (collection name, item) for every item that passes the filters.
+
+    Item lists are only iterated when their collection is reached, so a paged-out
+    collection is read back when its rows are due. Deleted slots (None) are skipped.
+
+    Args:
+        collections (List[Dict[str, Any]]): The collections to export.
+        collection (Optional[str]): Only export this collection.
+        category (Optional[str]): Only export items in this category (case-insensitive).
+        search (Optional[str]): Only export items whose name or category contains this term,
+            matched like CollectionManager.search_items.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: The collection name and the item.
+    """
+    category_lower = category.lower() if category is not None else None
+    search_lower = search.lower() if search is not None else None
+    for c in collections:
+        if collection is not None and c["name"] != collection:
+            continue
+        for item in c["items"]:
+            if item is None:
+                continue
+            if category_lower is not None and str(item.get("category", "")).lower() != category_lower:
+                continue
+            if search_lower is not None and not (search_lower in str(item.get("name", "")).lower()
+                                                 or search_lower in str(item.get("category", "")).lower()):
+                continue
+            yield c["name"], item
+
+
+def count_export_rows(collections: List[Dict[str, Any]], collection: Optional[str] = None) -> int:
+    """Return an upper bound on the rows an export will write, for progress reporting."""
+    return sum(len(c["items"]) for c in collections if collection is None or c["name"] == collection)
+
+
+def write_csv(rows: Iterator[Tuple[str, Dict[str, Any]]], stream: BinaryIO,
+              on_row: Callable[[], None]) -> None:
+    """Write rows as UTF-8 CSV with a header line."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=False)
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    for name, item in rows:
+        writer.writerow((name, item.get("name", ""), item.get("category", ""), item.get("price", "")))
+        on_row()
+    text.flush()
+    text.detach()
+
+
+def write_jsonl(rows: Iterator[Tuple[str, Dict[str, Any]]], stream: BinaryIO,
+                on_row: Callable[[], None]) -> None:
+    """Write one JSON object per line: the item's fields plus its collection."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="\n", write_through=False)
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+    for name, item in rows:
+        text.write(encode({"collection": name, **item}))
+        text.write("\n")
+        on_row()
+    text.flush()
+    text.detach()
+
+
+def write_columnar(rows: Iterator[Tuple[str, Dict[str, Any]]], stream: BinaryIO,
+                   on_row: Callable[[], None], chunk_rows: int = CHUNK_ROWS) -> None:
+    """Write rows in the chunked columnar format, holding at most one chunk in memory."""
+    stream.write(COLUMNAR_MAGIC)
+    columns: Tuple[List[str], List[str], List[str]] = ([], [], [])
+    prices = array("d")
+    for name, item in rows:
+        columns[0].append(name)
+        columns[1].append(_text(item.get("name")))
+        columns[2].append(_text(item.get("category")))
+        price = item.get("price")
+        prices.append(float(price) if isinstance(price, (int, float)) and not isinstance(price, bool) else math.nan)
+        on_row()
+        if len(prices) == chunk_rows:
+            _write_chunk(stream, columns, prices)
+            columns = ([], [], [])
+            prices = array("d")
+    if prices:
+        _write_chunk(stream, columns, prices)
+    stream.write(_U32.pack(0))
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _write_chunk(stream: BinaryIO, columns: Tuple[List[str], ...], prices: array) -> None:
+    stream.write(_U32.pack(len(prices)))
+    for values in columns:
+        encoded = [value.encode("utf-8") for value in values]
+        ends = array("I")
+        end = 0
+        for data in encoded:
+            end += len(data)
+            ends.append(end)
+        stream.write(_little_endian(ends))
+        stream.write(_U32.pack(end))
+        stream.write(b"".join(encoded))
+    stream.write(_little_endian(prices))
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def read_columnar(stream: BinaryIO) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Read a columnar export one chunk at a time.
+
+    Yields:
+        Dict[str, List[Any]]: One list per column in COLUMNS; missing prices are None.
+
+    Raises:
+        ValueError: If the stream is not a columnar export or is truncated.
+    """
+    if stream.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export")
+
+    def read_exactly(size: int) -> bytes:
+        data = stream.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated columnar export")
+        return data
+
+    while True:
+        (count,) = _U32.unpack(read_exactly(_U32.size))
+        if count == 0:
+            return
+        chunk: Dict[str, List[Any]] = {}
+        for column in COLUMNS[:3]:
+            ends = array("I")
+            ends.frombytes(read_exactly(4 * count))
+            (length,) = _U32.unpack(read_exactly(_U32.size))
+            data = read_exactly(length)
+            if sys.byteorder != "little":
+                ends.byteswap()
+            starts = [0] + list(ends[:-1])
+            chunk[column] = [data[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+        prices = array("d")
+        prices.frombytes(read_exactly(8 * count))
+        if sys.byteorder != "little":
+            prices.byteswap()
+        chunk["price"] = [None if math.isnan(price) else price for price in prices]
+        yield chunk
+
+
+_WRITERS: Dict[str, Callable[..., None]] = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+class ExportJob:
+    """
+    Streams the items of a CollectionManager to a CSV, JSONL or columnar file.
+
+    Items are read from a point-in-time view of the collections (see
+    CollectionManager.snapshot), paged-out collections one at a time, and written
+    as they are generated, so memory use does not grow with the export size.
+    Files ending in .gz, .bz2 or .xz are compressed on the fly. A job can run on
+    the calling thread with run() or on a background thread with start().
+    """
+
+    def __init__(self, manager: Any, filename: str, file_format: Optional[str] = None,
+                 collection: Optional[str] = None, category: Optional[str] = None, search: Optional[str] = None,
+                 progress_callback: Optional[ExportProgressCallback] = None, progress_interval: int = 10000) -> None:
+        """
+        Initialize an export without starting it.
+
+        Args:
+            manager (CollectionManager): The manager whose items are exported.
+            filename (str): The file to write.
+            file_format (Optional[str]): "csv", "jsonl" or "columnar"; inferred from the extension if None.
+            collection (Optional[str]): Only export this collection.
+            category (Optional[str]): Only export items in this category.
+            search (Optional[str]): Only export items matching this search term.
+            progress_callback (Optional[ExportProgressCallback]): Called every `progress_interval` rows
+                and once at the end, on the thread running the export.
+            progress_interval (int): Rows between progress reports.
+
+        Raises:
+            ValueError: If the format is unknown or cannot be inferred.
+        """
+        self.manager = manager
+        self.filename: str = filename
+        self.file_format: str = file_format or _format_for_filename(filename)
+        if self.file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{self.file_format}'; expected one of: {', '.join(EXPORT_FORMATS)}")
+        self.filters: Dict[str, Optional[str]] = {"collection": collection, "category": category, "search": search}
+        self.progress_callback: Optional[ExportProgressCallback] = progress_callback
+        self.progress_interval: int = max(1, progress_interval)
+        self.rows_written: int = 0
+        self.total_rows: int = 0
+        self.seconds: float = 0.0
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+        self._cancelled = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        """Return the export throughput so far."""
+        return self.rows_written / self.seconds if self.seconds else 0.0
+
+    def start(self) -> None:
+        """Run the export on a background thread; wait() or `done` signal completion."""
+        self._thread = threading.Thread(target=self.run, name="export", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a started export to finish. Returns True if it succeeded."""
+        self.done.wait(timeout)
+        return self.done.is_set() and self.error is None
+
+    def cancel(self) -> None:
+        """Ask a running export to stop; the partial file is removed."""
+        self._cancelled = True
+
+    @logger.log_execution_time
+    def run(self) -> bool:
+        """
+        Run the export on the calling thread.
+
+        Returns:
+            bool: True if the file was written completely, False otherwise.
+        """
+        start = time.perf_counter()
+        try:
+            codec = codec_for_filename(self.filename)
+            with self.manager.snapshot() as collections, open(self.filename, "wb") as raw:
+                self.total_rows = count_export_rows(collections, self.filters["collection"])
+                rows = iter_export_rows(collections, **self.filters)
+                stream = open_compressor(raw, codec, self.manager.compression_level) if codec else raw
+                try:
+                    buffered = io.BufferedWriter(stream, 1 << 20) if stream is raw else stream
+                    _WRITERS[self.file_format](rows, buffered, self._row_written)
+                    buffered.flush()
+                finally:
+                    if stream is not raw:
+                        stream.close()
+            self.seconds = time.perf_counter() - start
+            self._report()
+            logger.info(f"Exported {self.rows_written} rows to {self.filename} in {self.seconds:.2f}s "
+                        f"({self.rows_per_second:.0f} rows/s)")
+            return True
+        except Exception as e:
+            self.seconds = time.perf_counter() - start
+            self.error = str(e)
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            if isinstance(e, _Cancelled):
+                logger.info(f"Export to {self.filename} cancelled after {self.rows_written} rows")
+            else:
+                logger.exception(f"Error exporting to {self.filename}: {str(e)}")
+            return False
+        finally:
+            self.done.set()
+
+    def _row_written(self) -> None:
+        self.rows_written += 1
+        if self.rows_written % self.progress_interval == 0:
+            if self._cancelled:
+                raise _Cancelled("Export cancelled")
+            self._report()
+
+    def _report(self) -> None:
+        if self.progress_callback is not None:
+            try:
+                self.progress_callback(self.rows_written, self.total_rows)
+            except Exception as e:
+                logger.error(f"Error in export progress callback: {str(e)}")
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _format_for_filename(filename: str) -> str:
+    """Infer an export format from a filename, ignoring any compression extension."""
+    extension = os.path.splitext(strip_codec_extension(filename))[1].lower()
+    formats = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".tlcols": "columnar"}
+    if extension not in formats:
+        raise ValueError(f"Cannot infer an export format from '{filename}'; pass one of: {', '.join(EXPORT_FORMATS)}")
+    return formats[extension]
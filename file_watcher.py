@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from compression import open_decompressed
+from logger import logger
+from schema import collection_validator
+from snapshot import MAGIC, is_snapshot, read_snapshot_blocks
+from streaming_loader import iter_collection_digests
+
+# (modification time in ns, size, inode) of a file; any rewrite changes at least one of them.
+Signature = Tuple[int, int, int]
+
+# Called with the names of the collections "added", "updated" and "removed" from the
+# file, and the "conflicts" left alone because they have unsaved local changes.
+ChangeCallback = Callable[[Dict[str, List[str]]], None]
+
+
+class SavedFile(NamedTuple):
+    """A library file as a CollectionManager last wrote it."""
+    path: str
+    signature: Optional[Signature]
+    versions: Dict[str, int]  # collection versions the file holds
+    digests: Dict[str, bytes]  # of each collection, as LibraryWatcher reads them from the file
+
+
+def file_signature(path: str) -> Optional[Signature]:
+    """Return the signature of a file, or None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class LibraryWatcher:
+    """
+    Reloads the collections that another program changed in the library file.
+
+    A background thread polls the file's modification time, size and inode.
+    Once a new version has been left alone for `settle` seconds, the file is
+    read and every collection is digested in its encoded form: the JSON text
+    of the collection, or its block of a snapshot. Only collections whose
+    digest differs from the previous read are decoded and looked at; those
+    that really differ from the library are swapped in together by
+    CollectionManager.replace_collections, under its lock.
+
+    The digests of the file the library was loaded from are read by the first
+    check, which runs on the watcher thread as soon as it starts. Files
+    written by the manager itself are recognized from its `last_save` and not
+    read back; the digests it recorded while writing are taken over.
+
+    The watcher remembers the version of each collection that matched the
+    file. A collection edited locally since then is not overwritten; it is
+    reported as a conflict and the next save writes the local version.
+    """
+
+    def __init__(self, manager: Any, filename: str, interval: float = 1.0, settle: float = 0.5,
+                 on_change: Optional[ChangeCallback] = None) -> None:
+        """
+        Initialize the watcher without starting it. The library is assumed to match the file.
+
+        Args:
+            manager (CollectionManager): The manager to keep in step with the file.
+            filename (str): The library file to watch.
+            interval (float): Seconds between checks of the file's signature.
+            settle (float): Seconds a new version of the file must stay unmodified before it is read,
+                so files written in place are not read half-written.
+            on_change (Optional[ChangeCallback]): Called after collections were reloaded or found in
+                conflict. It runs on the watcher thread, so GUI code must hand it over to the Tk thread.
+        """
+        self.manager = manager
+        self.filename: str = os.path.abspath(filename)
+        self.interval: float = interval
+        self.settle: float = settle
+        self.on_change: Optional[ChangeCallback] = on_change
+        self.reloads: int = 0
+        self._signature: Optional[Signature] = file_signature(self.filename)
+        self._digests: Optional[Dict[str, bytes]] = None  # read by the first check
+        self._synced: Dict[str, int] = manager.collection_versions()
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start polling on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.filename} for external changes every {self.interval}s")
+
+    def stop(self) -> None:
+        """Stop polling and wait for a check in progress to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            logger.info(f"Stopped watching {self.filename} after {self.reloads} reloads")
+
+    def check(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Look at the file once and reload what changed.
+
+        Returns:
+            Optional[Dict[str, List[str]]]: The "added", "updated", "removed" and "conflicts"
+                collection names if anything was reloaded or in conflict, else None.
+        """
+        with self._check_lock:
+            signature = file_signature(self.filename)
+            if signature is None:
+                return None
+            if signature == self._signature:
+                if self._digests is None:
+                    self._digests = self._current_digests(signature)
+                return None
+            saved = self._own_save(signature)
+            if saved is not None:
+                self._signature = signature
+                self._synced.update(saved.versions)
+                self._digests = dict(saved.digests)
+                return None
+            if time.time_ns() - signature[0] < self.settle * 1e9:
+                return None
+            self._signature = signature
+            try:
+                return self._reload()
+            except Exception as e:
+                # Most likely another program is still writing; its next write changes the signature.
+                logger.warning(f"Could not read changed library file {self.filename}: {str(e)}")
+                return None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"Error checking {self.filename} for changes: {str(e)}")
+            if self._stop.wait(self.interval):
+                return
+
+    def _own_save(self, signature: Signature) -> Optional[SavedFile]:
+        """Return the manager's last save if it wrote the file as it is now."""
+        saved = self.manager.last_save
+        if saved is not None and saved.path == self.filename and saved.signature == signature:
+            return saved
+        return None
+
+    def _current_digests(self, signature: Signature) -> Dict[str, bytes]:
+        """Digest the collections of the file the library matches, which is read unless the manager wrote it."""
+        saved = self._own_save(signature)
+        if saved is not None:
+            return dict(saved.digests)
+        try:
+            digests = {name: digest for name, digest, _ in self._entries({})}
+        except Exception as e:
+            logger.warning(f"Could not digest library file {self.filename}: {str(e)}")
+            return {}
+        # If the file was rewritten meanwhile, its next check compares every collection.
+        return digests if file_signature(self.filename) == signature else {}
+
+    def _entries(self, known: Dict[str, bytes]) -> Iterator[Tuple[str, bytes, Optional[Callable[[], Dict[str, Any]]]]]:
+        """
+        Yield (name, digest, decode) for every collection in the file, reading it as they are consumed.
+
+        JSON collections whose digest is in `known` are not decoded and come without a decode.
+        """
+        with open(self.filename, "rb") as raw:
+            stream, _ = open_decompressed(raw)
+            if is_snapshot(stream.peek(len(MAGIC))[:len(MAGIC)]):
+                for block in read_snapshot_blocks(stream.read()):
+                    yield block.name, block.digest, block.decode
+                return
+            names = {digest: name for name, digest in known.items()}
+            for collection, digest in iter_collection_digests(stream.read, names):
+                if collection is None:
+                    yield names[digest], digest, None
+                    continue
+                name = collection.get("name")
+                if not isinstance(name, str):
+                    raise ValueError("A collection has no name")
+                yield name, digest, lambda collection=collection: collection
+
+    def _reload(self) -> Optional[Dict[str, List[str]]]:
+        """Swap in the collections whose digests changed and that differ from the library."""
+        start = time.perf_counter()
+        versions = self.manager.collection_versions()
+        known = self._digests or {}
+        digests: Dict[str, bytes] = {}
+        replacements: Dict[str, Optional[Dict[str, Any]]] = {}
+        expected: Dict[str, int] = {}
+        decoded = 0
+        for name, digest, decode in self._entries(known):
+            digests[name] = digest
+            if known.get(name) == digest:
+                continue
+            collection = decode()
+            decoded += 1
+            collection.pop("item_ids", None)
+            collection.pop("next_item_id", None)
+            try:
+                collection_validator.validate(collection, f"collection '{name}'")
+            except ValueError as e:
+                logger.error(f"Ignoring invalid collection in {self.filename}: {str(e)}")
+                continue
+            if name in versions and self.manager.collection_equals(name, collection):
+                self._synced[name] = versions[name]
+                continue
+            replacements[name] = collection
+            expected[name] = self._synced.get(name, 0)
+        for name in self._synced:
+            if name not in digests and name in versions:
+                replacements[name] = None
+                expected[name] = self._synced[name]
+        self._digests = digests
+        for name in [name for name in self._synced if name not in digests and name not in versions]:
+            del self._synced[name]
+        if not replacements:
+            logger.debug(f"{self.filename} changed on disk; {decoded} rewritten collections already match")
+            return None
+        result = self.manager.replace_collections(replacements, expected)
+        self._synced.update(result.pop("versions"))
+        for name in result["removed"]:
+            self._synced.pop(name, None)
+        self.reloads += 1
+        logger.info(f"Reloaded from {self.filename} in {time.perf_counter() - start:.3f}s: "
+                    f"{len(result['added'])} added, {len(result['updated'])} updated, "
+                    f"{len(result['removed'])} removed, {len(result['conflicts'])} in conflict "
+                    f"({decoded} of {len(digests)} collections decoded)")
+        if self.on_change is not None:
+            try:
+                self.on_change(result)
+            except Exception as e:
+                logger.error(f"Error in library watcher callback: {str(e)}")
+        return result
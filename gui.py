@@ -1,18 +1,38 @@
 import customtkinter as ctk
+from tkinter import filedialog
 from typing import Callable, Dict, Any, List, Optional
 from controller import Controller
+from paths import LIBRARY_FILENAME
+from stall_watchdog import StallWatchdog
+from image_cache import THUMBNAIL_DIR, ImageCache
 import os
+import queue
+import threading
 from PIL import Image
 from logger import logger
 
+# Bounding box of item cover thumbnails in the collection view.
+COVER_SIZE = (48, 48)
+
+# Search results listed at once; the total and the category counts still cover every hit.
+SEARCH_PAGE_SIZE = 500
+
 class GUI:
     def __init__(self, controller: Controller, get_user_data_dir: Callable[[], str]):
         self.controller: Controller = controller
         self.dark_mode: bool = self.controller.load_theme_preference()
         self.get_user_data_dir: Callable[[], str] = get_user_data_dir
         self.settings_file: str = os.path.join(self.get_user_data_dir(), "settings.json")
-        self.data_file: str = os.path.join(self.get_user_data_dir(), "library_data.json")
+        self.data_file: str = os.path.join(self.get_user_data_dir(), LIBRARY_FILENAME)
+        self.images: ImageCache = ImageCache(os.path.join(self.get_user_data_dir(), THUMBNAIL_DIR),
+                                             lambda image: ctk.CTkImage(image, size=image.size))
+        self.shown_collection: Optional[str] = None
         self.setup_gui()
+        self.cover_placeholder: ctk.CTkImage = ctk.CTkImage(Image.new("RGBA", COVER_SIZE, (128, 128, 128, 60)),
+                                                            size=COVER_SIZE)
+        self.root.after(50, self.poll_images)
+        self.watchdog: StallWatchdog = StallWatchdog(self.root.after, threshold=0.25)
+        self.load_library()
     
     @logger.log_execution_time
     def setup_gui(self) -> None:
@@ -110,15 +130,70 @@ class GUI:
 
         search_entry: ctk.CTkEntry = ctk.CTkEntry(frame, placeholder_text="Enter search term...")
         search_entry.pack(pady=10)
+        self.search_entry: ctk.CTkEntry = search_entry
+
+        self.suggestion_frame: ctk.CTkFrame = ctk.CTkFrame(frame)
+        self.suggestion_job: Optional[str] = None
+        search_entry.bind("<KeyRelease>", self.schedule_suggestions)
+        search_entry.bind("<Escape>", lambda event: self.hide_suggestions())
+        search_entry.bind("<Return>", lambda event: self.perform_search(search_entry.get()))
+
+        self.fuzzy_search_var: ctk.BooleanVar = ctk.BooleanVar(value=False)
+        fuzzy_checkbox: ctk.CTkCheckBox = ctk.CTkCheckBox(frame, text="Typo tolerant", variable=self.fuzzy_search_var)
+        fuzzy_checkbox.pack(pady=5)
 
         search_btn: ctk.CTkButton = ctk.CTkButton(frame, text="Search", command=lambda: self.perform_search(search_entry.get()))
         search_btn.pack(pady=10)
 
+        export_btn: ctk.CTkButton = ctk.CTkButton(frame, text="Export Results...",
+                                                  command=lambda: self.export_results(search_entry.get()))
+        export_btn.pack(pady=5)
+
+        # One filter button per category of the current hits, filled by show_facets.
+        self.facet_frame: ctk.CTkFrame = ctk.CTkFrame(frame, fg_color="transparent")
+        self.facet_frame.pack(pady=5)
+
         self.search_results: ctk.CTkTextbox = ctk.CTkTextbox(frame, height=300)
         self.search_results.pack(pady=10, fill="both", expand=True)
 
         return frame
 
+    def schedule_suggestions(self, event: Any) -> None:
+        """Refresh the autocomplete dropdown shortly after the user stops typing."""
+        if event.keysym in ("Return", "Escape"):
+            return
+        if self.suggestion_job is not None:
+            self.root.after_cancel(self.suggestion_job)
+        self.suggestion_job = self.root.after(120, self.update_suggestions)
+
+    def update_suggestions(self) -> None:
+        """Show the completions of the current search text as a dropdown below the entry."""
+        self.suggestion_job = None
+        for widget in self.suggestion_frame.winfo_children():
+            widget.destroy()
+        suggestions: List[str] = self.controller.suggest(self.search_entry.get(), limit=8)
+        if not suggestions:
+            self.hide_suggestions()
+            return
+        for suggestion in suggestions:
+            btn: ctk.CTkButton = ctk.CTkButton(self.suggestion_frame, text=suggestion, anchor="w",
+                                               fg_color="transparent", text_color=("gray10", "gray90"),
+                                               command=lambda s=suggestion: self.select_suggestion(s))
+            btn.pack(fill="x")
+        self.suggestion_frame.place(in_=self.search_entry, relx=0, rely=1, relwidth=1)
+        self.suggestion_frame.lift()
+
+    def select_suggestion(self, suggestion: str) -> None:
+        """Put a suggestion into the search entry and run the search."""
+        self.search_entry.delete(0, ctk.END)
+        self.search_entry.insert(0, suggestion)
+        self.hide_suggestions()
+        self.perform_search(suggestion)
+
+    def hide_suggestions(self) -> None:
+        """Hide the autocomplete dropdown."""
+        self.suggestion_frame.place_forget()
+
     def show_home(self) -> None:
         """Display the home frame."""
         self.clear_main_content()
@@ -147,6 +222,7 @@ class GUI:
         """Clear all widgets from the main content area."""
         for widget in self.main_content.winfo_children():
             widget.pack_forget()
+        self.shown_collection = None
 
     @logger.log_execution_time
     def setup_settings_window(self) -> None:
@@ -154,7 +230,7 @@ class GUI:
         try:
             self.settings_window: ctk.CTkToplevel = ctk.CTkToplevel(self.root)
             self.settings_window.title("Settings")
-            self.settings_window.geometry("300x150")
+            self.settings_window.geometry("300x200")
             self.settings_window.withdraw()
 
             theme_label: ctk.CTkLabel = ctk.CTkLabel(self.settings_window, text="Theme")
@@ -164,6 +240,11 @@ class GUI:
             self.theme_switch.pack(pady=10)
             self.theme_switch.select() if self.dark_mode else self.theme_switch.deselect()
 
+            self.profiling_switch: ctk.CTkSwitch = ctk.CTkSwitch(self.settings_window, text="Profile operations",
+                                                                 command=self.toggle_profiling)
+            self.profiling_switch.pack(pady=10)
+            self.profiling_switch.select() if self.controller.profiler.enabled else self.profiling_switch.deselect()
+
             close_button: ctk.CTkButton = ctk.CTkButton(self.settings_window, text="Close", command=self.settings_window.withdraw)
             close_button.pack(pady=10)
 
@@ -185,10 +266,154 @@ class GUI:
             logger.error(f"Error toggling theme: {str(e)}", exc_info=True)
             self.show_error("An error occurred while changing the theme.")
 
+    @logger.log_execution_time
+    def toggle_profiling(self) -> None:
+        """Switch CPU and memory profiling of library operations on or off."""
+        try:
+            if not self.profiling_switch.get():
+                self.controller.disable_profiling()
+                self.show_success("Profiling stopped.")
+            elif self.controller.enable_profiling():
+                self.show_success(f"Profiling operations into {self.controller.profiler.directory}.")
+            else:
+                self.profiling_switch.deselect()
+                self.show_error("Could not start profiling.")
+        except Exception as e:
+            logger.error(f"Error toggling profiling: {str(e)}", exc_info=True)
+            self.show_error("An error occurred while changing profiling.")
+
     def setup_status_bar(self) -> None:
         """Set up the status bar at the bottom of the main window."""
         self.status_bar: ctk.CTkLabel = ctk.CTkLabel(self.root, text="Ready", anchor="w")
         self.status_bar.pack(side="bottom", fill="x", padx=10, pady=5)
+        self.save_status_label: ctk.CTkLabel = ctk.CTkLabel(self.root, text="", anchor="e")
+        self.save_status_label.place(relx=1.0, rely=1.0, x=-10, y=-5, anchor="se")
+        self.save_status_queue: "queue.Queue[tuple]" = queue.Queue()
+
+    def load_library(self) -> None:
+        """Load the library file on a background thread while a progress bar tracks it."""
+        if not os.path.exists(self.data_file):
+            self.start_autosave()
+            self.start_file_watcher()
+            return
+        self.load_progress: Dict[str, Any] = {"fraction": 0.0, "done": False, "success": False}
+        self.progress_bar: ctk.CTkProgressBar = ctk.CTkProgressBar(self.root)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side="bottom", fill="x", padx=10)
+        self.status_bar.configure(text="Loading library...")
+
+        def on_progress(bytes_read: int, total_bytes: int, collections_loaded: int) -> None:
+            self.load_progress["fraction"] = bytes_read / total_bytes if total_bytes else 1.0
+
+        def worker() -> None:
+            self.load_progress["success"] = self.controller.load_from_file(self.data_file, on_progress)
+            self.load_progress["done"] = True
+
+        threading.Thread(target=worker, name="library-loader", daemon=True).start()
+        self.root.after(100, self.poll_load_progress)
+
+    def poll_load_progress(self) -> None:
+        """Update the progress bar from the Tk thread until the background load finishes."""
+        self.progress_bar.set(self.load_progress["fraction"])
+        if not self.load_progress["done"]:
+            self.root.after(100, self.poll_load_progress)
+            return
+        self.progress_bar.pack_forget()
+        if self.load_progress["success"]:
+            self.update_collections_frame()
+            self.show_success(f"Loaded {len(self.controller.get_collections())} collections.")
+            self.start_autosave()
+            self.start_file_watcher()
+            # Once the loaded library is on screen, prepare the favourite collections and searches.
+            self.root.after_idle(self.controller.warm_up)
+        else:
+            # Autosave stays off so an unreadable file is never overwritten with an empty library.
+            self.show_error("Failed to load the library file.")
+
+    def start_autosave(self) -> None:
+        """Keep the library file saved in the background and show save status beside the status bar."""
+        def on_status(state: str, details: Dict[str, Any]) -> None:
+            # Runs on the autosave thread; Tk widgets are only touched from poll_save_status.
+            self.save_status_queue.put((state, details))
+
+        if self.controller.enable_autosave(self.data_file, status_callback=on_status):
+            self.root.after(200, self.poll_save_status)
+
+    def poll_save_status(self) -> None:
+        """Show the latest autosave status from the Tk thread."""
+        latest = None
+        while True:
+            try:
+                latest = self.save_status_queue.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            state, details = latest
+            if state == "dirty":
+                self.save_status_label.configure(text="Unsaved changes", text_color="gray")
+            elif state == "saving":
+                self.save_status_label.configure(text="Saving...", text_color="gray")
+            elif state == "saved":
+                self.save_status_label.configure(text=f"Saved in {details['duration']:.2f}s", text_color="green")
+            else:
+                self.save_status_label.configure(text="Autosave failed", text_color="red")
+        self.root.after(200, self.poll_save_status)
+
+    def start_file_watcher(self) -> None:
+        """Reload collections that other programs change in the library file."""
+        # Filled on the watcher thread; Tk widgets are only touched from poll_file_changes.
+        self.file_changes: "queue.Queue[Dict[str, List[str]]]" = queue.Queue()
+        if self.controller.watch_library(self.data_file, on_change=self.file_changes.put):
+            self.root.after(500, self.poll_file_changes)
+
+    def poll_file_changes(self) -> None:
+        """Refresh the views showing collections reloaded from disk, from the Tk thread."""
+        while True:
+            try:
+                changes = self.file_changes.get_nowait()
+            except queue.Empty:
+                break
+            reloaded = changes["added"] + changes["updated"] + changes["removed"]
+            if reloaded:
+                self.update_collections_frame()
+                if self.shown_collection in changes["updated"]:
+                    self.show_collection_items({"name": self.shown_collection})
+                elif self.shown_collection in changes["removed"]:
+                    self.show_collections()
+                self.show_success(f"Reloaded from disk: {', '.join(sorted(reloaded))}.")
+            if changes["conflicts"]:
+                self.show_error(f"Kept unsaved changes to {', '.join(sorted(changes['conflicts']))} "
+                                f"over the versions changed on disk.")
+        self.root.after(500, self.poll_file_changes)
+
+    def export_results(self, search_term: str) -> None:
+        """Export the items matching the search term on a background thread with a progress bar."""
+        filename: str = filedialog.asksaveasfilename(
+            title="Export items", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Columnar", "*.tlcols")])
+        if not filename:
+            return
+        job = self.controller.start_export(filename, search=search_term or None)
+        if job is None:
+            self.show_error("Could not start the export.")
+            return
+        self.export_progress_bar: ctk.CTkProgressBar = ctk.CTkProgressBar(self.root)
+        self.export_progress_bar.set(0)
+        self.export_progress_bar.pack(side="bottom", fill="x", padx=10)
+        self.status_bar.configure(text="Exporting...")
+        self.root.after(100, lambda: self.poll_export_progress(job))
+
+    def poll_export_progress(self, job: Any) -> None:
+        """Update the export progress bar from the Tk thread until the job finishes."""
+        self.export_progress_bar.set(job.rows_written / job.total_rows if job.total_rows else 0.0)
+        if not job.done.is_set():
+            self.root.after(100, lambda: self.poll_export_progress(job))
+            return
+        self.export_progress_bar.pack_forget()
+        if job.error is None:
+            self.show_success(f"Exported {job.rows_written} items in {job.seconds:.2f}s ({job.rows_per_second:.0f} rows/s).")
+        else:
+            self.show_error(f"Export failed: {job.error}")
 
     def show_error(self, message: str) -> None:
         """Display an error message in the status bar."""
@@ -219,11 +444,23 @@ class GUI:
     def load_icon(self, filename: str) -> Optional[ctk.CTkImage]:
         """Load an icon image."""
         try:
-            return ctk.CTkImage(Image.open(os.path.join("assets", "icons", filename)), size=(20, 20))
+            return self.images.load(os.path.join("assets", "icons", filename), (20, 20))
         except Exception as e:
             logger.error(f"Error loading icon {filename}: {str(e)}")
             return None
 
+    def poll_images(self) -> None:
+        """Swap decoded cover thumbnails in for their placeholders."""
+        self.images.deliver()
+        self.root.after(50, self.poll_images)
+
+    def add_cover(self, parent: ctk.CTkFrame, path: str) -> None:
+        """Show an item's cover thumbnail, with a placeholder until it has been decoded off the Tk thread."""
+        cover_label: ctk.CTkLabel = ctk.CTkLabel(parent, text="")
+        image = self.images.get(path, COVER_SIZE, lambda image: cover_label.configure(image=image))
+        cover_label.configure(image=image or self.cover_placeholder)
+        cover_label.pack(side="left", padx=5)
+
     @logger.log_execution_time
     def add_new_collection(self) -> None:
         """Add a new collection."""
@@ -246,6 +483,7 @@ class GUI:
     def show_collection_items(self, collection: Dict[str, Any]) -> None:
         """Display items in a collection."""
         self.clear_main_content()
+        self.shown_collection = collection['name']
         frame: ctk.CTkFrame = ctk.CTkFrame(self.main_content)
         frame.pack(fill="both", expand=True)
 
@@ -257,6 +495,9 @@ class GUI:
             item_frame: ctk.CTkFrame = ctk.CTkFrame(frame)
             item_frame.pack(pady=5, padx=10, fill="x")
 
+            if item.get('cover'):
+                self.add_cover(item_frame, item['cover'])
+
             name_label: ctk.CTkLabel = ctk.CTkLabel(item_frame, text=item['name'])
             name_label.pack(side="left", padx=5)
 
@@ -307,21 +548,46 @@ class GUI:
         submit_btn.pack(pady=10)
 
     @logger.log_execution_time
-    def perform_search(self, search_term: str) -> None:
-        """Perform a search and display results."""
-        results: List[Dict[str, Any]] = self.controller.search_items(search_term)
+    def perform_search(self, search_term: str, category: Optional[str] = None) -> None:
+        """Perform a search and display a page of results with clickable per-category counts."""
+        self.hide_suggestions()
+        result: Dict[str, Any] = self.controller.faceted_search(search_term, category, limit=SEARCH_PAGE_SIZE,
+                                                                fuzzy=self.fuzzy_search_var.get())
+        self.show_facets(search_term, result["facets"], category)
         self.search_results.delete("1.0", ctk.END)
-        if results:
-            for item in results:
+        if result["items"]:
+            for item in result["items"]:
                 self.search_results.insert(ctk.END, f"Name: {item['name']}, Category: {item['category']},Price: ${item['price']:.2f}\n")
+            hidden: int = result["total"] - len(result["items"])
+            if hidden > 0:
+                self.search_results.insert(ctk.END, f"... and {hidden:,} more. Refine the search or pick a category.\n")
         else:
             self.search_results.insert(ctk.END, "No results found.")
 
+    def show_facets(self, search_term: str, facets: Dict[str, int], selected: Optional[str]) -> None:
+        """Show an "All" button and one button per category with its number of hits; clicking one filters the results."""
+        for widget in self.facet_frame.winfo_children():
+            widget.destroy()
+        if not facets:
+            return
+        choices = [(None, f"All ({sum(facets.values()):,})")]
+        choices += [(name, f"{name} ({count:,})") for name, count in facets.items()]
+        for category, text in choices:
+            is_selected: bool = (category or "").lower() == (selected or "").lower()
+            style: Dict[str, Any] = {} if is_selected else {"fg_color": "transparent", "text_color": ("gray10", "gray90")}
+            btn: ctk.CTkButton = ctk.CTkButton(self.facet_frame, text=text, width=0,
+                                               command=lambda c=category: self.perform_search(search_term, c), **style)
+            btn.pack(side="left", padx=2)
+
     @logger.log_execution_time
     def run(self):
         """Run the main GUI loop."""
         try:
+            self.watchdog.start()
             self.root.mainloop()
             logger.info("GUI main loop started")
         except Exception as e:
-            logger.error(f"Error in GUI main loop: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Error in GUI main loop: {str(e)}", exc_info=True)
+        finally:
+            self.watchdog.stop()
+            self.images.close()
\ No newline at end of file
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from logger import logger
+
+# Directory under the user data directory holding scaled copies of source images.
+THUMBNAIL_DIR = "thumbnails"
+
+Size = Tuple[int, int]
+# (absolute source path, modification time in ns, file size, thumbnail size)
+_Key = Tuple[str, int, int, Size]
+
+
+class ImageCache:
+    """
+    Decoded, pre-scaled images for the GUI, cached in memory and on disk.
+
+    get() is called on the Tk thread and never decodes there: it returns an
+    image straight from the in-memory LRU, or queues the work on a thread pool
+    and returns None so the caller can show a placeholder. Workers read the
+    scaled copy from the on-disk cache, or decode and scale the source and
+    write that copy, keyed by source path, modification time, file size and
+    thumbnail size. deliver(), polled from the Tk thread, wraps finished images
+    with `make_image` (for example in a CTkImage), adds them to the LRU and
+    calls the waiting callbacks.
+    """
+
+    def __init__(self, cache_dir: str, make_image: Callable[[Image.Image], Any],
+                 memory_items: int = 256, workers: int = 2) -> None:
+        """
+        Initialize the cache and its worker pool.
+
+        Args:
+            cache_dir (str): Directory for scaled copies; created if missing.
+            make_image (Callable[[Image.Image], Any]): Wraps a decoded image for display. Runs on the Tk thread.
+            memory_items (int): Number of wrapped images kept in memory.
+            workers (int): Number of decoding threads.
+        """
+        self.cache_dir: str = cache_dir
+        self.make_image: Callable[[Image.Image], Any] = make_image
+        self.memory_items: int = max(1, memory_items)
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.decodes: int = 0
+        self.errors: int = 0
+        self._memory: "OrderedDict[_Key, Any]" = OrderedDict()
+        self._waiting: Dict[_Key, List[Callable[[Any], None]]] = {}
+        self._failed: Set[_Key] = set()
+        self._done: "queue.Queue[Tuple[_Key, Optional[Image.Image]]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max(1, workers), thread_name_prefix="thumbnail")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, path: str, size: Size, on_ready: Optional[Callable[[Any], None]] = None) -> Optional[Any]:
+        """
+        Return the image for `path` scaled to fit `size` if it is in memory, else start loading it.
+
+        Args:
+            path (str): The source image file.
+            size (Size): The bounding box of the thumbnail, in pixels.
+            on_ready (Optional[Callable[[Any], None]]): Called from deliver() with the image once loaded.
+                Not called if the image cannot be loaded.
+
+        Returns:
+            Optional[Any]: The wrapped image, or None while it is loading or if it cannot be loaded.
+        """
+        key = self._key(path, size)
+        if key is None or key in self._failed:
+            return None
+        image = self._memory.get(key)
+        if image is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return image
+        waiting = self._waiting.get(key)
+        if waiting is None:
+            waiting = self._waiting[key] = []
+            self._pool.submit(self._load_in_background, key)
+        if on_ready is not None:
+            waiting.append(on_ready)
+        return None
+
+    def load(self, path: str, size: Size) -> Optional[Any]:
+        """
+        Return the image for `path` scaled to fit `size`, loading it on the calling thread if needed.
+
+        For small images needed before the window is shown, such as icons.
+        """
+        key = self._key(path, size)
+        if key is None or key in self._failed:
+            return None
+        if key not in self._memory:
+            scaled = self._load(key)
+            if scaled is None:
+                return None
+            self._remember(key, self.make_image(scaled))
+        self._memory.move_to_end(key)
+        return self._memory[key]
+
+    def deliver(self, limit: int = 64) -> int:
+        """
+        Hand finished images to their callbacks. Call periodically from the Tk thread.
+
+        Args:
+            limit (int): Maximum number of images to deliver in one call, to keep the Tk thread responsive.
+
+        Returns:
+            int: The number of images delivered.
+        """
+        delivered = 0
+        while delivered < limit:
+            try:
+                key, scaled = self._done.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self._waiting.pop(key, [])
+            if scaled is None:
+                self._failed.add(key)
+                continue
+            image = self.make_image(scaled)
+            self._remember(key, image)
+            delivered += 1
+            for callback in callbacks:
+                try:
+                    callback(image)
+                except Exception as e:
+                    # Typically the widget was destroyed while its image was loading.
+                    logger.debug(f"Image callback failed: {str(e)}")
+        return delivered
+
+    def stats(self) -> Dict[str, int]:
+        """Return memory hits, disk cache hits, decodes, errors and the number of images in memory."""
+        with self._stats_lock:
+            return {"memory_hits": self.hits, "disk_hits": self.disk_hits, "decodes": self.decodes,
+                    "errors": self.errors, "in_memory": len(self._memory), "loading": len(self._waiting)}
+
+    def close(self) -> None:
+        """Stop the worker pool, abandoning queued loads."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _remember(self, key: _Key, image: Any) -> None:
+        self._memory[key] = image
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _key(path: str, size: Size) -> Optional[_Key]:
+        try:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            return path, stat.st_mtime_ns, stat.st_size, (int(size[0]), int(size[1]))
+        except OSError as e:
+            logger.debug(f"Cannot read image '{path}': {str(e)}")
+            return None
+
+    def _load_in_background(self, key: _Key) -> None:
+        self._done.put((key, self._load(key)))
+
+    def _load(self, key: _Key) -> Optional[Image.Image]:
+        """Return the scaled image from the disk cache, or decode, scale and cache it."""
+        path, _, _, size = key
+        cached = os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".png")
+        try:
+            if os.path.exists(cached):
+                with Image.open(cached) as image:
+                    scaled = image.copy()
+                with self._stats_lock:
+                    self.disk_hits += 1
+                return scaled
+            with Image.open(path) as image:
+                # Lets JPEG decode at a reduced scale instead of full size.
+                image.draft("RGB", size)
+                scaled = image.convert("RGBA")
+            scaled.thumbnail(size)
+            self._write(scaled, cached)
+            with self._stats_lock:
+                self.decodes += 1
+            return scaled
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.error(f"Error loading image '{path}': {str(e)}")
+            return None
+
+    def _write(self, image: Image.Image, filename: str) -> None:
+        """Atomically write a scaled copy to the disk cache; failures only cost a later re-decode."""
+        fd, temp_path = tempfile.mkstemp(prefix=".thumbnail-", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="PNG")
+            os.replace(temp_path, filename)
+        except OSError as e:
+            logger.warning(f"Could not cache thumbnail '{filename}': {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,491 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from parallel_search import ItemRef
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(text: Any) -> str:
+    """
+    Normalize text for indexing: strip accents, casefold and collapse punctuation and whitespace.
+
+    Args:
+        text (Any): The value to normalize. Non-strings are converted with str().
+
+    Returns:
+        str: The normalized text, e.g. "Harry Potter!" -> "harry potter".
+    """
+    if not isinstance(text, str):
+        text = "" if text is None else str(text)
+    if text.isascii():
+        return _NON_WORD.sub(" ", text.lower()).strip()
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped.casefold()).strip()
+
+
+def price_key(item: Any) -> float:
+    """Return an item's price as a float sort key; items without a numeric price sort last."""
+    price = item.get('price') if isinstance(item, dict) else None
+    if isinstance(price, (int, float)) and not isinstance(price, bool) and price == price:
+        return float(price)
+    return math.inf
+
+
+def name_key(item: Any) -> str:
+    """Return an item's normalized name as a sort key."""
+    return normalize_text(item.get('name', '')) if isinstance(item, dict) else ""
+
+
+# Fields that can be used to order items, mapped to the function computing their sort key.
+SORT_KEYS: Dict[str, Callable[[Any], Any]] = {"price": price_key, "name": name_key}
+
+# Upper bound used for open-ended price ranges, chosen so items without a price stay excluded.
+MAX_PRICE: float = 1.7976931348623157e308
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Return the padded character trigrams of an already normalized string."""
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    An inverted index from character trigrams to items, used for typo-tolerant search.
+
+    Every indexed item gets a compact document number; each trigram maps to an
+    array of the document numbers containing it. Queries count shared trigrams
+    straight from the posting lists, so candidate names are never re-tokenized,
+    and keep the best candidates in a bounded heap.
+
+    Each collection also has an array of the document number in every item
+    slot, so removing an item is O(1): its document is only marked dead and
+    skipped by queries, and its postings go away when the index is rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self._refs: List[Optional[ItemRef]] = []
+        self._gram_counts: array = array('H')
+        self._postings: Dict[str, array] = defaultdict(lambda: array('I'))
+        self._slots: Dict[int, array] = {}
+        self.dead: int = 0
+
+    def __len__(self) -> int:
+        return len(self._refs) - self.dead
+
+    def add(self, ref: ItemRef, name: Any) -> None:
+        """
+        Index one item name.
+
+        Args:
+            ref (ItemRef): The (collection index, item index) position of the item.
+            name (Any): The item's name.
+        """
+        grams = trigrams(normalize_text(name))
+        doc = len(self._refs)
+        self._refs.append(ref)
+        self._gram_counts.append(min(len(grams), 0xFFFF))
+        postings = self._postings
+        for gram in grams:
+            postings[gram].append(doc)
+        slots = self._slots.setdefault(ref[0], array('i'))
+        if len(slots) <= ref[1]:
+            slots.extend([-1] * (ref[1] + 1 - len(slots)))
+        slots[ref[1]] = doc
+
+    def remove(self, ref: ItemRef) -> None:
+        """Stop returning the item at `ref`."""
+        slots = self._slots.get(ref[0])
+        if slots is None or ref[1] >= len(slots) or slots[ref[1]] < 0:
+            return
+        self._refs[slots[ref[1]]] = None
+        slots[ref[1]] = -1
+        self.dead += 1
+
+    def compact(self, collection_index: int, keep: List[int]) -> None:
+        """Renumber one collection's items after its list was compacted to the given positions."""
+        slots = self._slots.get(collection_index)
+        if slots is None:
+            return
+        kept = array('i', [slots[position] if position < len(slots) else -1 for position in keep])
+        refs = self._refs
+        for position, doc in enumerate(kept):
+            if doc >= 0:
+                refs[doc] = (collection_index, position)
+        self._slots[collection_index] = kept
+
+    def build(self, entries: Iterable[Tuple[ItemRef, Any]]) -> None:
+        """Index every (ref, name) pair in the given iterable."""
+        for ref, name in entries:
+            self.add(ref, name)
+
+    def posting_size(self, gram: str) -> int:
+        """Return the number of indexed names containing a trigram."""
+        posting = self._postings.get(gram)
+        return len(posting) if posting is not None else 0
+
+    def refs_containing_all(self, grams: Set[str]) -> List[ItemRef]:
+        """
+        Return the items whose names contain every given trigram, in library order.
+
+        Posting lists are intersected smallest first, so the cost is bounded by
+        the rarest trigram.
+        """
+        postings = sorted((self._postings.get(g, ()) for g in grams), key=len)
+        if not postings or not postings[0]:
+            return []
+        docs = set(postings[0])
+        for posting in postings[1:]:
+            docs.intersection_update(posting)
+            if not docs:
+                return []
+        refs = self._refs
+        return sorted(refs[doc] for doc in docs if refs[doc] is not None)
+
+    def search(self, query: str, limit: int = 10, min_similarity: float = 0.5) -> List[Tuple[float, ItemRef]]:
+        """
+        Return the items whose names best approximate the query.
+
+        Items are ranked by the share of the query's trigrams they contain and,
+        on ties, by Dice similarity so that closer-length names come first.
+
+        Args:
+            query (str): The raw query text.
+            limit (int): The maximum number of results to return.
+            min_similarity (float): Minimum share of query trigrams a result must contain.
+
+        Returns:
+            List[Tuple[float, ItemRef]]: (score, ref) pairs, best first.
+        """
+        query_grams = trigrams(normalize_text(query))
+        if not query_grams or limit <= 0:
+            return []
+
+        needed = max(1, math.ceil(min_similarity * len(query_grams)))
+        present = [self._postings[g] for g in query_grams if g in self._postings]
+        if len(present) < needed:
+            return []
+        shared_counts: Counter = Counter()
+        for posting in present:
+            shared_counts.update(posting)
+
+        query_size = len(query_grams)
+        gram_counts, refs = self._gram_counts, self._refs
+        best = heapq.nlargest(limit, (
+            (shared / query_size, 2 * shared / (query_size + gram_counts[doc]), -doc)
+            for doc, shared in shared_counts.items() if shared >= needed and refs[doc] is not None
+        ))
+        return [(round(coverage * 0.8 + dice * 0.2, 4), self._refs[-neg_doc]) for coverage, dice, neg_doc in best]
+
+
+class SortedIndex:
+    """
+    A secondary index keeping item references ordered by a sort key.
+
+    Entries are (key, collection index, item index) tuples in one sorted list,
+    so equal keys keep library order, inserts and removals are a bisection plus
+    a shift of the list's tail, and a range or page lookup costs O(log n + page).
+    """
+
+    def __init__(self) -> None:
+        self._entries: List[Tuple[Any, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def build(self, entries: Iterable[Tuple[Any, ItemRef]]) -> None:
+        """Replace the index contents with the given (key, ref) pairs."""
+        self._entries = sorted((key, ci, ii) for key, (ci, ii) in entries)
+
+    def insert(self, key: Any, ref: ItemRef) -> None:
+        """Insert one item reference at its ordered position."""
+        bisect.insort(self._entries, (key, ref[0], ref[1]))
+
+    def remove(self, key: Any, ref: ItemRef) -> None:
+        """Remove one item reference, given the key it was inserted with."""
+        entry = (key, ref[0], ref[1])
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def compact(self, collection_index: int, keep: List[int], own: Optional["SortedIndex"] = None) -> None:
+        """
+        Renumber one collection's entries after its item list was compacted to the given positions.
+
+        Positions only move down and keep their order, so the list stays sorted.
+
+        Args:
+            collection_index (int): The compacted collection.
+            keep (List[int]): The old positions of the remaining items, in order.
+            own (Optional[SortedIndex]): The collection's own index, before it is compacted, when
+                this index covers the whole library; its entries are then found by bisection
+                instead of scanning every entry.
+        """
+        moved = _moved(keep)
+        if own is None:
+            self._entries = [(key, ci, moved[ii]) for key, ci, ii in self._entries]
+            return
+        entries = self._entries
+        for entry in own._entries:
+            position = bisect.bisect_left(entries, entry)
+            entries[position] = (entry[0], collection_index, moved[entry[2]])
+
+    def bounds(self, low: Any = None, high: Any = None) -> Tuple[int, int]:
+        """Return the [start, stop) entry positions whose keys fall within [low, high]."""
+        start = 0 if low is None else bisect.bisect_left(self._entries, (low,))
+        stop = len(self._entries) if high is None else bisect.bisect_right(self._entries, (high, math.inf, math.inf))
+        return start, max(start, stop)
+
+    def page(self, offset: int = 0, limit: Optional[int] = None, descending: bool = False,
+             low: Any = None, high: Any = None) -> List[ItemRef]:
+        """
+        Return one page of item references in key order.
+
+        Args:
+            offset (int): Number of matching entries to skip.
+            limit (Optional[int]): Maximum number of references to return. None returns the rest.
+            descending (bool): Walk the index from the largest key down.
+            low (Any): Inclusive lower key bound, or None for no bound.
+            high (Any): Inclusive upper key bound, or None for no bound.
+
+        Returns:
+            List[ItemRef]: The references on the requested page.
+        """
+        start, stop = self.bounds(low, high)
+        if descending:
+            end = stop - offset
+            begin = start if limit is None else max(start, end - limit)
+            selected = reversed(self._entries[begin:max(begin, end)])
+        else:
+            begin = start + offset
+            end = stop if limit is None else min(stop, begin + limit)
+            selected = self._entries[begin:max(begin, end)]
+        return [(ci, ii) for _, ci, ii in selected]
+
+
+class CategoryIndex:
+    """
+    An inverted index from lowercased category to the references of its items.
+
+    Every bucket is kept sorted by (collection index, item index). Items are
+    mostly appended in library order, so an insert is usually an append; an
+    item added to an earlier collection is placed with a binary search. Sorted
+    buckets let facet counts intersect a sorted list of search hits with each
+    bucket without reading the items.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, List[ItemRef]] = defaultdict(list)
+        self._display: Dict[str, str] = {}
+
+    def add(self, ref: ItemRef, category: Any) -> None:
+        """Record that the item at `ref` belongs to `category`."""
+        key = str(category).lower()
+        postings = self._postings[key]
+        if not postings or postings[-1] < ref:
+            postings.append(ref)
+        else:
+            bisect.insort(postings, ref)
+        self._display.setdefault(key, str(category))
+
+    def remove(self, ref: ItemRef, category: Any) -> None:
+        """Forget that the item at `ref` belongs to `category`: a bisection plus a shift of the bucket's tail."""
+        postings = self._postings.get(str(category).lower())
+        if postings:
+            position = bisect.bisect_left(postings, ref)
+            if position < len(postings) and postings[position] == ref:
+                del postings[position]
+
+    def compact(self, collection_index: int, keep: List[int]) -> None:
+        """Renumber one collection's refs after its item list was compacted to the given positions."""
+        moved = _moved(keep)
+        for postings in self._postings.values():
+            start = bisect.bisect_left(postings, (collection_index,))
+            stop = bisect.bisect_left(postings, (collection_index + 1,), start)
+            if start < stop:
+                postings[start:stop] = [(collection_index, moved[ii]) for _, ii in postings[start:stop]]
+
+    def build(self, entries: Iterable[Tuple[ItemRef, Any]]) -> None:
+        """Index every (ref, category) pair in the given iterable."""
+        for ref, category in entries:
+            self.add(ref, category)
+
+    def refs(self, category: str) -> List[ItemRef]:
+        """Return the references of every item in a category (case-insensitive)."""
+        return self._postings.get(category.lower(), [])
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of items per lowercased category."""
+        return {category: len(refs) for category, refs in self._postings.items() if refs}
+
+    def intersect(self, refs: List[ItemRef], category: str) -> List[ItemRef]:
+        """Return the refs, a sorted list, that belong to a category (case-insensitive)."""
+        return _intersect_sorted(refs, self.refs(category))
+
+    def facet_counts(self, refs: List[ItemRef]) -> Dict[str, int]:
+        """
+        Count the refs, a sorted list, per category, largest count first.
+
+        Each bucket is intersected with the refs: by binary searches when one
+        list is much shorter, so a few hits in a large library cost
+        O(hits * log n) per category, otherwise by a set intersection.
+
+        Returns:
+            Dict[str, int]: Category names as first seen, e.g. "Book", mapped to counts.
+        """
+        members: Optional[Set[ItemRef]] = None
+        counts: Dict[str, int] = {}
+        for key, postings in self._postings.items():
+            if _prefer_bisect(refs, postings):
+                counts[self._display[key]] = len(_intersect_sorted(refs, postings))
+            else:
+                members = set(refs) if members is None else members
+                counts[self._display[key]] = len(members.intersection(postings))
+        ranked = sorted(((count, name) for name, count in counts.items() if count), key=lambda pair: (-pair[0], pair[1]))
+        return {name: count for count, name in ranked}
+
+
+def _moved(keep: List[int]) -> Dict[int, int]:
+    """Map the old positions kept by a compaction to their new positions."""
+    return {old: new for new, old in enumerate(keep)}
+
+
+def _prefer_bisect(a: List[ItemRef], b: List[ItemRef]) -> bool:
+    """Return True if bisecting the longer list for each element of the shorter beats hashing."""
+    short, long = sorted((len(a), len(b)))
+    return short * long.bit_length() < long
+
+
+def _intersect_sorted(a: List[ItemRef], b: List[ItemRef]) -> List[ItemRef]:
+    """Return the elements common to two sorted lists, in order."""
+    if len(a) > len(b):
+        a, b = b, a
+    if not _prefer_bisect(a, b):
+        members = set(a)
+        return [ref for ref in b if ref in members]
+    common: List[ItemRef] = []
+    low = 0
+    for ref in a:
+        low = bisect.bisect_left(b, ref, low)
+        if low == len(b):
+            break
+        if b[low] == ref:
+            common.append(ref)
+    return common
+
+
+class PrefixIndex:
+    """
+    A sorted-array prefix index over normalized names for autocompletion.
+
+    Unique normalized terms are kept in one sorted list, so the completions of a
+    prefix are a contiguous slice found with two bisections. Each term carries a
+    frequency (how many names normalize to it) and a recency stamp used for
+    ranking. Ranked results are cached per prefix; adding or removing a name
+    only drops the cache entries of its own prefixes.
+    """
+
+    # Number of ranked completions cached per prefix.
+    CACHE_DEPTH: int = 20
+
+    def __init__(self) -> None:
+        self._terms: List[str] = []
+        self._display: Dict[str, str] = {}
+        self._frequency: Dict[str, int] = {}
+        self._recency: Dict[str, int] = {}
+        self._sequence: int = 0
+        self._cache: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, text: Any) -> None:
+        """
+        Record one occurrence of a name.
+
+        Args:
+            text (Any): The name as entered; its latest spelling is what suggestions return.
+        """
+        term = normalize_text(text)
+        if not term:
+            return
+        if term not in self._frequency:
+            bisect.insort(self._terms, term)
+            self._frequency[term] = 0
+        self._frequency[term] += 1
+        self._sequence += 1
+        self._recency[term] = self._sequence
+        self._display[term] = str(text).strip()
+        self._invalidate(term)
+
+    def remove(self, text: Any) -> None:
+        """Forget one occurrence of a name; like a new term in add, a term's last occurrence shifts the term list."""
+        term = normalize_text(text)
+        count = self._frequency.get(term)
+        if not count:
+            return
+        if count > 1:
+            self._frequency[term] = count - 1
+        else:
+            del self._terms[bisect.bisect_left(self._terms, term)]
+            del self._frequency[term], self._recency[term], self._display[term]
+        self._invalidate(term)
+
+    def _invalidate(self, term: str) -> None:
+        """Drop the cached completions of every prefix of a term."""
+        cache = self._cache
+        if cache:
+            for end in range(len(term) + 1):
+                cache.pop(term[:end], None)
+
+    def build(self, texts: Iterable[Any]) -> None:
+        """Index every name in the iterable, sorting once at the end."""
+        for text in texts:
+            term = normalize_text(text)
+            if not term:
+                continue
+            self._frequency[term] = self._frequency.get(term, 0) + 1
+            self._sequence += 1
+            self._recency[term] = self._sequence
+            self._display[term] = str(text).strip()
+        self._terms = sorted(self._frequency)
+        self._cache = {}
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[str]:
+        """
+        Return the best completions of a prefix.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of completions to return.
+
+        Returns:
+            List[str]: Names starting with the prefix, most frequent first, then most recent.
+        """
+        term = normalize_text(prefix)
+        if not term or limit <= 0:
+            return []
+        cached = self._cache.get(term)
+        if cached is not None and (limit <= len(cached) or len(cached) < self.CACHE_DEPTH):
+            return cached[:limit]
+        start = bisect.bisect_left(self._terms, term)
+        stop = bisect.bisect_right(self._terms, term + "\U0010ffff", start)
+        frequency, recency = self._frequency, self._recency
+        depth = max(limit, self.CACHE_DEPTH)
+        if stop - start <= depth:
+            matches = sorted(self._terms[start:stop], key=lambda t: (frequency[t], recency[t]), reverse=True)
+        else:
+            matches = heapq.nlargest(depth, self._terms[start:stop], key=lambda t: (frequency[t], recency[t]))
+        ranked = [self._display[t] for t in matches]
+        self._cache[term] = ranked
+        return ranked[:limit]
@@ -0,0 +1,190 @@
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Ids are stored in signed 32-bit slots of the location table.
+MAX_ID = 2 ** 31 - 1
+
+# (first id, count) runs of consecutive ids, the persisted form of a collection's ids.
+IdRuns = List[List[int]]
+
+
+def encode_runs(ids: Sequence[int]) -> IdRuns:
+    """Encode ids as runs of consecutive values; items added in one go need one run."""
+    runs: IdRuns = []
+    for item_id in ids:
+        if runs and runs[-1][0] + runs[-1][1] == item_id:
+            runs[-1][1] += 1
+        else:
+            runs.append([item_id, 1])
+    return runs
+
+
+def decode_runs(runs: Any) -> Optional[List[int]]:
+    """Decode the output of encode_runs, or return None if it is malformed."""
+    if not isinstance(runs, list):
+        return None
+    ids: List[int] = []
+    for run in runs:
+        if (not isinstance(run, list) or len(run) != 2
+                or not all(type(value) is int for value in run)
+                or run[0] < 0 or run[1] < 1 or run[0] + run[1] - 1 > MAX_ID):
+            return None
+        ids.extend(range(run[0], run[0] + run[1]))
+    return ids
+
+
+class ItemIdIndex:
+    """
+    Stable ids for the items of a CollectionManager and where each item lives.
+
+    Every item gets the next unused integer id when it is added. `slots` holds,
+    for each collection, the id of the item in each position of its item list,
+    and two arrays indexed by id hold each id's collection and position, so
+    locating an item by id is O(1). A removed id is never handed out again.
+    Ids are persisted per collection as runs of consecutive ids (see
+    encode_runs), which usually takes a handful of numbers per collection,
+    and not at all while they still match the order of the items and no id
+    was released. Once one was, the next id is saved too, so a released id
+    is not handed out again after a reload.
+    """
+
+    def __init__(self) -> None:
+        self.slots: List[array] = []
+        self._collection = array("i")
+        self._position = array("q")
+
+    @property
+    def next_id(self) -> int:
+        return len(self._collection)
+
+    def reset(self, collections: List[Dict[str, Any]], persisted: List[Any], next_id: Any = None) -> int:
+        """
+        Assign ids to a freshly loaded library.
+
+        Args:
+            collections (List[Dict[str, Any]]): The loaded collections.
+            persisted (List[Any]): The "item_ids" runs saved with each collection, or None.
+            next_id (Any): The saved next id, or None. New ids start at or above it.
+
+        Returns:
+            int: The number of collections whose saved ids were missing or unusable and
+                were assigned new ones.
+        """
+        self.slots = []
+        decoded = [decode_runs(runs) for runs in persisted]
+        end = max((max(ids) + 1 for ids in decoded if ids), default=0)
+        if type(next_id) is int and end < next_id <= MAX_ID + 1:
+            end = next_id
+        self._collection = array("i", [-1]) * end
+        self._position = array("q", [-1]) * end
+        fresh: List[int] = []
+        for collection_index, (collection, ids) in enumerate(zip(collections, decoded)):
+            self.slots.append(array("q"))
+            if ids is None or len(ids) != len(collection["items"]) or not self._claim(collection_index, ids):
+                fresh.append(collection_index)
+        for collection_index in fresh:
+            for _ in range(len(collections[collection_index]["items"])):
+                self.add(collection_index)
+        return sum(1 for collection_index in fresh if collections[collection_index]["items"])
+
+    def add_collection(self) -> None:
+        self.slots.append(array("q"))
+
+    def add(self, collection_index: int) -> int:
+        """Assign an id to an item appended to a collection and return it."""
+        item_id = len(self._collection)
+        if item_id > MAX_ID:
+            raise OverflowError("Item ids are exhausted")
+        slots = self.slots[collection_index]
+        self._collection.append(collection_index)
+        self._position.append(len(slots))
+        slots.append(item_id)
+        return item_id
+
+    def locate(self, item_id: int) -> Optional[Tuple[int, int]]:
+        """Return (collection index, position) of a live id, or None."""
+        if type(item_id) is not int or not 0 <= item_id < len(self._collection):
+            return None
+        collection_index = self._collection[item_id]
+        if collection_index < 0:
+            return None
+        return collection_index, self._position[item_id]
+
+    def remove(self, item_id: int) -> None:
+        """Forget an id; its slot keeps the number until the collection is compacted."""
+        self._collection[item_id] = -1
+        self._position[item_id] = -1
+
+    def compact(self, collection_index: int, keep: List[int]) -> None:
+        """Keep only the given positions of a collection, in order, and renumber the survivors."""
+        old = self.slots[collection_index]
+        slots = array("q", [old[position] for position in keep])
+        kept = set(slots)
+        for item_id in old:
+            if item_id not in kept and 0 <= item_id < len(self._collection) \
+                    and self._collection[item_id] == collection_index:
+                self.remove(item_id)
+        for position, item_id in enumerate(slots):
+            self._position[item_id] = position
+        self.slots[collection_index] = slots
+
+    def rebuild(self, sources: List[Optional[int]], lengths: List[int]) -> None:
+        """
+        Follow a rearranged collection list: new collection i keeps the ids of old
+        collection sources[i], or if that is None gets new ids for its lengths[i] items.
+        Ids of old collections that are not kept are released.
+        """
+        kept = {source for source in sources if source is not None}
+        for collection_index, slots in enumerate(self.slots):
+            if collection_index not in kept:
+                for item_id in slots:
+                    self.remove(item_id)
+        previous, self.slots = self.slots, []
+        for collection_index, source in enumerate(sources):
+            if source is None:
+                self.slots.append(array("q"))
+                for _ in range(lengths[collection_index]):
+                    self.add(collection_index)
+            else:
+                self.slots.append(previous[source])
+                if source != collection_index:
+                    for item_id in previous[source]:
+                        self._collection[item_id] = collection_index
+
+    def truncate(self, collection_count: int, lengths: Dict[int, int], next_id: int) -> None:
+        """Undo additions: drop collections past `collection_count`, shorten others and release ids from `next_id`."""
+        del self.slots[collection_count:]
+        for collection_index, length in lengths.items():
+            del self.slots[collection_index][length:]
+        del self._collection[next_id:]
+        del self._position[next_id:]
+
+    def persisted(self) -> Optional[List[IdRuns]]:
+        """
+        Return the runs to save with each collection, skipping the ids of deleted items.
+
+        Returns None when the ids are the ones reset() assigns to a library saved
+        without ids (0, 1, 2, ... in library order) and no id was released, so
+        nothing needs saving. Otherwise next_id must be saved with the runs.
+        """
+        located = self._collection
+        runs = [encode_runs([item_id for item_id in slots if located[item_id] >= 0]) for slots in self.slots]
+        expected = 0
+        for collection_runs in runs:
+            for first, count in collection_runs:
+                if first != expected:
+                    return runs
+                expected += count
+        return None if expected == self.next_id else runs
+
+    def _claim(self, collection_index: int, ids: List[int]) -> bool:
+        """Place saved ids; on a clash with another collection, undo and return False."""
+        for position, item_id in enumerate(ids):
+            if self._collection[item_id] >= 0:
+                for placed in ids[:position]:
+                    self.remove(placed)
+                return False
+            self._collection[item_id] = collection_index
+            self._position[item_id] = position
+        self.slots[collection_index] = array("q", ids)
+        return True
@@ -1,9 +1,9 @@
 import logging
 import os
 import sys
-from pathlib import Path
 from typing import Callable, Optional
 from controller import Controller
+from paths import get_user_data_dir
 from gui import GUI
 import customtkinter as ctk
 
@@ -37,37 +37,15 @@ def get_base_dir() -> str:
         logging.error(f"Error getting base directory: {str(e)}")
         raise
     
-def get_user_data_dir() -> str:
-    """
-    Get the user data directory for storing application data.
-
-    Returns:
-        str: The path to the user data directory.
-
-    Raises:
-        OSError: If there's an error creating the directory.
-    """
-    try:
-        home: Path = Path.home()
-        if sys.platform == "win32":
-            user_data_dir: Path = home / "AppData/Local/TheLibrary"
-        elif sys.platform == "darwin":
-            user_data_dir: Path = home / "Library/Application Support/TheLibrary"
-        user_data_dir.mkdir(parents=True, exist_ok=True)
-    
-        return str(user_data_dir)
-    except OSError as e:
-        logging.error(f"Error creating user data directory: {str(e)}")
-        raise
-
 def main() -> None:
     setup_logging()
     logger: logging.Logger = logging.getLogger(__name__)
     logger.info("Starting The Library application")
+    controller: Optional[Controller] = None
     
     try:
         logger.info("Initializing Controller")
-        controller: Controller = Controller(get_user_data_dir)
+        controller: Controller = Controller(get_user_data_dir, track_access=True)
         logger.info("Controller initialized successfully")
         
         logger.info("Initializing GUI")
@@ -83,6 +61,8 @@ def main() -> None:
         print("Please check the log file for more details.")
     finally:
         logger.info("Cleaning up resources")
+        if controller is not None:
+            controller.close()
         cleanup_ctk(logger)
 
 def cleanup_ctk(logger: logging.Logger) -> None:
@@ -0,0 +1,144 @@
+import hashlib
+import json
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Items are grouped into this many buckets per collection by the top byte of their digest.
+BUCKETS = 256
+
+_MASK = (1 << 64) - 1
+
+
+def item_digest(item: Any) -> int:
+    """Return a 64-bit digest of an item's canonical JSON form; key order does not matter."""
+    data = json.dumps(item, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def bucket_of(digest: int) -> int:
+    """Return the bucket an item digest belongs to."""
+    return digest >> 56
+
+
+class CollectionNode:
+    """
+    The hash subtree of one collection: a digest per item and a running sum per bucket.
+
+    Bucket sums are additive (the sum of their item digests modulo 2**64), so
+    adding, replacing or removing an item updates one bucket in O(1) regardless
+    of item order. The collection hash over the name and all bucket sums is
+    computed on demand and cached until the next change.
+    """
+    __slots__ = ("name", "digests", "sums", "_hash")
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.digests = array("Q")
+        self.sums: List[int] = [0] * BUCKETS
+        self._hash: bytes = b""
+
+    def add(self, digest: int) -> None:
+        self.digests.append(digest)
+        self._count(digest, 1)
+
+    def skip(self) -> None:
+        """Hold the position of a deleted item without counting it."""
+        self.digests.append(0)
+
+    def remove(self, position: int) -> None:
+        """Stop counting an item; its stale digest stays until compact()."""
+        self._count(self.digests[position], -1)
+
+    def replace(self, position: int, digest: int) -> None:
+        self.remove(position)
+        self.digests[position] = digest
+        self._count(digest, 1)
+
+    def _count(self, digest: int, sign: int) -> None:
+        bucket = bucket_of(digest)
+        self.sums[bucket] = (self.sums[bucket] + sign * digest) & _MASK
+        self._hash = b""
+
+    def hash(self) -> bytes:
+        if not self._hash:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(self.name.encode("utf-8"))
+            h.update(b"".join(total.to_bytes(8, "big") for total in self.sums))
+            self._hash = h.digest()
+        return self._hash
+
+
+class MerkleIndex:
+    """
+    Content hashes for a library: items roll up into buckets, buckets into
+    collections and collections into a single root.
+
+    Two libraries hold the same collections and items exactly when their roots
+    match. When they do not, comparing collection hashes and then bucket hashes
+    narrows the difference down to a few buckets, and only the item digests of
+    those buckets need to be compared. Every level is exchanged as hex strings,
+    so the other library can be remote.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: List[CollectionNode] = []
+        self._root: str = ""
+
+    def build(self, collections: Iterable[Dict[str, Any]]) -> None:
+        """Hash every item of every collection, replacing the current contents."""
+        self.nodes = []
+        for collection in collections:
+            node = CollectionNode(collection["name"])
+            for item in collection["items"]:
+                if item is None:
+                    node.skip()
+                else:
+                    node.add(item_digest(item))
+            self.nodes.append(node)
+        self._root = ""
+
+    def add_collection(self, name: str) -> None:
+        self.nodes.append(CollectionNode(name))
+        self._root = ""
+
+    def add(self, collection_index: int, item: Any) -> None:
+        self.nodes[collection_index].add(item_digest(item))
+        self._root = ""
+
+    def remove(self, collection_index: int, item_index: int) -> None:
+        self.nodes[collection_index].remove(item_index)
+        self._root = ""
+
+    def replace(self, collection_index: int, item_index: int, item: Any) -> None:
+        self.nodes[collection_index].replace(item_index, item_digest(item))
+        self._root = ""
+
+    def compact(self, collection_index: int, keep: List[int]) -> None:
+        """Keep the digests of the given item positions only, after the item list was compacted."""
+        node = self.nodes[collection_index]
+        node.digests = array("Q", [node.digests[position] for position in keep])
+
+    def root(self) -> str:
+        """Return the library root hash, computed over the collection hashes in name order."""
+        if not self._root:
+            h = hashlib.blake2b(digest_size=16)
+            for node in sorted(self.nodes, key=lambda n: n.name):
+                h.update(node.hash())
+            self._root = h.hexdigest()
+        return self._root
+
+    def collection_hashes(self) -> Dict[str, str]:
+        return {node.name: node.hash().hex() for node in self.nodes}
+
+    def bucket_hashes(self, collection_index: int) -> List[str]:
+        return [format(total, "016x") for total in self.nodes[collection_index].sums]
+
+    def bucket_refs(self, collection_index: int, buckets: Iterable[int]) -> List[Tuple[int, int]]:
+        """
+        Return (digest, item index) for every item of a collection that falls in one of `buckets`.
+
+        Positions of deleted items are included with a stale digest; callers skip them.
+        """
+        wanted = set(buckets)
+        return [(digest, item_index) for item_index, digest in enumerate(self.nodes[collection_index].digests)
+                if bucket_of(digest) in wanted]
@@ -1,8 +1,52 @@
+import contextlib
+import io
 import json
 import os
+import tempfile
+import threading
+import time
 from datetime import datetime
-from typing import Callable, List, Dict, Any, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Sequence, Set, Tuple
 from logger import logger
+from parallel_search import ItemRef, ShardedSearchPool, total_items
+from indexes import MAX_PRICE, SORT_KEYS, CategoryIndex, PrefixIndex, SortedIndex, TrigramIndex
+from query_planner import QueryPlan, QueryPlanner
+from streaming_loader import ProgressCallback, iter_collections, iter_collections_from_file, text_digest
+from compression import check_codec, codec_for_filename, open_compressor, open_decompressed, strip_codec_extension
+from schema import ValidationError, collection_validator, item_validator, shallow_collection_validator
+from snapshot import MAGIC, SNAPSHOT_EXTENSION, SnapshotError, is_snapshot, read_snapshot, write_snapshot
+from paging import CollectionPager, PagedItems, iter_materialized, materialize
+from merkle import BUCKETS, MerkleIndex, bucket_of
+from multi_match import AhoCorasick
+from transaction import Operation, TransactionError
+from item_ids import ItemIdIndex
+from file_watcher import SavedFile, file_signature
+
+# A collection's item list is compacted once more than this share of its slots hold deleted items,
+# and more than COMPACT_MIN of them, so small collections are not compacted on every delete.
+COMPACT_RATIO = 0.25
+COMPACT_MIN = 64
+
+# Typo-tolerant faceted searches count facets over at most this many best matches.
+FUZZY_FACET_CANDIDATES = 200
+
+
+def _write_json_list(collections: Iterable[Dict[str, Any]], text: io.TextIOBase,
+                     digests: Dict[str, bytes]) -> None:
+    """
+    Write collections as json.dump(list(collections), indent=2) would, encoding one collection at a time.
+
+    `digests` is filled with the text_digest() of each collection's text by name.
+    """
+    separator = "[\n  "
+    for collection in collections:
+        encoded = json.dumps(collection, indent=2).replace("\n", "\n  ")
+        text.write(separator)
+        text.write(encoded)
+        digests[collection["name"]] = text_digest(encoded)
+        separator = ",\n  "
+    text.write("[]" if separator == "[\n  " else "\n]")
+
 
 class CollectionManager:
     """
@@ -13,24 +57,66 @@ class CollectionManager:
     """
     
     @logger.log_execution_time
-    def __init__(self, get_user_data_dir: Callable[[], str]) -> None:
+    def __init__(self, get_user_data_dir: Callable[[], str],
+                 parallel_search_threshold: Optional[int] = 250000,
+                 search_workers: Optional[int] = None,
+                 compression_level: Optional[int] = None, defer_validation: bool = False,
+                 memory_budget: Optional[int] = None) -> None:
         """
         Initialize the CollectionManager.
 
         Args:
             get_user_data_dir (callable): A function that returns the path to the user data directory.
+            parallel_search_threshold (Optional[int]): Item count at or above which searches are
+                fanned out to a pool of worker processes. None disables parallel search.
+            search_workers (Optional[int]): Number of search worker processes. Defaults to the CPU count.
+            compression_level (Optional[int]): Level used when saving compressed files. None uses
+                each codec's default.
+            defer_validation (bool): Validate only the collections themselves when loading and
+                check each collection's items the first time it is used.
+            memory_budget (Optional[int]): Approximate bytes of item lists to keep in memory.
+                Least recently used collections beyond it are paged out to a file in the
+                user data directory. None keeps every collection resident.
 
         Attributes:
             get_user_data_dir (callable): A function to get the user data directory.
             collections (List[Dict[str, Any]]): A list to store collections.
             categories (List[str]): A list of predefined item categories.
             settings_file (str): The path to the settings file.
+            parallel_search_threshold (Optional[int]): Item count that switches on parallel search.
+            compression_level (Optional[int]): Default level for compressed saves.
+            defer_validation (bool): Whether item validation is deferred until first access.
+            memory_budget (Optional[int]): The paging budget, or None if paging is off.
+            last_save (Optional[SavedFile]): The file most recently written by save_to_file.
         """
         try:
             self.get_user_data_dir: Callable[[], str] = get_user_data_dir
             self.collections: List[Dict[str, Any]] = []
             self.categories: List[str] = ["Book", "Movie", "Music", "Game"]
             self.settings_file: str = os.path.join(self.get_user_data_dir(), "settings.json")
+            self.parallel_search_threshold: Optional[int] = parallel_search_threshold
+            self._search_workers: int = max(1, search_workers or os.cpu_count() or 1)
+            self._search_pool: Optional[ShardedSearchPool] = None
+            self.compression_level: Optional[int] = compression_level
+            self.defer_validation: bool = defer_validation
+            self._unvalidated: Set[int] = set()
+            self.memory_budget: Optional[int] = memory_budget
+            self._pager: Optional[CollectionPager] = None
+            if memory_budget is not None:
+                self._pager = CollectionPager(memory_budget, self.get_user_data_dir())
+            self._lock = threading.RLock()
+            self._change_listeners: List[Callable[[str], None]] = []
+            self._item_count: int = 0
+            self._fuzzy_index: Optional[TrigramIndex] = None
+            self._sorted_indexes: Optional[Dict[str, Dict[Optional[int], SortedIndex]]] = None
+            self._category_index: Optional[CategoryIndex] = None
+            self._prefix_index: Optional[PrefixIndex] = None
+            self._merkle: Optional[MerkleIndex] = None
+            self._ids = ItemIdIndex()
+            self._tombstones: Dict[int, int] = {}
+            self._versions: Dict[str, int] = {}
+            self._version_clock: int = 0
+            self.last_save: Optional[SavedFile] = None
             logger.info("CollectionManager initialized")
         except Exception as e:
             logger.error(f"Error initializing CollectionManager: {str(e)}")
@@ -53,16 +139,24 @@ class CollectionManager:
             if not name.strip():
                 raise ValueError("Collection name cannot be empty or just whitespace")
             
-            if any(c['name'] == name for c in self.collections):
-                logger.warning(f"Collection '{name}' already exists")
-                return False
-            
-            self.collections.append({
-                "name": name,
-                "items": [],
-                "created_at": datetime.now().isoformat(),
-                "last_modified": datetime.now().isoformat()
-            })
+            with self._lock:
+                if any(c['name'] == name for c in self.collections):
+                    logger.warning(f"Collection '{name}' already exists")
+                    return False
+                
+                self.collections.append({
+                    "name": name,
+                    "items": [],
+                    "created_at": datetime.now().isoformat(),
+                    "last_modified": datetime.now().isoformat()
+                })
+                self._ids.add_collection()
+                self._bump_version(name)
+                if self._prefix_index is not None:
+                    self._prefix_index.add(name)
+                if self._merkle is not None:
+                    self._merkle.add_collection(name)
+            self._notify_changed(name)
             logger.info(f"Collection '{name}' added successfully")
             return True
         except (TypeError, ValueError) as e:
@@ -89,81 +183,496 @@ class CollectionManager:
                 raise TypeError("Collection name must be a string")
             if not isinstance(item, dict):
                 raise TypeError("Item must be a dictionary")
+            item_validator.validate(item, "item")
             
-            collection = next((c for c in self.collections if c["name"] == collection_name), None)
-            if not collection:
-                logger.warning(f"Collection '{collection_name}' not found")
-                return False
-            
-            if item in collection["items"]:
-                logger.warning(f"Item '{item}' already exists in collection '{collection_name}'")
-                return False
-            
-            collection["items"].append(item)
-            collection["last_modified"] = datetime.now().isoformat()
+            with self._lock:
+                collection_index, collection = self._find_collection(collection_name)
+                if not collection:
+                    logger.warning(f"Collection '{collection_name}' not found")
+                    return False
+                
+                if item in collection["items"]:
+                    logger.warning(f"Item '{item}' already exists in collection '{collection_name}'")
+                    return False
+                
+                collection["items"].append(item)
+                collection["last_modified"] = datetime.now().isoformat()
+                self._bump_version(collection_name)
+                self._item_added(collection_index, len(collection["items"]) - 1, item)
+                if self._pager is not None:
+                    self._pager.grew(collection_index, item)
+                    self._pager.enforce(self.collections, keep=collection_index)
+            self._notify_changed(collection_name)
             logger.info(f"Item '{item}' added to collection '{collection_name}'")
             return True
-        except TypeError as e:
+        except (TypeError, ValueError) as e:
             logger.error(f"Error adding item: {str(e)}")
             return False
         except Exception as e:
             logger.exception(f"Unexpected error adding item: {str(e)}")
             return False
 
+    @logger.log_execution_time
+    def update_item(self, item_id: int, changes: Dict[str, Any]) -> bool:
+        """
+        Change fields of an item, keeping its id and its position in its collection.
+
+        The item is found through the id index in O(1) and replaced by an updated
+        copy. The search indexes that are built swap the old entry for the new one:
+        in O(1) in the fuzzy index, by a bisection plus a list shift in the sorted
+        and category indexes.
+
+        Args:
+            item_id (int): The id of the item, as returned by item_ids.
+            changes (Dict[str, Any]): The fields to set; the other fields keep their values.
+
+        Returns:
+            bool: True if the item was updated, False if the id is unknown or the updated item is invalid.
+        """
+        try:
+            if not isinstance(changes, dict):
+                raise TypeError("Changes must be a dictionary")
+            with self._lock:
+                location = self._ids.locate(item_id)
+                if location is None:
+                    logger.warning(f"Item {item_id} not found")
+                    return False
+                collection_index, position = location
+                collection = self._use_collection(collection_index)
+                old = collection["items"][position]
+                item = {**old, **changes}
+                item_validator.validate(item, "item")
+                collection["items"][position] = item
+                collection["last_modified"] = datetime.now().isoformat()
+                self._bump_version(collection["name"])
+                self._item_replaced(collection_index, position, old, item)
+                if self._pager is not None:
+                    self._pager.replaced(collection_index, old, item)
+            self._notify_changed(collection["name"])
+            logger.info(f"Item {item_id} in collection '{collection['name']}' updated: {item}")
+            return True
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error updating item {item_id}: {str(e)}")
+            return False
+        except Exception as e:
+            logger.exception(f"Unexpected error updating item {item_id}: {str(e)}")
+            return False
+
+    @logger.log_execution_time
+    def delete_item(self, item_id: int) -> bool:
+        """
+        Delete an item by id.
+
+        The item is found in O(1) and its slot is marked deleted and skipped by every
+        reader; built search indexes drop it as update_item describes. A collection's
+        list is compacted in place, keeping the order of the remaining items, once
+        more than COMPACT_RATIO and COMPACT_MIN of it is deleted slots.
+
+        Args:
+            item_id (int): The id of the item, as returned by item_ids.
+
+        Returns:
+            bool: True if the item was deleted, False if the id is unknown.
+        """
+        try:
+            with self._lock:
+                location = self._ids.locate(item_id)
+                if location is None:
+                    logger.warning(f"Item {item_id} not found")
+                    return False
+                collection_index, position = location
+                collection = self._use_collection(collection_index)
+                items = collection["items"]
+                old = items[position]
+                items[position] = None
+                self._ids.remove(item_id)
+                deleted = self._tombstones[collection_index] = self._tombstones.get(collection_index, 0) + 1
+                self._item_count -= 1
+                collection["last_modified"] = datetime.now().isoformat()
+                self._bump_version(collection["name"])
+                self._item_replaced(collection_index, position, old, None)
+                if self._pager is not None:
+                    self._pager.replaced(collection_index, old, None)
+                if deleted > max(COMPACT_MIN, len(items) * COMPACT_RATIO):
+                    self._compact(collection_index)
+            self._notify_changed(collection["name"])
+            logger.info(f"Item {item_id} deleted from collection '{collection['name']}'")
+            return True
+        except Exception as e:
+            logger.exception(f"Unexpected error deleting item {item_id}: {str(e)}")
+            return False
+
+    @logger.log_execution_time
+    def apply_batch(self, operations: List[Operation]) -> Dict[str, int]:
+        """
+        Validate a batch of mutations together and apply all of them or none.
+
+        Each changed collection gets one last_modified timestamp and one change
+        notification, however many items it received.
+
+        Args:
+            operations (List[Operation]): ("add_collection", name) and
+                ("add_item", collection name, item) tuples, applied in order.
+
+        Returns:
+            Dict[str, int]: The number of "collections" and "items" added.
+
+        Raises:
+            TransactionError: If any operation is invalid: a bad or duplicate collection name,
+                an unknown collection, an invalid item or an item already in its collection.
+                Nothing is applied.
+        """
+        with self._lock:
+            new_collections, changed = self._validate_batch(operations)
+            collection_count = len(self.collections)
+            next_id = self._ids.next_id
+            previous: Dict[int, Tuple[int, str]] = {}
+            for index in changed.values():
+                if index is not None:
+                    if self._pager is not None:
+                        self._pager.touch(index, self.collections, enforce=False)
+                    previous[index] = (len(self.collections[index]["items"]), self.collections[index]["last_modified"])
+            try:
+                now = datetime.now().isoformat()
+                for name in new_collections:
+                    changed[name] = len(self.collections)
+                    self.collections.append({"name": name, "items": [], "created_at": now, "last_modified": now})
+                    self._ids.add_collection()
+                    if self._prefix_index is not None:
+                        self._prefix_index.add(name)
+                    if self._merkle is not None:
+                        self._merkle.add_collection(name)
+                for name, items in self._batch_items(operations).items():
+                    collection_index = changed[name]
+                    collection = self.collections[collection_index]
+                    for item in items:
+                        collection["items"].append(item)
+                        self._item_added(collection_index, len(collection["items"]) - 1, item)
+                        if self._pager is not None:
+                            self._pager.grew(collection_index, item)
+                    collection["last_modified"] = now
+                if self._pager is not None:
+                    self._pager.enforce(self.collections)
+                for name in changed:
+                    self._bump_version(name)
+            except Exception:
+                for index, (length, last_modified) in previous.items():
+                    del self.collections[index]["items"][length:]
+                    self.collections[index]["last_modified"] = last_modified
+                del self.collections[collection_count:]
+                self._ids.truncate(collection_count, {index: length for index, (length, _) in previous.items()}, next_id)
+                self._collections_replaced()
+                logger.exception("Batch failed while being applied and was rolled back")
+                raise
+        added = {"collections": len(new_collections), "items": sum(1 for op in operations if op[0] == "add_item")}
+        for name in changed:
+            self._notify_changed(name)
+        logger.info(f"Batch applied: {added['collections']} collections and {added['items']} items added")
+        return added
+
+    def _validate_batch(self, operations: List[Operation]) -> Tuple[List[str], Dict[str, Optional[int]]]:
+        """
+        Check every operation of a batch against the library and the rest of the batch.
+
+        Returns:
+            Tuple[List[str], Dict[str, Optional[int]]]: The names of collections to create,
+                and every changed collection's index (None for collections created by the batch).
+
+        Raises:
+            TransactionError: Describing the first invalid operation.
+        """
+        existing = {c["name"]: i for i, c in enumerate(self.collections)}
+        new_collections: List[str] = []
+        changed: Dict[str, Optional[int]] = {}
+        seen_items: Dict[str, Set[str]] = {}
+        for number, operation in enumerate(operations):
+            where = f"operation {number}"
+            if not isinstance(operation, tuple) or not operation:
+                raise TransactionError(f"{where}: not an operation")
+            if operation[0] == "add_collection" and len(operation) == 2:
+                name = operation[1]
+                if not isinstance(name, str) or not name.strip():
+                    raise TransactionError(f"{where}: collection name must be a non-empty string")
+                if name in existing or name in changed:
+                    raise TransactionError(f"{where}: collection '{name}' already exists")
+                new_collections.append(name)
+                changed[name] = None
+            elif operation[0] == "add_item" and len(operation) == 3:
+                _, name, item = operation
+                if name not in existing and name not in changed:
+                    raise TransactionError(f"{where}: collection '{name}' not found")
+                failure = item_validator.check(item)
+                if failure is not None:
+                    raise TransactionError(f"{where}: {ValidationError(failure[0], failure[1])}")
+                index = existing.get(name)
+                changed.setdefault(name, index)
+                keys = seen_items.get(name)
+                if keys is None:
+                    keys = seen_items[name] = set()
+                    if index is not None:
+                        self._ensure_validated(index)
+                        keys.update(self._item_key(i) for i in materialize(self.collections[index]["items"]))
+                key = self._item_key(item)
+                if key in keys:
+                    raise TransactionError(f"{where}: item '{item.get('name')}' already exists in collection '{name}'")
+                keys.add(key)
+            else:
+                raise TransactionError(f"{where}: unknown operation {operation[0]!r}")
+        return new_collections, changed
+
+    @staticmethod
+    def _batch_items(operations: List[Operation]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group the items of a validated batch by collection, keeping their order."""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for operation in operations:
+            if operation[0] == "add_item":
+                grouped.setdefault(operation[1], []).append(operation[2])
+        return grouped
+
+    @staticmethod
+    def _item_key(item: Any) -> str:
+        return json.dumps(item, sort_keys=True, default=str)
+
     @logger.log_execution_time
     def get_collections(self) -> List[Dict[str, Any]]:
-        """Return a list of all collections."""
+        """Return a list of all collections; those with deleted items are copies without them."""
         try:
-            logger.info(f"Retrieved {len(self.collections)} collections")
-            return self.collections
+            collections = self.collections
+            if self._tombstones:
+                with self._lock:
+                    collections = [dict(collection, items=self._live_items(index)) if index in self._tombstones
+                                   else collection for index, collection in enumerate(self.collections)]
+            logger.info(f"Retrieved {len(collections)} collections")
+            return collections
         except Exception as e:
             logger.error(f"Error retrieving collections: {str(e)}")
             return []
 
     @logger.log_execution_time
-    def get_items_in_collection(self, collection_name: str) -> List[Dict[str, Any]]:
-        """Return a list of all items in a specific collection."""
+    def get_items_in_collection(self, collection_name: str, order_by: Optional[str] = None,
+                                offset: int = 0, limit: Optional[int] = None,
+                                descending: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return the items in a specific collection, optionally ordered and paginated.
+
+        Without any ordering or paging arguments the collection's own item list is
+        returned, or a copy without its deleted items if it has any. Ordered reads are served from sorted secondary indexes in
+        O(log n + page).
+
+        Args:
+            collection_name (str): The name of the collection.
+            order_by (Optional[str]): "price" or "name" to order the items, None for insertion order.
+            offset (int): Number of items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            descending (bool): Reverse the order.
+
+        Returns:
+            List[Dict[str, Any]]: The requested items.
+        """
         try:
-            collection = next((c for c in self.collections if c["name"] == collection_name), None)
+            collection_index, collection = self._find_collection(collection_name)
             if not collection:
                 logger.warning(f"Collection '{collection_name}' not found")
                 return []
-            logger.info(f"Retrieved {len(collection['items'])} items from collection '{collection_name}'")
-            return collection["items"]
+            self._check_page_args(order_by, offset, limit)
+            if order_by is None:
+                with self._lock:
+                    live = self._live_items(collection_index)
+            if order_by is None and offset == 0 and limit is None and not descending:
+                items = live
+            elif order_by is None and descending:
+                end = max(0, len(live) - offset)
+                begin = 0 if limit is None else max(0, end - limit)
+                items = live[begin:end][::-1]
+            elif order_by is None:
+                items = live[offset:None if limit is None else offset + limit]
+            else:
+                index = self._ensure_sorted_indexes()[order_by].get(collection_index)
+                refs = index.page(offset, limit, descending) if index else []
+                items = self._resolve(refs)
+            logger.info(f"Retrieved {len(items)} items from collection '{collection_name}'")
+            return items
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error getting items from collection '{collection_name}': {str(e)}")
+            return []
         except Exception as e:
             logger.exception(f"Error getting items from collection '{collection_name}': {str(e)}")
             return []
 
     @logger.log_execution_time
-    def save_to_file(self, filename: str) -> bool:
+    def item_ids(self, collection_name: str) -> List[int]:
         """
-        Save the collections to a JSON file with error handling.
+        Return the ids of a collection's items, in the order get_items_in_collection returns them.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            List[int]: One id per item, or an empty list if the collection does not exist.
+        """
+        try:
+            with self._lock:
+                collection_index, collection = self._find_collection(collection_name)
+                if not collection:
+                    logger.warning(f"Collection '{collection_name}' not found")
+                    return []
+                slots = self._ids.slots[collection_index]
+                if collection_index not in self._tombstones:
+                    return slots.tolist()
+                items = materialize(collection["items"])
+                return [item_id for item_id, item in zip(slots, items) if item is not None]
+        except Exception as e:
+            logger.exception(f"Error getting item ids of collection '{collection_name}': {str(e)}")
+            return []
+
+    @logger.log_execution_time
+    def get_item(self, item_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Return the item with the given id.
+
+        Args:
+            item_id (int): The id of the item.
+
+        Returns:
+            Optional[Dict[str, Any]]: The item, or None if no item has this id.
+        """
+        try:
+            with self._lock:
+                location = self._ids.locate(item_id)
+                if location is None:
+                    return None
+                collection_index, position = location
+                self._ensure_validated(collection_index)
+                return materialize(self.collections[collection_index]["items"])[position]
+        except Exception as e:
+            logger.exception(f"Error getting item {item_id}: {str(e)}")
+            return None
+
+    @logger.log_execution_time
+    def get_items_in_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                                 collection_name: Optional[str] = None, offset: int = 0,
+                                 limit: Optional[int] = None, descending: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return items whose price lies within a range, ordered by price.
+
+        Args:
+            min_price (Optional[float]): Inclusive lower bound, or None for no lower bound.
+            max_price (Optional[float]): Inclusive upper bound, or None for no upper bound.
+            collection_name (Optional[str]): Restrict the query to one collection. None searches the whole library.
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            descending (bool): Return the most expensive items first.
+
+        Returns:
+            List[Dict[str, Any]]: The matching items. Items without a numeric price are never included.
+        """
+        try:
+            index = self._price_range_index(collection_name)
+            self._check_page_args("price", offset, limit)
+            low, high = self._price_bounds(min_price, max_price)
+            refs = index.page(offset, limit, descending, low, high) if index else []
+            items = self._resolve(refs)
+            logger.info(f"Price range [{min_price}, {max_price}] returned {len(items)} items")
+            return items
+        except (TypeError, ValueError, KeyError) as e:
+            logger.error(f"Error querying price range: {str(e)}")
+            return []
+        except Exception as e:
+            logger.exception(f"Unexpected error querying price range: {str(e)}")
+            return []
+
+    @logger.log_execution_time
+    def count_items_in_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                                   collection_name: Optional[str] = None) -> int:
+        """
+        Return the number of items whose price lies within a range, in O(log n).
+
+        Args:
+            min_price (Optional[float]): Inclusive lower bound, or None for no lower bound.
+            max_price (Optional[float]): Inclusive upper bound, or None for no upper bound.
+            collection_name (Optional[str]): Restrict the count to one collection.
+
+        Returns:
+            int: The number of matching items, or 0 on error.
+        """
+        try:
+            index = self._price_range_index(collection_name)
+            if index is None:
+                return 0
+            start, stop = index.bounds(*self._price_bounds(min_price, max_price))
+            return stop - start
+        except (TypeError, ValueError, KeyError) as e:
+            logger.error(f"Error counting price range: {str(e)}")
+            return 0
+        except Exception as e:
+            logger.exception(f"Unexpected error counting price range: {str(e)}")
+            return 0
+
+    @logger.log_execution_time
+    def save_to_file(self, filename: str, file_format: Optional[str] = None,
+                     compression: Optional[str] = None, compression_level: Optional[int] = None) -> bool:
+        """
+        Save the collections to a JSON file or a binary snapshot with error handling.
+
+        A consistent snapshot of the collections is written to a temporary file
+        that then replaces `filename`, so readers never see a half-written file.
+        Collections are written one at a time and paged-out ones are read back from
+        the page file as they are reached, so saving stays within the memory budget.
+        Output is streamed through the compressor, so a compressed JSON save never
+        holds the whole document in memory.
         
         Args:
             filename (str): The name of the file to save the collections to.
+            file_format (Optional[str]): "json" or "snapshot". Defaults to "snapshot" for
+                filenames ending in .tlsnap (before any compression extension) and "json" otherwise.
+            compression (Optional[str]): "gzip", "bz2", "lzma" or "none". Defaults to the codec
+                implied by a .gz, .bz2 or .xz extension, otherwise no compression.
+            compression_level (Optional[int]): Overrides the manager's compression_level.
         
         Returns:
             bool: True if saved successfully, False otherwise.
         """
         try:
-            with open(filename, 'w') as f:
-                json.dump(self.collections, f, indent=2)
+            codec = codec_for_filename(filename) if compression is None else compression
+            codec = None if codec == "none" else codec
+            level = self.compression_level if compression_level is None else compression_level
+            check_codec(codec, level)
+            if file_format is None:
+                file_format = "snapshot" if strip_codec_extension(filename).endswith(SNAPSHOT_EXTENSION) else "json"
+            if file_format not in ("json", "snapshot"):
+                raise ValueError(f"Unknown file format '{file_format}'")
+            with contextlib.ExitStack() as stack:
+                with self._lock:
+                    view = stack.enter_context(self.snapshot())
+                    versions = dict(self._versions)
+                digests = self._write_collections(iter_materialized(view), filename, file_format, codec, level)
+            self.last_save = SavedFile(os.path.abspath(filename), file_signature(filename), versions, digests)
             logger.info(f"Successfully saved to {filename}")
             return True
         except IOError as e:
             logger.error(f"IOError saving to file '{filename}': {str(e)}")
             return False
+        except ValueError as e:
+            logger.error(f"Error saving to file '{filename}': {str(e)}")
+            return False
         except Exception as e:
             logger.exception(f"Unexpected error saving to file '{filename}': {str(e)}")
             return False
 
     @logger.log_execution_time
-    def load_from_file(self, filename: str) -> bool:
+    def load_from_file(self, filename: str, progress_callback: Optional[ProgressCallback] = None) -> bool:
         """
-        Load collections from a JSON file with validation.
+        Load collections from a JSON file or a binary snapshot with validation.
+
+        Gzip, bz2 and lzma compression and the snapshot format are detected from
+        the file's leading bytes. JSON is decoded one collection at a time, from a
+        memory map for plain files or straight from the decompressor otherwise, so
+        peak memory stays close to the size of the loaded collections.
         
         Args:
             filename (str): The name of the file to load the collections from.
+            progress_callback (Optional[ProgressCallback]): Called with (bytes read, total bytes,
+                collections loaded) as loading progresses. Bytes are counted in the file on disk.
         
         Returns:
             bool: True if the file was loaded successfully, False otherwise.
@@ -173,21 +682,44 @@ class CollectionManager:
                 logger.error(f"File '{filename}' does not exist")
                 return False
             
-            with open(filename, 'r') as f:
-                loaded_data = json.load(f)
-            
-            if not isinstance(loaded_data, list):
-                raise ValueError("Loaded data is not a list")
-            
-            if not all(isinstance(item, dict) for item in loaded_data):
-                raise ValueError("Not all items in loaded data are dictionaries")
+            size = os.path.getsize(filename)
+            loaded_data = None
+            with open(filename, 'rb') as raw:
+                stream, codec = open_decompressed(raw)
+                if is_snapshot(stream.peek(len(MAGIC))[:len(MAGIC)]):
+                    loaded_data = self._validated(read_snapshot(stream.read()))
+                    if progress_callback is not None:
+                        progress_callback(size, size, len(loaded_data))
+                elif codec is not None:
+                    on_progress = None
+                    if progress_callback is not None:
+                        on_progress = lambda _read, _total, count: progress_callback(raw.tell(), size, count)
+                    loaded_data = self._validated(iter_collections(stream.read, size, on_progress))
+            if loaded_data is None:
+                loaded_data = self._validated(iter_collections_from_file(filename, progress_callback))
             
-            self.collections = loaded_data
+            persisted_ids = [collection.pop("item_ids", None) for collection in loaded_data]
+            next_ids = [collection.pop("next_item_id", None) for collection in loaded_data]
+            with self._lock:
+                self.collections = loaded_data
+                self._tombstones = {}
+                self._versions = {}
+                for collection in loaded_data:
+                    self._bump_version(collection["name"])
+                renumbered = self._ids.reset(loaded_data, persisted_ids, next(
+                    (next_id for next_id in next_ids if next_id is not None), None))
+                self._collections_replaced()
+                self._unvalidated = set(range(len(loaded_data))) if self.defer_validation else set()
+            if renumbered and any(ids is not None for ids in persisted_ids):
+                logger.warning(f"Saved item ids of {renumbered} collections were unusable; new ids were assigned")
             logger.info(f"Successfully loaded {len(self.collections)} collections from {filename}")
             return True
         except json.JSONDecodeError as e:
             logger.error(f"Error decoding JSON from file '{filename}': {str(e)}")
             return False
+        except SnapshotError as e:
+            logger.error(f"Error reading snapshot '{filename}': {str(e)}")
+            return False
         except ValueError as e:
             logger.error(f"Invalid data format in file '{filename}': {str(e)}")
             return False
@@ -264,11 +796,7 @@ class CollectionManager:
             if not isinstance(search_term, str):
                 raise TypeError("Search term must be a string")
             
-            search_term_lower = search_term.lower()
-            for collection in self.collections:
-                for item in collection['items']:
-                    if search_term_lower in item.get('name', '').lower() or search_term_lower in item.get('category', '').lower():
-                        results.append(item)
+            results = self._resolve(self._search_refs(search_term.lower()))
             logger.info(f"Search for '{search_term}' returned {len(results)} results")
             return results
         except TypeError as e:
@@ -276,4 +804,1012 @@ class CollectionManager:
             return []
         except Exception as e:
             logger.exception(f"Unexpected error during item search: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    @logger.log_execution_time
+    def fuzzy_search(self, search_term: str, limit: int = 10, min_similarity: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        Search for items whose names approximately match a search term.
+
+        Matching is typo tolerant ("Hary Poter" finds "Harry Potter") and backed by
+        a trigram index that is built on first use and kept up to date on add_item.
+
+        Args:
+            search_term (str): The approximate item name to look for.
+            limit (int): The maximum number of items to return.
+            min_similarity (float): Minimum share (0-1) of the term's trigrams an item name must contain.
+
+        Returns:
+            List[Dict[str, Any]]: Up to `limit` items, closest match first.
+        """
+        try:
+            if not isinstance(search_term, str):
+                raise TypeError("Search term must be a string")
+            if not isinstance(limit, int) or limit < 1:
+                raise ValueError("Limit must be a positive integer")
+            matches = self._ensure_fuzzy_index().search(search_term, limit, min_similarity)
+            results = self._resolve([ref for _, ref in matches])
+            logger.info(f"Fuzzy search for '{search_term}' returned {len(results)} results")
+            return results
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error during fuzzy search: {str(e)}")
+            return []
+        except Exception as e:
+            logger.exception(f"Unexpected error during fuzzy search: {str(e)}")
+            return []
+
+    @logger.log_execution_time
+    def faceted_search(self, search_term: str, category: Optional[str] = None, offset: int = 0,
+                       limit: Optional[int] = None, fuzzy: bool = False) -> Dict[str, Any]:
+        """
+        Search for items and count the hits per category in the same call.
+
+        The hits are found as by search_items (or fuzzy_search with `fuzzy`). The
+        category counts come from intersecting the hit references with the
+        category index, and filtering by a category is the same intersection,
+        so neither reads the items again. Only the requested page is resolved.
+
+        Args:
+            search_term (str): The term to search for in item names and categories.
+            category (Optional[str]): Only return hits in this category (case-insensitive).
+                The facet counts always cover every hit.
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+            fuzzy (bool): Match names approximately, best match first, as fuzzy_search does
+                with a limit of FUZZY_FACET_CANDIDATES.
+
+        Returns:
+            Dict[str, Any]: The page of "items", the "total" number of hits in the selected
+                category (or overall), and "facets", the number of hits per category, largest first.
+        """
+        try:
+            if not isinstance(search_term, str):
+                raise TypeError("Search term must be a string")
+            if category is not None and not isinstance(category, str):
+                raise TypeError("Category must be a string or None")
+            self._check_page_args(None, offset, limit)
+            if fuzzy:
+                hits = [ref for _, ref in self._ensure_fuzzy_index().search(search_term, FUZZY_FACET_CANDIDATES)]
+                in_order = sorted(hits)
+            else:
+                hits = in_order = self._search_refs(search_term.lower())
+            index = self._ensure_category_index()
+            facets = index.facet_counts(in_order)
+            if category is not None:
+                selected = index.intersect(in_order, category)
+                if fuzzy:
+                    keep = set(selected)
+                    selected = [ref for ref in hits if ref in keep]
+                hits = selected
+            items = self._resolve(hits[offset:None if limit is None else offset + limit])
+            logger.info(f"Faceted search for '{search_term}' in {category or 'all categories'} "
+                        f"returned {len(items)} of {len(hits)} results across {len(facets)} categories")
+            return {"items": items, "total": len(hits), "facets": facets}
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error during faceted search: {str(e)}")
+            return {"items": [], "total": 0, "facets": {}}
+        except Exception as e:
+            logger.exception(f"Unexpected error during faceted search: {str(e)}")
+            return {"items": [], "total": 0, "facets": {}}
+
+    @logger.log_execution_time
+    def match_terms(self, terms: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Find the items matching each of many search terms in a single pass over the library.
+
+        Terms match like search_items: case-insensitively, anywhere in an item's name
+        or category. All terms are compiled into one Aho-Corasick automaton, so the
+        cost is one scan of the library rather than one scan per term.
+
+        Args:
+            terms (Iterable[str]): The search terms; read lazily, so a file's lines can be passed.
+                Blank terms are skipped and terms differing only in case are merged.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: For every term, the matching items in library order.
+        """
+        try:
+            automaton = AhoCorasick()
+            ids: Dict[str, int] = {}
+            keys: List[str] = []
+            for term in terms:
+                if not isinstance(term, str):
+                    raise TypeError("Search terms must be strings")
+                lowered = term.strip().lower()
+                if lowered and lowered not in ids:
+                    ids[lowered] = automaton.add(lowered)
+                    keys.append(term.strip())
+            automaton.build()
+            hits: List[List[ItemRef]] = [[] for _ in keys]
+            by_category: Dict[str, Set[int]] = {}
+            with self._lock:
+                for ref, item in self._iter_items():
+                    category = item.get('category', '')
+                    category_hits = by_category.get(category)
+                    if category_hits is None:
+                        category_hits = by_category[category] = automaton.search(category.lower())
+                    matched = automaton.search(item.get('name', '').lower())
+                    for pattern_id in (matched | category_hits if category_hits else matched):
+                        hits[pattern_id].append(ref)
+                results = {key: self._resolve(refs) for key, refs in zip(keys, hits)}
+            logger.info(f"Matched {len(keys)} terms: {sum(1 for refs in hits if refs)} found in the library")
+            return results
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.error(f"Error matching terms: {str(e)}")
+            return {}
+        except Exception as e:
+            logger.exception(f"Unexpected error matching terms: {str(e)}")
+            return {}
+
+    @logger.log_execution_time
+    def suggest(self, prefix: str, limit: int = 8) -> List[str]:
+        """
+        Return autocomplete suggestions for a partially typed item or collection name.
+
+        Args:
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of suggestions.
+
+        Returns:
+            List[str]: Matching names ranked by frequency, then recency.
+        """
+        try:
+            if not isinstance(prefix, str):
+                raise TypeError("Prefix must be a string")
+            return self._ensure_prefix_index().suggest(prefix, limit)
+        except TypeError as e:
+            logger.error(f"Error suggesting completions: {str(e)}")
+            return []
+        except Exception as e:
+            logger.exception(f"Unexpected error suggesting completions: {str(e)}")
+            return []
+
+    @logger.log_execution_time
+    def plan_query(self, filters: Dict[str, Any]) -> QueryPlan:
+        """
+        Plan a combined filter query without running it.
+
+        Args:
+            filters (Dict[str, Any]): A filter expression with any of the keys "collection",
+                "category", "min_price", "max_price" and "name_contains".
+
+        Returns:
+            QueryPlan: The chosen plan; call explain() on it to see why it was chosen.
+
+        Raises:
+            TypeError, ValueError, KeyError: If the filter expression is invalid.
+        """
+        self._ensure_validated()
+        return QueryPlanner(self).plan(filters)
+
+    @logger.log_execution_time
+    def query(self, filters: Dict[str, Any], offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the items matching every predicate of a filter expression, in library order.
+
+        The scan is driven from the most selective index (category bucket, price
+        range or name trigrams) and the remaining predicates are verified on the
+        candidates.
+
+        Args:
+            filters (Dict[str, Any]): A filter expression with any of the keys "collection",
+                "category", "min_price", "max_price" and "name_contains".
+            offset (int): Number of matching items to skip.
+            limit (Optional[int]): Maximum number of items to return. None returns the rest.
+
+        Returns:
+            List[Dict[str, Any]]: The matching items.
+        """
+        try:
+            self._check_page_args(None, offset, limit)
+            plan = self.plan_query(filters)
+            refs = plan.execute()[offset:None if limit is None else offset + limit]
+            logger.info(f"Query {filters} driven by {plan.chosen.kind} returned {len(refs)} items")
+            return self._resolve(refs)
+        except (TypeError, ValueError, KeyError) as e:
+            logger.error(f"Invalid query: {str(e)}")
+            return []
+        except Exception as e:
+            logger.exception(f"Unexpected error running query: {str(e)}")
+            return []
+
+    @logger.log_execution_time
+    def warm_up(self, collection_names: List[str], queries: List[Tuple[str, str]]) -> Dict[str, float]:
+        """
+        Do ahead of time the work that the first use of some collections and queries would do.
+
+        Each named collection is validated if its check was deferred, faulted in if
+        paged out and compacted; the first name is touched last, so it is the last
+        one the memory budget evicts. For the queries, the indexes they run on are
+        built: the trigram index for "fuzzy", the prefix index for "suggest", the
+        sorted indexes for "order", the category index for "facets", the search
+        pool for "search" on libraries large enough to use it, and whatever the
+        plan of a "query" (filters as JSON) reads.
+        Each step holds the lock, so edits from other threads wait for one step at most.
+
+        Args:
+            collection_names (List[str]): Collections to prepare, most important first.
+                Names that no longer exist are skipped.
+            queries (List[Tuple[str, str]]): (kind, text) pairs, as recorded by AccessStats.
+
+        Returns:
+            Dict[str, float]: The seconds each step took, e.g. {"collection:Books": 0.01, "fuzzy": 0.2}.
+        """
+        steps: List[Tuple[str, Callable[[], Any]]] = []
+        existing = {collection["name"] for collection in self.collections}
+        for name in reversed(collection_names):
+            if name in existing:
+                steps.append((f"collection:{name}", lambda name=name: self.get_items_in_collection(name, limit=0)))
+        kinds = {kind for kind, _ in queries}
+        if kinds & {"search", "query"}:
+            steps.append(("validate", self._ensure_validated))
+        if "search" in kinds and self._use_parallel_search():
+            steps.append(("search", self._ensure_search_pool))
+        if "fuzzy" in kinds:
+            steps.append(("fuzzy", self._ensure_fuzzy_index))
+        if "suggest" in kinds:
+            steps.append(("suggest", self._ensure_prefix_index))
+        if "order" in kinds:
+            steps.append(("order", self._ensure_sorted_indexes))
+        if "facets" in kinds:
+            steps.append(("facets", self._ensure_category_index))
+        for kind, text in queries:
+            if kind == "query":
+                steps.append((f"query:{text}", lambda text=text: self.plan_query(json.loads(text))))
+        timings: Dict[str, float] = {}
+        for label, step in steps:
+            start = time.perf_counter()
+            try:
+                with self._lock:
+                    step()
+            except (TypeError, ValueError, KeyError) as e:
+                logger.warning(f"Skipped warm-up step {label}: {str(e)}")
+                continue
+            except Exception as e:
+                logger.exception(f"Error in warm-up step {label}: {str(e)}")
+                continue
+            timings[label] = time.perf_counter() - start
+        logger.info(f"Warmed up {len(timings)} of {len(steps)} steps in {sum(timings.values()):.3f}s")
+        return timings
+
+    @logger.log_execution_time
+    def remove_duplicate_items(self) -> int:
+        """
+        Remove repeated copies of the same item within each collection, keeping the first.
+
+        Returns:
+            int: The number of items removed.
+        """
+        try:
+            removed = 0
+            changed: List[str] = []
+            compacted = False
+            with self._lock:
+                for collection_index, collection in enumerate(self.collections):
+                    items = materialize(collection["items"])
+                    seen = set()
+                    keep = []
+                    for position, item in enumerate(items):
+                        if item is not None:
+                            key = self._item_key(item)
+                            if key not in seen:
+                                seen.add(key)
+                                keep.append(position)
+                    live = len(items) - self._tombstones.pop(collection_index, 0)
+                    if len(keep) < len(items):
+                        collection["items"] = [items[position] for position in keep]
+                        self._ids.compact(collection_index, keep)
+                        compacted = True
+                    if len(keep) < live:
+                        removed += live - len(keep)
+                        collection["last_modified"] = datetime.now().isoformat()
+                        self._bump_version(collection["name"])
+                        changed.append(collection["name"])
+                if compacted:
+                    self._collections_replaced()
+            for name in changed:
+                self._notify_changed(name)
+            logger.info(f"Removed {removed} duplicate items")
+            return removed
+        except Exception as e:
+            logger.exception(f"Unexpected error removing duplicate items: {str(e)}")
+            return 0
+
+    @logger.log_execution_time
+    def root_hash(self) -> str:
+        """
+        Return a hash of the library's content: every collection name and item.
+
+        Two libraries have the same root hash exactly when they hold the same
+        collections with the same items, regardless of item order.
+
+        Returns:
+            str: The root hash as hex.
+        """
+        with self._lock:
+            return self._ensure_merkle().root()
+
+    @logger.log_execution_time
+    def collection_hashes(self) -> Dict[str, str]:
+        """Return the content hash of every collection, by name."""
+        with self._lock:
+            return self._ensure_merkle().collection_hashes()
+
+    @logger.log_execution_time
+    def bucket_hashes(self, collection_name: str) -> List[str]:
+        """
+        Return the hashes of a collection's item buckets.
+
+        Args:
+            collection_name (str): The collection to describe.
+
+        Returns:
+            List[str]: One hash per bucket, or an empty list if the collection does not exist.
+        """
+        with self._lock:
+            collection_index, collection = self._find_collection(collection_name)
+            if not collection:
+                logger.warning(f"Collection '{collection_name}' not found")
+                return []
+            return self._ensure_merkle().bucket_hashes(collection_index)
+
+    @logger.log_execution_time
+    def item_hashes(self, collection_name: str, buckets: List[int]) -> Dict[int, List[str]]:
+        """
+        Return the hashes of the items in some of a collection's buckets.
+
+        Args:
+            collection_name (str): The collection to describe.
+            buckets (List[int]): The buckets whose item hashes are wanted.
+
+        Returns:
+            Dict[int, List[str]]: Item hashes by bucket; empty if the collection does not exist.
+        """
+        with self._lock:
+            collection_index, collection = self._find_collection(collection_name)
+            if not collection:
+                logger.warning(f"Collection '{collection_name}' not found")
+                return {}
+            hashes: Dict[int, List[str]] = {bucket: [] for bucket in buckets}
+            for digest, _ in self._ensure_merkle().bucket_refs(collection_index, buckets):
+                hashes[bucket_of(digest)].append(format(digest, "016x"))
+            return hashes
+
+    @logger.log_execution_time
+    def diff(self, other: Any) -> Dict[str, Any]:
+        """
+        Return the collections and items this library has that another one lacks.
+
+        Only mismatching parts of the hash tree are visited: collections whose
+        hashes match are skipped, and within a mismatching collection only items
+        in buckets whose hashes differ are compared. `other` is only asked for
+        root_hash, collection_hashes, bucket_hashes and item_hashes, so it can
+        be a proxy for a library on another machine.
+
+        Args:
+            other (CollectionManager): The library to compare against.
+
+        Returns:
+            Dict[str, Any]: A delta for apply_delta on `other`: "collections", a list of
+                {"name", "items"} with the missing items of each collection (collections
+                missing entirely are included even when empty), and "item_count".
+        """
+        delta: List[Dict[str, Any]] = []
+        if self.root_hash() != other.root_hash():
+            theirs = other.collection_hashes()
+            with self._lock:
+                merkle = self._ensure_merkle()
+                for collection_index, (name, digest) in enumerate(
+                        (node.name, node.hash().hex()) for node in list(merkle.nodes)):
+                    if theirs.get(name) == digest:
+                        continue
+                    if name in theirs:
+                        mine = merkle.bucket_hashes(collection_index)
+                        buckets = [b for b, h in enumerate(other.bucket_hashes(name)) if h != mine[b]]
+                        known = {h for hashes in other.item_hashes(name, buckets).values() for h in hashes}
+                    else:
+                        buckets, known = list(range(BUCKETS)), set()
+                    items = materialize(self.collections[collection_index]["items"])
+                    missing: List[Dict[str, Any]] = []
+                    for digest_value, item_index in merkle.bucket_refs(collection_index, buckets):
+                        key = format(digest_value, "016x")
+                        if key not in known and items[item_index] is not None:
+                            known.add(key)
+                            missing.append(items[item_index])
+                    if missing or name not in theirs:
+                        delta.append({"name": name, "items": missing})
+        item_count = sum(len(c["items"]) for c in delta)
+        logger.info(f"Diff found {len(delta)} collections and {item_count} items missing from the other library")
+        return {"collections": delta, "item_count": item_count}
+
+    @logger.log_execution_time
+    def apply_delta(self, delta: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Add the collections and items of a delta produced by diff.
+
+        Args:
+            delta (Dict[str, Any]): The delta to apply.
+
+        Returns:
+            Dict[str, int]: The number of "collections" and "items" added.
+        """
+        added = {"collections": 0, "items": 0}
+        try:
+            existing = {c["name"] for c in self.collections}
+            for entry in delta.get("collections", []):
+                name = entry["name"]
+                if name not in existing:
+                    added["collections"] += self.add_collection(name)
+                    existing.add(name)
+                for item in entry.get("items", []):
+                    added["items"] += self.add_item(name, item)
+            logger.info(f"Applied delta: {added['collections']} collections and {added['items']} items added")
+            return added
+        except (TypeError, KeyError, AttributeError) as e:
+            logger.error(f"Invalid delta: {str(e)}")
+            return added
+        except Exception as e:
+            logger.exception(f"Unexpected error applying delta: {str(e)}")
+            return added
+
+    @logger.log_execution_time
+    def replace_collections(self, replacements: Dict[str, Optional[Dict[str, Any]]],
+                            expected_versions: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Swap in new versions of several collections at once, e.g. after the library file changed on disk.
+
+        A collection is only replaced if its version still equals the expected one,
+        so edits made since the caller looked are never overwritten. Everything
+        accepted is applied together under the lock. Replaced collections keep their
+        position and get new item ids. Change listeners are not called, since the
+        new versions came from outside; callers report the result themselves.
+
+        Args:
+            replacements (Dict[str, Optional[Dict[str, Any]]]): Validated collections by name,
+                or None to remove a collection. Names not in the library are appended.
+            expected_versions (Dict[str, int]): The version each collection must still have
+                (see collection_versions); 0 for collections that must not exist.
+
+        Returns:
+            Dict[str, Any]: The names of the collections "added", "updated" and "removed", the
+                "conflicts" left alone because their version changed, and the new "versions".
+        """
+        result: Dict[str, Any] = {"added": [], "updated": [], "removed": [], "conflicts": [], "versions": {}}
+        with self._lock:
+            accepted: Dict[str, Optional[Dict[str, Any]]] = {}
+            for name, collection in replacements.items():
+                if self._versions.get(name, 0) != expected_versions.get(name, 0):
+                    result["conflicts"].append(name)
+                elif collection is not None or name in self._versions:
+                    accepted[name] = collection
+            if accepted:
+                for collection_index in list(self._tombstones):
+                    self._compact(collection_index)
+                collections: List[Dict[str, Any]] = []
+                sources: List[Optional[int]] = []
+                for collection_index, collection in enumerate(self.collections):
+                    name = collection["name"]
+                    if name not in accepted:
+                        collections.append(collection)
+                        sources.append(collection_index)
+                    elif accepted[name] is None:
+                        result["removed"].append(name)
+                    else:
+                        collections.append(accepted[name])
+                        sources.append(None)
+                        result["updated"].append(name)
+                for name, collection in accepted.items():
+                    if collection is not None and name not in self._versions:
+                        collections.append(collection)
+                        sources.append(None)
+                        result["added"].append(name)
+                self._ids.rebuild(sources, [len(collection["items"]) for collection in collections])
+                self._unvalidated = {index for index, source in enumerate(sources)
+                                     if source is not None and source in self._unvalidated}
+                self.collections = collections
+                self._collections_replaced()
+                for name in result["removed"]:
+                    del self._versions[name]
+                for name in result["updated"] + result["added"]:
+                    self._bump_version(name)
+                    result["versions"][name] = self._versions[name]
+        logger.info(f"Replaced collections: {len(result['added'])} added, {len(result['updated'])} updated, "
+                    f"{len(result['removed'])} removed, {len(result['conflicts'])} conflicts")
+        return result
+
+    def collection_versions(self) -> Dict[str, int]:
+        """
+        Return the version of every collection by name.
+
+        A collection's version changes whenever it changes, and versions are never reused,
+        so comparing two readings tells which collections changed in between.
+        """
+        with self._lock:
+            return dict(self._versions)
+
+    def collection_equals(self, collection_name: str, collection: Dict[str, Any]) -> bool:
+        """Return True if the library holds a collection with exactly the given name, fields and items."""
+        with self._lock:
+            collection_index, current = self._find_collection(collection_name)
+            if not current:
+                return False
+            fields = {key: value for key, value in current.items() if key != "items"}
+            return (fields == {key: value for key, value in collection.items() if key != "items"}
+                    and materialize(self._live_items(collection_index)) == collection.get("items"))
+
+    @logger.log_execution_time
+    def paging_stats(self) -> Dict[str, Any]:
+        """
+        Return memory budget statistics for tuning `memory_budget`.
+
+        Returns:
+            Dict[str, Any]: The budget and estimated resident bytes, the number of resident and
+                paged-out collections, the page file size, eviction, fault and page read counts,
+                and mean and maximum fault latency in milliseconds. Empty if paging is off.
+        """
+        try:
+            if self._pager is None:
+                return {}
+            with self._lock:
+                return self._pager.stats()
+        except Exception as e:
+            logger.error(f"Error reading paging statistics: {str(e)}")
+            return {}
+
+    @contextlib.contextmanager
+    def snapshot(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Take a consistent point-in-time view of the collections for saving or exporting.
+
+        Collection dictionaries and resident item lists are copied under the manager's
+        lock; item dictionaries are shared, since items are never modified in place.
+        Paged-out collections are not read: they keep a PagedItems whose page stays
+        readable until the with block exits, so callers can read them back one at a
+        time (see paging.iter_materialized) within the memory budget. Deleted items
+        are left out of the copied lists; in a PagedItems their slots hold None.
+        Once ids no longer follow the order of the items or an id was released, each
+        collection also carries its "item_ids" so they survive a reload, and the first
+        one the "next_item_id" so released ids are not handed out again.
+
+        Yields:
+            List[Dict[str, Any]]: The copied collections.
+        """
+        pinned: List[PagedItems] = []
+        with self._lock:
+            view = []
+            for index, collection in enumerate(self.collections):
+                items = self._pager.pin(index) if self._pager is not None else None
+                if items is not None:
+                    pinned.append(items)
+                elif index in self._tombstones:
+                    items = [item for item in collection["items"] if item is not None]
+                else:
+                    items = list(collection["items"])
+                view.append(dict(collection, items=items))
+            persisted_ids = self._ids.persisted()
+            if persisted_ids is not None:
+                for collection, runs in zip(view, persisted_ids):
+                    collection["item_ids"] = runs
+                if view:
+                    view[0]["next_item_id"] = self._ids.next_id
+        try:
+            yield view
+        finally:
+            if pinned:
+                with self._lock:
+                    for items in pinned:
+                        self._pager.unpin(items)
+
+    def snapshot_collections(self) -> List[Dict[str, Any]]:
+        """
+        Return a consistent point-in-time copy of the collections, as snapshot() takes it,
+        with every paged-out collection read back.
+
+        Returns:
+            List[Dict[str, Any]]: The copied collections.
+        """
+        with self.snapshot() as view:
+            return list(iter_materialized(view))
+
+    @staticmethod
+    def _write_collections(collections: Iterable[Dict[str, Any]], filename: str, file_format: str,
+                          codec: Optional[str] = None, level: Optional[int] = None) -> Dict[str, bytes]:
+        """
+        Atomically write collections to a file, consuming them one at a time.
+
+        Args:
+            collections (Iterable[Dict[str, Any]]): The collections to write.
+            filename (str): The destination file.
+            file_format (str): "json" or "snapshot".
+            codec (Optional[str]): Compression codec, or None for an uncompressed file.
+            level (Optional[int]): Compression level, or None for the codec default.
+
+        Returns:
+            Dict[str, bytes]: The digest of each collection by name, as LibraryWatcher reads them back.
+
+        Raises:
+            IOError: If the file cannot be written.
+        """
+        digests: Dict[str, bytes] = {}
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, temp_path = tempfile.mkstemp(prefix=".library-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                stream = open_compressor(raw, codec, level) if codec else raw
+                try:
+                    if file_format == "snapshot":
+                        write_snapshot(collections, stream, digests)
+                    else:
+                        text = io.TextIOWrapper(stream, encoding='utf-8')
+                        _write_json_list(collections, text, digests)
+                        text.flush()
+                        text.detach()
+                finally:
+                    if stream is not raw:
+                        stream.close()
+            try:
+                mode = os.stat(filename).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, filename)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digests
+
+    def add_change_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Register a callback invoked with a collection's name whenever that collection changes.
+
+        Callbacks run on the thread that made the change, after the manager's lock is released.
+        """
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback: Callable[[str], None]) -> None:
+        """Unregister a callback added with add_change_listener."""
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def _notify_changed(self, collection_name: str) -> None:
+        """Tell every change listener that a collection was modified."""
+        for callback in list(self._change_listeners):
+            try:
+                callback(collection_name)
+            except Exception as e:
+                logger.error(f"Error in change listener: {str(e)}")
+
+    def close(self) -> None:
+        """Release background resources such as the parallel search pool and the page file."""
+        try:
+            if self._search_pool is not None:
+                self._search_pool.close()
+                self._search_pool = None
+                logger.info("Parallel search pool stopped")
+            if self._pager is not None:
+                self._pager.close()
+        except Exception as e:
+            logger.error(f"Error closing CollectionManager: {str(e)}")
+
+    def _find_collection(self, collection_name: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Return the index and dictionary of a collection, or (-1, None) if it does not exist."""
+        for index, collection in enumerate(self.collections):
+            if collection["name"] == collection_name:
+                return index, self._use_collection(index)
+        return -1, None
+
+    def _use_collection(self, collection_index: int) -> Dict[str, Any]:
+        """Validate a collection if needed, fault its items in if paged out, and return it."""
+        self._ensure_validated(collection_index)
+        if self._pager is not None:
+            with self._lock:
+                self._pager.touch(collection_index, self.collections)
+        return self.collections[collection_index]
+
+    def _ensure_validated(self, collection_index: Optional[int] = None) -> None:
+        """
+        Validate the items of collections whose check was deferred at load time.
+
+        Args:
+            collection_index (Optional[int]): The collection about to be used, or None for all of them.
+
+        Raises:
+            ValidationError: If a collection contains an invalid item. It stays unvalidated,
+                so every later use reports the same error.
+        """
+        if not self._unvalidated:
+            return
+        with self._lock:
+            if collection_index is None:
+                pending = sorted(self._unvalidated)
+            else:
+                pending = [collection_index] if collection_index in self._unvalidated else []
+            for index in pending:
+                item_validator.validate_many(self.collections[index]["items"], f"collections[{index}].items")
+                self._unvalidated.discard(index)
+                logger.debug(f"Validated deferred collection '{self.collections[index]['name']}'")
+
+    def _validated(self, collections: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Collect loaded collections, validating each as it arrives so a bad one stops the load right away.
+
+        Raises:
+            ValidationError: For the first invalid collection, with its index in the path.
+        """
+        validator = shallow_collection_validator if self.defer_validation else collection_validator
+        loaded: List[Dict[str, Any]] = []
+        for index, collection in enumerate(collections):
+            validator.validate(collection, f"collections[{index}]")
+            loaded.append(collection)
+        return loaded
+
+    def _live_items(self, collection_index: int) -> Sequence[Any]:
+        """Return a collection's item list, or a copy without the slots of deleted items if it has any."""
+        items = self.collections[collection_index]["items"]
+        if collection_index not in self._tombstones:
+            return items
+        return [item for item in materialize(items) if item is not None]
+
+    def _resolve(self, refs: List[ItemRef]) -> List[Dict[str, Any]]:
+        """Return the items for a list of refs, reading each paged-out collection at most once."""
+        lists: Dict[int, List[Any]] = {}
+        items = []
+        for ci, ii in refs:
+            item_list = lists.get(ci)
+            if item_list is None:
+                item_list = lists[ci] = materialize(self.collections[ci]['items'])
+            if item_list[ii] is not None:
+                items.append(item_list[ii])
+        return items
+
+    def _item_added(self, collection_index: int, item_index: int, item: Any) -> None:
+        """Assign a newly appended item its id and keep derived search state in step."""
+        self._ids.add(collection_index)
+        self._item_count += 1
+        if self._search_pool is not None:
+            self._search_pool.add(collection_index, item_index, item)
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.add((collection_index, item_index), item.get('name', ''))
+        if self._category_index is not None:
+            self._category_index.add((collection_index, item_index), item.get('category', ''))
+        if self._prefix_index is not None:
+            self._prefix_index.add(item.get('name', ''))
+        if self._merkle is not None:
+            self._merkle.add(collection_index, item)
+        if self._sorted_indexes is not None:
+            for field, key_function in SORT_KEYS.items():
+                key = key_function(item)
+                per_collection = self._sorted_indexes[field]
+                per_collection[None].insert(key, (collection_index, item_index))
+                per_collection.setdefault(collection_index, SortedIndex()).insert(key, (collection_index, item_index))
+
+    def _item_replaced(self, collection_index: int, item_index: int, old: Any, item: Optional[Any]) -> None:
+        """
+        Swap an item's entries in the derived search state after it was updated or deleted in place.
+
+        Args:
+            collection_index (int): Index of the item's collection.
+            item_index (int): Index of the item inside its collection; it keeps this slot.
+            old (Any): The item as it was indexed.
+            item (Optional[Any]): The new item, or None if the slot was marked deleted.
+        """
+        ref = (collection_index, item_index)
+        if self._search_pool is not None:
+            self._search_pool.replace(collection_index, item_index, item)
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.remove(ref)
+            if item is not None:
+                self._fuzzy_index.add(ref, item.get('name', ''))
+            if self._fuzzy_index.dead > max(COMPACT_MIN, len(self._fuzzy_index)):
+                # Removed names linger in the posting lists; rebuild once they outnumber the live ones.
+                self._fuzzy_index = None
+        if self._category_index is not None:
+            self._category_index.remove(ref, old.get('category', ''))
+            if item is not None:
+                self._category_index.add(ref, item.get('category', ''))
+        if self._prefix_index is not None:
+            self._prefix_index.remove(old.get('name', ''))
+            if item is not None:
+                self._prefix_index.add(item.get('name', ''))
+        if self._merkle is not None:
+            if item is None:
+                self._merkle.remove(collection_index, item_index)
+            else:
+                self._merkle.replace(collection_index, item_index, item)
+        if self._sorted_indexes is not None:
+            for field, key_function in SORT_KEYS.items():
+                per_collection = self._sorted_indexes[field]
+                in_collection = per_collection.setdefault(collection_index, SortedIndex())
+                old_key = key_function(old)
+                per_collection[None].remove(old_key, ref)
+                in_collection.remove(old_key, ref)
+                if item is not None:
+                    key = key_function(item)
+                    per_collection[None].insert(key, ref)
+                    in_collection.insert(key, ref)
+
+    def _collections_replaced(self) -> None:
+        """Rebuild derived search state after self.collections was replaced wholesale."""
+        self._item_count = total_items(self.collections) - sum(self._tombstones.values())
+        if self._pager is not None:
+            self._pager.reset(self.collections)
+        if self._search_pool is not None:
+            self._search_pool.load(self.collections)
+        self._fuzzy_index = None
+        self._sorted_indexes = None
+        self._category_index = None
+        self._prefix_index = None
+        self._merkle = None
+
+    def _bump_version(self, collection_name: str) -> None:
+        """Give a collection a new version after it changed. Called with the lock held."""
+        self._version_clock += 1
+        self._versions[collection_name] = self._version_clock
+
+    def _compact(self, collection_index: int) -> None:
+        """
+        Drop the slots of deleted items from a collection's list in place, keeping the order of the rest.
+
+        Only the compacted collection's refs are renumbered in the search state, in
+        O(collection size) plus, for the library-wide sorted indexes, a bisection per item.
+        """
+        removed = self._tombstones.pop(collection_index, 0)
+        if not removed:
+            return
+        if self._pager is not None:
+            self._pager.touch(collection_index, self.collections, enforce=False)
+        items = self.collections[collection_index]["items"]
+        keep = [position for position, item in enumerate(items) if item is not None]
+        for target, position in enumerate(keep):
+            items[target] = items[position]
+        del items[len(keep):]
+        self._ids.compact(collection_index, keep)
+        if self._merkle is not None:
+            self._merkle.compact(collection_index, keep)
+        if self._search_pool is not None:
+            self._search_pool.compact(collection_index, keep)
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.compact(collection_index, keep)
+        if self._category_index is not None:
+            self._category_index.compact(collection_index, keep)
+        if self._sorted_indexes is not None:
+            for per_collection in self._sorted_indexes.values():
+                own = per_collection.get(collection_index)
+                if own is not None:
+                    per_collection[None].compact(collection_index, keep, own)
+                    own.compact(collection_index, keep)
+        if self._pager is not None:
+            self._pager.compacted(collection_index, removed)
+        logger.debug(f"Compacted '{self.collections[collection_index]['name']}': {removed} deleted slots dropped")
+
+    def _ensure_merkle(self) -> MerkleIndex:
+        """Hash every item on first use; add_collection and add_item keep the hashes current."""
+        with self._lock:
+            if self._merkle is None:
+                self._ensure_validated()
+                index = MerkleIndex()
+                index.build(self.collections)
+                self._merkle = index
+                logger.info(f"Content hashes built over {self._item_count} items")
+            return self._merkle
+
+    def _ensure_fuzzy_index(self) -> TrigramIndex:
+        """Build the trigram index over item names on first use."""
+        if self._fuzzy_index is None:
+            index = TrigramIndex()
+            index.build((ref, item.get('name', '')) for ref, item in self._iter_items())
+            self._fuzzy_index = index
+            logger.info(f"Fuzzy index built over {len(index)} items")
+        return self._fuzzy_index
+
+    def _ensure_prefix_index(self) -> PrefixIndex:
+        """Build the autocomplete index over collection and item names on first use."""
+        if self._prefix_index is None:
+            index = PrefixIndex()
+            index.build([c['name'] for c in self.collections] +
+                        [item.get('name', '') for _, item in self._iter_items()])
+            self._prefix_index = index
+            logger.info(f"Prefix index built over {len(index)} names")
+        return self._prefix_index
+
+    def _ensure_category_index(self) -> CategoryIndex:
+        """Build the category inverted index on first use."""
+        if self._category_index is None:
+            index = CategoryIndex()
+            index.build((ref, item.get('category', '')) for ref, item in self._iter_items())
+            self._category_index = index
+            logger.info(f"Category index built over {self._item_count} items")
+        return self._category_index
+
+    def _ensure_sorted_indexes(self) -> Dict[str, Dict[Optional[int], SortedIndex]]:
+        """Build the per-collection and library-wide sorted indexes on first use."""
+        if self._sorted_indexes is None:
+            indexes: Dict[str, Dict[Optional[int], SortedIndex]] = {}
+            for field, key_function in SORT_KEYS.items():
+                per_collection: Dict[Optional[int], SortedIndex] = {}
+                keyed = [(key_function(item), ref) for ref, item in self._iter_items()]
+                library_index = SortedIndex()
+                library_index.build(keyed)
+                per_collection[None] = library_index
+                grouped: Dict[int, List[Tuple[Any, ItemRef]]] = {i: [] for i in range(len(self.collections))}
+                for key, ref in keyed:
+                    grouped[ref[0]].append((key, ref))
+                for collection_index, entries in grouped.items():
+                    per_collection[collection_index] = SortedIndex()
+                    per_collection[collection_index].build(entries)
+                indexes[field] = per_collection
+            self._sorted_indexes = indexes
+            logger.info(f"Sorted indexes built over {self._item_count} items")
+        return self._sorted_indexes
+
+    def _price_range_index(self, collection_name: Optional[str]) -> Optional[SortedIndex]:
+        """Return the price index for one collection or, if no name is given, the whole library."""
+        if collection_name is None:
+            return self._ensure_sorted_indexes()["price"][None]
+        collection_index, collection = self._find_collection(collection_name)
+        if not collection:
+            raise KeyError(f"Collection '{collection_name}' not found")
+        return self._ensure_sorted_indexes()["price"].get(collection_index)
+
+    @staticmethod
+    def _price_bounds(min_price: Optional[float], max_price: Optional[float]) -> Tuple[float, float]:
+        """Validate a price range and turn open ends into index bounds."""
+        for bound in (min_price, max_price):
+            if bound is not None and (not isinstance(bound, (int, float)) or isinstance(bound, bool)):
+                raise TypeError("Price bounds must be numbers or None")
+        low = -MAX_PRICE if min_price is None else float(min_price)
+        high = MAX_PRICE if max_price is None else float(max_price)
+        if low > high:
+            raise ValueError("Minimum price cannot be greater than maximum price")
+        return low, high
+
+    @staticmethod
+    def _check_page_args(order_by: Optional[str], offset: int, limit: Optional[int]) -> None:
+        """Validate ordering and pagination arguments."""
+        if order_by is not None and order_by not in SORT_KEYS:
+            raise ValueError(f"Cannot order by '{order_by}'; expected one of: {', '.join(SORT_KEYS)}")
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Offset must be a non-negative integer")
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError("Limit must be a non-negative integer or None")
+
+    def _iter_items(self):
+        """Yield (ref, item) for every dictionary item in library order."""
+        self._ensure_validated()
+        for collection_index, collection in enumerate(self.collections):
+            for item_index, item in enumerate(collection['items']):
+                if isinstance(item, dict):
+                    yield (collection_index, item_index), item
+
+    def _search_refs(self, search_term_lower: str) -> List[ItemRef]:
+        """Return the refs of the items search_items would return, in library order."""
+        self._ensure_validated()
+        if self._use_parallel_search():
+            return self._parallel_search(search_term_lower)
+        refs: List[ItemRef] = []
+        for collection_index, collection in enumerate(self.collections):
+            for item_index, item in enumerate(collection['items']):
+                if item is not None and (search_term_lower in item.get('name', '').lower()
+                                         or search_term_lower in item.get('category', '').lower()):
+                    refs.append((collection_index, item_index))
+        return refs
+
+    def _use_parallel_search(self) -> bool:
+        """Return True if the library is large enough to benefit from the search pool."""
+        return (self.parallel_search_threshold is not None
+                and self._search_workers > 1
+                and self._item_count >= self.parallel_search_threshold)
+
+    def _parallel_search(self, search_term_lower: str) -> List[ItemRef]:
+        """Run a search on the worker pool, starting and loading it on first use."""
+        return self._ensure_search_pool().search(search_term_lower)
+
+    def _ensure_search_pool(self) -> ShardedSearchPool:
+        """Start and load the search pool on first use."""
+        if self._search_pool is None:
+            self._ensure_validated()
+            self._search_pool = ShardedSearchPool(self._search_workers)
+            self._search_pool.load(self.collections)
+            logger.info(f"Parallel search pool started with {self._search_workers} workers for {self._item_count} items")
+        return self._search_pool
@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Dict, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    An Aho-Corasick automaton: finds which of many patterns occur in a text in
+    a single pass over the text, however many patterns there are.
+
+    Patterns are added one at a time, so they can be streamed from a file, and
+    build() must be called before searching.
+    """
+
+    def __init__(self) -> None:
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[List[int]] = [[]]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._built: bool = False
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def add(self, pattern: str) -> int:
+        """
+        Add a pattern and return its id, the position it was added at.
+
+        Raises:
+            ValueError: If the pattern is empty or the automaton was already built.
+        """
+        if not pattern:
+            raise ValueError("Patterns must not be empty")
+        if self._built:
+            raise ValueError("Cannot add patterns after build()")
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            state = next_state
+        pattern_id = len(self.patterns)
+        self.patterns.append(pattern)
+        self._own[state].append(pattern_id)
+        return pattern_id
+
+    def build(self) -> None:
+        """Compute failure links breadth first and merge each state's matches with its suffix's."""
+        out: List[Tuple[int, ...]] = [()] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            out[state] = tuple(self._own[state])
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(ch, 0)
+                self._fail[child] = link if link != child else 0
+                out[child] = tuple(self._own[child]) + out[self._fail[child]]
+                queue.append(child)
+        self._out = out
+        self._own = []
+        self._built = True
+
+    def search(self, text: str) -> Set[int]:
+        """Return the ids of every pattern that occurs in `text`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
@@ -0,0 +1,361 @@
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set
+
+from logger import logger
+
+# Items sampled per collection when estimating its in-memory size.
+SIZE_SAMPLE = 64
+
+# The page file is rewritten once discarded pages take up more than this many
+# bytes and more space than the live pages.
+COMPACT_THRESHOLD = 32 * 1024 * 1024
+
+
+def estimate_size(items: List[Any]) -> int:
+    """
+    Estimate the memory held by an item list from an evenly spaced sample of its items.
+
+    Each item counts its dictionary and its values; keys are shared between items
+    and are not counted. The result is an approximation meant for budgeting.
+    """
+    count = len(items)
+    if count == 0:
+        return sys.getsizeof(items)
+    step = max(1, count // SIZE_SAMPLE)
+    sample = items[::step][:SIZE_SAMPLE]
+    per_item = sum(_item_size(item) for item in sample) / len(sample)
+    return sys.getsizeof(items) + int(per_item * count)
+
+
+def _item_size(item: Any) -> int:
+    if isinstance(item, dict):
+        return sys.getsizeof(item) + sum(sys.getsizeof(value) for value in item.values())
+    return sys.getsizeof(item)
+
+
+class _Page:
+    """Where one item list was written in the page file."""
+    __slots__ = ("offset", "length", "count", "valid", "pins")
+
+    def __init__(self, offset: int, length: int, count: int) -> None:
+        self.offset: int = offset
+        self.length: int = length
+        self.count: int = count
+        self.valid: bool = True
+        self.pins: int = 0
+
+
+class PagedItems(Sequence):
+    """
+    Stands in for the item list of a collection that was paged out.
+
+    len() answers from memory. Indexing and iteration read the items back from
+    the page file without making the collection resident again, so scans over
+    the whole library do not push the working set out of memory.
+    """
+    __slots__ = ("_pager", "_page")
+
+    def __init__(self, pager: "CollectionPager", page: _Page) -> None:
+        self._pager = pager
+        self._page = page
+
+    def __len__(self) -> int:
+        return self._page.count
+
+    def __getitem__(self, index: Any) -> Any:
+        return self.load()[index]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __repr__(self) -> str:
+        return f"<PagedItems: {self._page.count} items>"
+
+    def load(self) -> List[Any]:
+        """Read the items from the page file."""
+        return self._pager.read(self._page)
+
+
+def materialize(items: Any) -> List[Any]:
+    """Return an item list itself, or the items of a paged-out list read back from disk."""
+    return items.load() if isinstance(items, PagedItems) else items
+
+
+def iter_materialized(collections: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield collections whose paged-out item lists are read back one collection at a time.
+
+    Deleted items, whose slots hold None, are left out of the lists read back;
+    other collections are yielded as they are.
+    """
+    for collection in collections:
+        items = collection["items"]
+        if isinstance(items, PagedItems):
+            collection = dict(collection, items=[item for item in items.load() if item is not None])
+        yield collection
+
+
+class CollectionPager:
+    """
+    Keeps the item lists of a CollectionManager's collections within a memory budget.
+
+    Collections are tracked in least-recently-accessed order. When the estimated
+    size of the resident item lists exceeds the budget, the coldest lists are
+    written to an anonymous page file in the user data directory and replaced by
+    PagedItems. A paged-out collection is faulted back in the next time it is
+    accessed through touch(). A page stays valid while its collection is
+    unchanged, so evicting a collection that was only read costs no I/O.
+    A pinned page (see pin()) stays readable until it is unpinned, even if its
+    collection changes in the meantime.
+
+    The page file is private to the process and deleted when it is closed, so
+    pages are encoded with pickle. Callers serialize calls other than read()
+    with their own lock.
+    """
+
+    def __init__(self, budget: int, directory: Optional[str] = None) -> None:
+        """
+        Initialize a pager without creating the page file.
+
+        Args:
+            budget (int): Bytes of item lists to keep resident.
+            directory (Optional[str]): Where to create the page file. Defaults to the temp directory.
+
+        Raises:
+            ValueError: If the budget is not a positive integer.
+        """
+        if not isinstance(budget, int) or isinstance(budget, bool) or budget <= 0:
+            raise ValueError("Memory budget must be a positive number of bytes")
+        self.budget: int = budget
+        self.directory: Optional[str] = directory
+        self.resident_bytes: int = 0
+        self.evictions: int = 0
+        self.faults: int = 0
+        self.page_reads: int = 0
+        self.fault_seconds: float = 0.0
+        self.max_fault_seconds: float = 0.0
+        self._resident: "OrderedDict[int, int]" = OrderedDict()
+        self._evicted: Set[int] = set()
+        self._pages: Dict[int, _Page] = {}
+        self._orphans: Set[_Page] = set()
+        self._file: Optional[BinaryIO] = None
+        self._end: int = 0
+        self._dead_bytes: int = 0
+        self._io_lock = threading.Lock()
+        self._cache: Optional[tuple] = None
+
+    def reset(self, collections: List[Dict[str, Any]]) -> None:
+        """
+        Re-read the state of every collection after the list was replaced or rewritten.
+
+        Collections that still hold their PagedItems stay paged out; every other
+        collection is resident and any page it had is discarded.
+        """
+        live = {id(page) for page in self._pages.values()}
+        previous = self._pages
+        self._pages = {}
+        self._resident.clear()
+        self._evicted.clear()
+        self.resident_bytes = 0
+        for index, collection in enumerate(collections):
+            items = collection["items"]
+            if isinstance(items, PagedItems) and id(items._page) in live and items._pager is self:
+                self._pages[index] = items._page
+                self._evicted.add(index)
+            else:
+                self._admit(index, estimate_size(items))
+        kept = {id(page) for page in self._pages.values()}
+        for page in previous.values():
+            if id(page) not in kept:
+                self._discard(page)
+        self.enforce(collections)
+
+    def touch(self, index: int, collections: List[Dict[str, Any]], enforce: bool = True) -> None:
+        """
+        Mark a collection as just used, faulting its items back in if they were paged out.
+
+        With enforce=False other collections are not paged out to make room; callers that
+        need several collections resident at once call enforce() when they are done.
+        """
+        if index in self._evicted:
+            start = time.perf_counter()
+            collection = collections[index]
+            items = self.read(self._pages[index], count=False)
+            collection["items"] = items
+            self._evicted.discard(index)
+            self._admit(index, estimate_size(items))
+            elapsed = time.perf_counter() - start
+            self.faults += 1
+            self.fault_seconds += elapsed
+            self.max_fault_seconds = max(self.max_fault_seconds, elapsed)
+            logger.debug(f"Faulted in '{collection['name']}' ({len(items)} items) in {elapsed * 1000:.2f}ms")
+        elif index in self._resident:
+            self._resident.move_to_end(index)
+        else:
+            self._admit(index, estimate_size(collections[index]["items"]))
+        if enforce:
+            self.enforce(collections, keep=index)
+
+    def grew(self, index: int, item: Any) -> None:
+        """Account for an item appended to a resident collection; its page no longer matches."""
+        self._changed(index, _item_size(item) + 8)
+
+    def replaced(self, index: int, old: Any, new: Any) -> None:
+        """Account for an item of a resident collection replaced in place, by None if it was deleted."""
+        self._changed(index, _item_size(new) - _item_size(old))
+
+    def compacted(self, index: int, removed: int) -> None:
+        """Account for `removed` slots dropped from a resident collection's item list."""
+        self._changed(index, -8 * removed)
+
+    def pin(self, index: int) -> Optional[PagedItems]:
+        """
+        Return a paged-out collection's PagedItems and keep its page readable until unpin().
+
+        Returns:
+            Optional[PagedItems]: The items, or None if the collection is resident.
+        """
+        if index not in self._evicted:
+            return None
+        page = self._pages[index]
+        page.pins += 1
+        return PagedItems(self, page)
+
+    def unpin(self, items: PagedItems) -> None:
+        """Release a page pinned by pin(), discarding it if its collection changed meanwhile."""
+        page = items._page
+        page.pins -= 1
+        if not page.pins and page in self._orphans:
+            self._orphans.discard(page)
+            self._discard(page)
+
+    def enforce(self, collections: List[Dict[str, Any]], keep: Optional[int] = None) -> None:
+        """Page out least recently used collections until the resident size fits the budget."""
+        while self.resident_bytes > self.budget and self._resident:
+            index = next(iter(self._resident))
+            if index == keep:
+                if len(self._resident) == 1:
+                    break
+                self._resident.move_to_end(index)
+                continue
+            self._evict(index, collections[index])
+
+    def read(self, page: _Page, count: bool = True) -> List[Any]:
+        """
+        Read the items stored in a page.
+
+        Raises:
+            RuntimeError: If the page was discarded because its collection changed or was reloaded.
+        """
+        with self._io_lock:
+            if not page.valid:
+                raise RuntimeError("Paged-out items are no longer available; the collections were replaced")
+            if self._cache is not None and self._cache[0] is page:
+                return self._cache[1]
+            self._file.seek(page.offset)
+            items = pickle.loads(self._file.read(page.length))
+            self._cache = (page, items)
+            if count:
+                self.page_reads += 1
+            return items
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the budget, resident size, eviction and fault counters and fault latency."""
+        return {
+            "budget_bytes": self.budget,
+            "resident_bytes": self.resident_bytes,
+            "resident_collections": len(self._resident),
+            "paged_collections": len(self._evicted),
+            "page_file_bytes": self._end,
+            "evictions": self.evictions,
+            "faults": self.faults,
+            "page_reads": self.page_reads,
+            "fault_ms_mean": self.fault_seconds / self.faults * 1000 if self.faults else 0.0,
+            "fault_ms_max": self.max_fault_seconds * 1000,
+        }
+
+    def close(self) -> None:
+        """Delete the page file. Paged-out items are lost; save before closing."""
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for page in list(self._pages.values()) + list(self._orphans):
+                page.valid = False
+            self._pages.clear()
+            self._orphans.clear()
+            self._cache = None
+
+    def _changed(self, index: int, size: int) -> None:
+        self._resident[index] = self._resident.get(index, 0) + size
+        self.resident_bytes += size
+        page = self._pages.pop(index, None)
+        if page is not None:
+            self._discard(page)
+
+    def _admit(self, index: int, size: int) -> None:
+        self._resident[index] = size
+        self.resident_bytes += size
+
+    def _evict(self, index: int, collection: Dict[str, Any]) -> None:
+        """Replace a resident collection's items with PagedItems, writing a page if needed."""
+        size = self._resident.pop(index)
+        self.resident_bytes -= size
+        page = self._pages.get(index)
+        if page is None:
+            page = self._pages[index] = self._write(collection["items"])
+        collection["items"] = PagedItems(self, page)
+        self._evicted.add(index)
+        self.evictions += 1
+        logger.debug(f"Paged out '{collection['name']}' ({page.count} items, ~{size} bytes)")
+
+    def _write(self, items: List[Any]) -> _Page:
+        data = pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._io_lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix=".library-pages-", dir=self.directory)
+                self._end = 0
+            self._file.seek(self._end)
+            self._file.write(data)
+            page = _Page(self._end, len(data), len(items))
+            self._end += len(data)
+            return page
+
+    def _discard(self, page: _Page) -> None:
+        """Forget a page that no longer matches its collection, reclaiming page file space once it is not pinned."""
+        with self._io_lock:
+            if page.pins:
+                self._orphans.add(page)
+                return
+            page.valid = False
+            if self._cache is not None and self._cache[0] is page:
+                self._cache = None
+            self._dead_bytes += page.length
+            if not self._pages and not self._orphans and self._file is not None:
+                self._file.seek(0)
+                self._file.truncate()
+                self._end = 0
+                self._dead_bytes = 0
+            elif self._dead_bytes > COMPACT_THRESHOLD and self._dead_bytes > self._end - self._dead_bytes:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Copy the live pages into a new page file. Called with the I/O lock held."""
+        replacement = tempfile.TemporaryFile(prefix=".library-pages-", dir=self.directory)
+        end = 0
+        for page in sorted(list(self._pages.values()) + list(self._orphans), key=lambda p: p.offset):
+            self._file.seek(page.offset)
+            replacement.write(self._file.read(page.length))
+            page.offset = end
+            end += page.length
+        self._file.close()
+        self._file = replacement
+        self._end = end
+        self._dead_bytes = 0
+        logger.info(f"Compacted page file to {end} bytes")
@@ -0,0 +1,224 @@
+import bisect
+import heapq
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# An item reference is the (collection index, item index) position of an item
+# inside CollectionManager.collections.
+ItemRef = Tuple[int, int]
+
+
+def _worker_main(conn: Connection) -> None:
+    """
+    Serve search requests for one shard until told to stop.
+
+    The shard keeps, per collection index, the lowercased name and category of
+    every item it owns, so queries never need the original item dictionaries.
+    """
+    shard: Dict[int, List[Tuple[int, str, str]]] = {}
+    order: List[int] = []
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        command = message[0]
+        if command == "load":
+            shard = {}
+            for collection_index, item_index, name, category in message[1]:
+                shard.setdefault(collection_index, []).append((item_index, name, category))
+            order = sorted(shard)
+        elif command == "add":
+            collection_index, item_index, name, category = message[1]
+            if collection_index not in shard:
+                shard[collection_index] = []
+                order = sorted(shard)
+            shard[collection_index].append((item_index, name, category))
+        elif command == "replace":
+            # Rows are kept in item order, so the owner finds the row with a bisection.
+            collection_index, item_index, name, category = message[1]
+            rows = shard.get(collection_index)
+            if rows:
+                position = bisect.bisect_left(rows, (item_index,))
+                if position < len(rows) and rows[position][0] == item_index:
+                    rows[position] = (item_index, name, category)
+        elif command == "compact":
+            collection_index, keep = message[1], message[2]
+            if collection_index in shard:
+                moved = {old: new for new, old in enumerate(keep)}
+                shard[collection_index] = [(moved[item_index], name, category)
+                                           for item_index, name, category in shard[collection_index]
+                                           if item_index in moved]
+        elif command == "search":
+            term = message[1]
+            hits: List[ItemRef] = []
+            for collection_index in order:
+                for item_index, name, category in shard[collection_index]:
+                    if term in name or term in category:
+                        hits.append((collection_index, item_index))
+            conn.send(hits)
+        elif command == "stop":
+            break
+    conn.close()
+
+
+def _row(collection_index: int, item_index: int, item: Any) -> Tuple[int, int, str, str]:
+    """Build the searchable row a worker stores for one item."""
+    if not isinstance(item, dict):
+        return (collection_index, item_index, "", "")
+    return (
+        collection_index,
+        item_index,
+        str(item.get('name', '')).lower(),
+        str(item.get('category', '')).lower(),
+    )
+
+
+class ShardedSearchPool:
+    """
+    A pool of worker processes that each hold a shard of the library for searching.
+
+    Items are partitioned across the workers when the pool is loaded, new items
+    are routed to the smallest shard and changed items are updated by the shard
+    holding them, so workers stay warm between queries and only ever receive
+    incremental updates. Each worker returns its hits in (collection, item)
+    order and the pool merges them back into library order.
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        """
+        Initialize the pool without starting any processes.
+
+        Args:
+            workers (Optional[int]): Number of worker processes. Defaults to the CPU count.
+        """
+        self.workers: int = max(1, workers or os.cpu_count() or 1)
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        self._shard_sizes: List[int] = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Return True if the worker processes have been started."""
+        return bool(self._processes)
+
+    def start(self) -> None:
+        """Start the worker processes if they are not already running."""
+        with self._lock:
+            if self._processes:
+                return
+            for _ in range(self.workers):
+                parent_conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_worker_main, args=(child_conn,), daemon=True)
+                process.start()
+                child_conn.close()
+                self._connections.append(parent_conn)
+                self._processes.append(process)
+                self._shard_sizes.append(0)
+
+    def load(self, collections: List[Dict[str, Any]]) -> None:
+        """
+        Replace the contents of every shard with the given collections.
+
+        Items are split into contiguous, equally sized runs so each worker scans
+        roughly the same number of rows.
+
+        Args:
+            collections (List[Dict[str, Any]]): The collections to distribute.
+        """
+        self.start()
+        rows = [
+            _row(collection_index, item_index, item)
+            for collection_index, collection in enumerate(collections)
+            for item_index, item in enumerate(collection.get('items', []))
+        ]
+        chunk = -(-len(rows) // self.workers) if rows else 0
+        with self._lock:
+            for index, conn in enumerate(self._connections):
+                shard_rows = rows[index * chunk:(index + 1) * chunk]
+                conn.send(("load", shard_rows))
+                self._shard_sizes[index] = len(shard_rows)
+
+    def add(self, collection_index: int, item_index: int, item: Any) -> None:
+        """
+        Route a newly added item to the smallest shard.
+
+        Args:
+            collection_index (int): Index of the item's collection.
+            item_index (int): Index of the item inside its collection.
+            item (Any): The item that was added.
+        """
+        with self._lock:
+            if not self._connections:
+                return
+            target = min(range(len(self._shard_sizes)), key=self._shard_sizes.__getitem__)
+            self._connections[target].send(("add", _row(collection_index, item_index, item)))
+            self._shard_sizes[target] += 1
+
+    def replace(self, collection_index: int, item_index: int, item: Any) -> None:
+        """
+        Update the row of a changed item on the shard that holds it.
+
+        Args:
+            collection_index (int): Index of the item's collection.
+            item_index (int): Index of the item inside its collection.
+            item (Any): The item's new value, or None if it was deleted.
+        """
+        with self._lock:
+            row = _row(collection_index, item_index, item)
+            for conn in self._connections:
+                conn.send(("replace", row))
+
+    def compact(self, collection_index: int, keep: List[int]) -> None:
+        """
+        Renumber one collection's rows after its item list was compacted, dropping deleted items.
+
+        Args:
+            collection_index (int): Index of the compacted collection.
+            keep (List[int]): The old positions of the remaining items, in order.
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.send(("compact", collection_index, keep))
+
+    def search(self, search_term_lower: str) -> List[ItemRef]:
+        """
+        Fan a lowercased search term out to every shard and merge the hits.
+
+        Args:
+            search_term_lower (str): The already lowercased search term.
+
+        Returns:
+            List[ItemRef]: Matching item references in library order.
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.send(("search", search_term_lower))
+            partials: List[List[ItemRef]] = [conn.recv() for conn in self._connections]
+        return list(heapq.merge(*partials))
+
+    def close(self) -> None:
+        """Stop the worker processes and release their pipes."""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.send(("stop",))
+                    conn.close()
+                except (OSError, EOFError):
+                    pass
+            for process in self._processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+            self._connections = []
+            self._processes = []
+            self._shard_sizes = []
+
+
+def total_items(collections: Iterable[Dict[str, Any]]) -> int:
+    """Return the number of items across the given collections."""
+    return sum(len(collection.get('items', [])) for collection in collections)
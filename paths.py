@@ -0,0 +1,33 @@
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Name of the library file inside the user data directory.
+LIBRARY_FILENAME = "library_data.json"
+
+
+def get_user_data_dir() -> str:
+    """
+    Get the user data directory for storing application data.
+
+    Returns:
+        str: The path to the user data directory.
+
+    Raises:
+        OSError: If there's an error creating the directory.
+    """
+    try:
+        home: Path = Path.home()
+        if sys.platform == "win32":
+            user_data_dir: Path = home / "AppData/Local/TheLibrary"
+        elif sys.platform == "darwin":
+            user_data_dir: Path = home / "Library/Application Support/TheLibrary"
+        else:
+            user_data_dir: Path = Path(os.environ.get("XDG_DATA_HOME") or home / ".local/share") / "TheLibrary"
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+    
+        return str(user_data_dir)
+    except OSError as e:
+        logging.error(f"Error creating user data directory: {str(e)}")
+        raise
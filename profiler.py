@@ -0,0 +1,169 @@
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Optional, Tuple
+
+from logger import logger
+
+# Set to "1", "cpu", "memory" or "cpu,memory" to start the app with profiling on.
+PROFILE_ENV = "THE_LIBRARY_PROFILE"
+
+# Directory inside the user data directory that receives the reports.
+PROFILES_DIRNAME = "profiles"
+
+# Reports of at most this many operations are kept; older ones are deleted.
+MAX_REPORTS = 50
+
+# Allocation reports list this many source lines, largest growth first.
+TOP_ALLOCATIONS = 25
+
+CPU_SUFFIX = ".prof"
+MEMORY_SUFFIX = ".alloc.txt"
+
+
+def profile_modes_from_env() -> Optional[Tuple[bool, bool]]:
+    """Return (cpu, memory) as requested by the PROFILE_ENV variable, or None if profiling is not requested."""
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "false", "off", "no"):
+        return None
+    modes = {mode.strip() for mode in value.split(",")}
+    if modes & {"cpu", "memory"}:
+        return "cpu" in modes, "memory" in modes
+    return True, True
+
+
+class OperationProfiler:
+    """
+    Records CPU profiles and allocation deltas of individual operations.
+
+    While enabled, every call passed to run() is profiled with cProfile and/or
+    compared against a tracemalloc snapshot taken before it. Each call leaves a
+    "<time>-<operation>.prof" file, readable with pstats or snakeviz, and a
+    "<time>-<operation>.alloc.txt" report of the source lines that allocated the
+    most memory, in `directory`. Only the newest `max_reports` calls are kept.
+
+    One call is profiled at a time: calls made while another is being profiled,
+    on the same thread or another one, run normally and are counted in `skipped`.
+    Disabled, the profiler costs callers one attribute check (see `profiled`).
+    """
+
+    def __init__(self, directory: str, max_reports: int = MAX_REPORTS) -> None:
+        """
+        Initialize a disabled profiler.
+
+        Args:
+            directory (str): Where reports are written; created when profiling is enabled.
+            max_reports (int): Number of profiled calls whose reports are kept.
+        """
+        self.directory: str = directory
+        self.max_reports: int = max_reports
+        self.enabled: bool = False
+        self.cpu: bool = False
+        self.memory: bool = False
+        self.reports: int = 0
+        self.skipped: int = 0
+        self.last_report: Optional[str] = None
+        self._started_tracing: bool = False
+        self._busy = threading.Lock()
+
+    def enable(self, cpu: bool = True, memory: bool = True) -> None:
+        """Start profiling the calls passed to run()."""
+        os.makedirs(self.directory, exist_ok=True)
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.cpu, self.memory = cpu, memory
+        self.enabled = cpu or memory
+        logger.info(f"Profiling enabled (cpu={cpu}, memory={memory}); reports go to {self.directory}")
+
+    def disable(self) -> None:
+        """Stop profiling; a call being profiled still writes its reports."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        logger.info(f"Profiling disabled after {self.reports} reports ({self.skipped} overlapping calls skipped)")
+
+    def run(self, name: str, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call function(*args, **kwargs), profiled if enabled and no other call is being profiled."""
+        if not self.enabled or not self._busy.acquire(blocking=False):
+            if self.enabled:
+                self.skipped += 1
+            return function(*args, **kwargs)
+        try:
+            memory = self.memory and tracemalloc.is_tracing()
+            before = self._snapshot() if memory else None
+            if memory:
+                tracemalloc.reset_peak()
+                start_size = tracemalloc.get_traced_memory()[0]
+            profile = cProfile.Profile() if self.cpu else None
+            start = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                elapsed = time.perf_counter() - start
+                memory_line = ""
+                if memory and tracemalloc.is_tracing():
+                    size, peak = tracemalloc.get_traced_memory()
+                    memory_line = f"net {(size - start_size) / 1024:+.1f} KiB, peak +{(peak - start_size) / 1024:.1f} KiB"
+                    self._write(name, elapsed, profile, before, self._snapshot(), memory_line)
+                else:
+                    self._write(name, elapsed, profile, None, None, memory_line)
+        finally:
+            self._busy.release()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        # Leave out the profiler's own allocations, such as the previous snapshot.
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__)])
+
+    def _write(self, name: str, elapsed: float, profile: Optional[cProfile.Profile],
+               before: Optional[tracemalloc.Snapshot], after: Optional[tracemalloc.Snapshot],
+               memory_line: str) -> None:
+        """Write the reports of one call and drop the oldest beyond max_reports."""
+        stem = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{name}")
+        try:
+            if profile is not None:
+                profile.dump_stats(stem + CPU_SUFFIX)
+            if before is not None and after is not None:
+                lines = [f"{name}: {elapsed:.4f}s, {memory_line}", ""]
+                lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS])
+                with open(stem + MEMORY_SUFFIX, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            self.reports += 1
+            self.last_report = stem
+            self._prune()
+            logger.info(f"Profiled {name} in {elapsed:.4f}s {memory_line}".rstrip() + f" -> {stem}")
+        except OSError as e:
+            logger.error(f"Error writing profile of {name}: {str(e)}")
+
+    def _prune(self) -> None:
+        """Delete the reports of all but the newest max_reports calls; names sort by time."""
+        stems = sorted({entry[:-len(suffix)] for entry in os.listdir(self.directory)
+                        for suffix in (CPU_SUFFIX, MEMORY_SUFFIX) if entry.endswith(suffix)})
+        for stem in stems[:max(0, len(stems) - self.max_reports)]:
+            for suffix in (CPU_SUFFIX, MEMORY_SUFFIX):
+                path = os.path.join(self.directory, stem + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def profiled(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator running a method under its object's `profiler` while profiling is enabled."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.profiler.enabled:
+            return method(self, *args, **kwargs)
+        return self.profiler.run(method.__name__, method, self, *args, **kwargs)
+    return wrapper
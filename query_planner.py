@@ -0,0 +1,222 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from indexes import MAX_PRICE, normalize_text
+from parallel_search import ItemRef
+
+# Keys accepted in a filter expression.
+FILTER_KEYS = ("collection", "category", "min_price", "max_price", "name_contains")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class AccessPath:
+    """
+    One way of producing candidate items for a query, with its estimated cost.
+
+    Attributes:
+        kind (str): "category", "price", "name" or "scan".
+        description (str): Human readable description used by explain().
+        estimate (int): Estimated number of candidate rows the path produces.
+        fetch (Callable[[], List[ItemRef]]): Produces the candidate references.
+    """
+
+    def __init__(self, kind: str, description: str, estimate: int, fetch: Callable[[], List[ItemRef]]) -> None:
+        self.kind: str = kind
+        self.description: str = description
+        self.estimate: int = estimate
+        self.fetch: Callable[[], List[ItemRef]] = fetch
+
+
+class QueryPlan:
+    """
+    The access path chosen for a filter expression, plus the alternatives that were rejected.
+
+    The plan drives the scan from its chosen path and verifies every predicate
+    on each candidate, so the driving index only has to return a superset of the
+    matching items.
+    """
+
+    def __init__(self, filters: Dict[str, Any], chosen: AccessPath, alternatives: List[AccessPath],
+                 total_items: int, predicates: List[str], verify: Callable[[ItemRef], bool]) -> None:
+        self.filters: Dict[str, Any] = filters
+        self.chosen: AccessPath = chosen
+        self.alternatives: List[AccessPath] = alternatives
+        self.total_items: int = total_items
+        self.predicates: List[str] = predicates
+        self._verify: Callable[[ItemRef], bool] = verify
+
+    def execute(self) -> List[ItemRef]:
+        """Fetch the candidates from the chosen path and return the verified ones in library order."""
+        candidates = self.chosen.fetch()
+        if self.chosen.kind == "price":
+            candidates = sorted(candidates)
+        return [ref for ref in candidates if self._verify(ref)]
+
+    def explain(self) -> str:
+        """
+        Describe the chosen plan and why it won.
+
+        Returns:
+            str: A multi-line report listing the driving access path, its estimated
+            selectivity, the predicates checked on candidates and every alternative.
+        """
+        def selectivity(path: AccessPath) -> str:
+            share = path.estimate / self.total_items * 100 if self.total_items else 0.0
+            return f"~{path.estimate} of {self.total_items} rows, {share:.2f}%"
+
+        lines = [f"Drive: {self.chosen.description} ({selectivity(self.chosen)})"]
+        lines.append("Verify: " + (" AND ".join(self.predicates) if self.predicates else "nothing (no predicates)"))
+        for path in self.alternatives:
+            lines.append(f"Rejected: {path.description} ({selectivity(path)})")
+        return "\n".join(lines)
+
+
+class QueryPlanner:
+    """
+    Chooses the most selective access path for a combined filter expression.
+
+    A filter expression is a dictionary with any of these keys:
+
+        collection     exact collection name
+        category       category, compared case-insensitively
+        min_price      inclusive lower price bound
+        max_price      inclusive upper price bound
+        name_contains  case-insensitive substring of the item name
+
+    Selectivity is estimated from index statistics: the size of the category
+    bucket, the exact row count of the price range and the smallest posting list
+    among the substring's name trigrams. The cheapest path drives the scan.
+    """
+
+    def __init__(self, manager: Any) -> None:
+        """
+        Initialize the planner.
+
+        Args:
+            manager (CollectionManager): The manager whose collections and indexes are queried.
+        """
+        self.manager = manager
+
+    def plan(self, filters: Dict[str, Any]) -> QueryPlan:
+        """
+        Build a plan for a filter expression.
+
+        Args:
+            filters (Dict[str, Any]): The filter expression.
+
+        Returns:
+            QueryPlan: The plan, ready to execute() or explain().
+
+        Raises:
+            TypeError: If the filter expression or one of its values has the wrong type.
+            ValueError: If the filter expression contains unknown keys or an empty price range.
+            KeyError: If the filtered collection does not exist.
+        """
+        self._validate(filters)
+        manager = self.manager
+        collections = manager.collections
+        collection_index: Optional[int] = None
+        if "collection" in filters:
+            collection_index, collection = manager._find_collection(filters["collection"])
+            if not collection:
+                raise KeyError(f"Collection '{filters['collection']}' not found")
+
+        category = filters.get("category")
+        category_lower = category.lower() if category is not None else None
+        has_price = "min_price" in filters or "max_price" in filters
+        low = float(filters["min_price"]) if filters.get("min_price") is not None else -MAX_PRICE
+        high = float(filters["max_price"]) if filters.get("max_price") is not None else MAX_PRICE
+        term = filters.get("name_contains")
+        term_lower = term.lower() if term is not None else None
+
+        predicates: List[str] = []
+        if collection_index is not None:
+            predicates.append(f"collection = {filters['collection']!r}")
+        if category_lower is not None:
+            predicates.append(f"category = {category_lower!r}")
+        if has_price:
+            predicates.append(f"{low:g} <= price <= {high:g}")
+        if term_lower is not None:
+            predicates.append(f"name contains {term_lower!r}")
+
+        def verify(ref: ItemRef) -> bool:
+            if collection_index is not None and ref[0] != collection_index:
+                return False
+            item = collections[ref[0]]['items'][ref[1]]
+            if not isinstance(item, dict):
+                return False
+            if category_lower is not None and str(item.get('category', '')).lower() != category_lower:
+                return False
+            if has_price:
+                price = item.get('price')
+                if not _is_number(price) or not low <= price <= high:
+                    return False
+            if term_lower is not None and term_lower not in str(item.get('name', '')).lower():
+                return False
+            return True
+
+        if collection_index is not None:
+            total = len(collections[collection_index]['items'])
+            scan = AccessPath("scan", f"full scan of collection {filters['collection']!r}", total,
+                              lambda: [(collection_index, i) for i in range(total)])
+        else:
+            total = manager._item_count
+            scan = AccessPath("scan", "full scan of the library", total,
+                              lambda: [ref for ref, _ in manager._iter_items()])
+
+        paths: List[AccessPath] = [scan]
+        if category_lower is not None:
+            bucket = manager._ensure_category_index().refs(category_lower)
+            paths.append(AccessPath("category", f"category bucket {category_lower!r}", len(bucket), lambda: bucket))
+        if has_price:
+            price_index = manager._ensure_sorted_indexes()["price"].get(collection_index)
+            if price_index is not None:
+                start, stop = price_index.bounds(low, high)
+                paths.append(AccessPath("price", f"price index range [{low:g}, {high:g}]", stop - start,
+                                        lambda: price_index.page(low=low, high=high)))
+        if term_lower is not None:
+            grams = self._substring_grams(term_lower)
+            if grams:
+                name_index = manager._ensure_fuzzy_index()
+                estimate = min(name_index.posting_size(g) for g in grams)
+                paths.append(AccessPath("name", f"name trigrams of {term_lower!r} ({len(grams)} grams)", estimate,
+                                        lambda: name_index.refs_containing_all(grams)))
+
+        # Index paths win ties with the full scan; the scan is only kept when nothing is cheaper.
+        chosen = min(paths, key=lambda path: (path.estimate, path.kind == "scan"))
+        alternatives = [path for path in paths if path is not chosen]
+        return QueryPlan(filters, chosen, alternatives, total, predicates, verify)
+
+    @staticmethod
+    def _substring_grams(term_lower: str) -> Set[str]:
+        """
+        Return the trigrams every matching name must contain, or an empty set if the
+        name index cannot answer this substring safely.
+
+        The trigram index stores normalized names, so it can only narrow a raw
+        substring search when the substring is plain ASCII that normalization
+        leaves unchanged.
+        """
+        if len(term_lower) < 3 or not term_lower.isascii() or normalize_text(term_lower) != term_lower:
+            return set()
+        return {term_lower[i:i + 3] for i in range(len(term_lower) - 2)}
+
+    @staticmethod
+    def _validate(filters: Dict[str, Any]) -> None:
+        """Check the structure and value types of a filter expression."""
+        if not isinstance(filters, dict):
+            raise TypeError("Filters must be a dictionary")
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}")
+        for key in ("collection", "category", "name_contains"):
+            if key in filters and not isinstance(filters[key], str):
+                raise TypeError(f"Filter '{key}' must be a string")
+        for key in ("min_price", "max_price"):
+            if filters.get(key) is not None and not _is_number(filters[key]):
+                raise TypeError(f"Filter '{key}' must be a number")
+        if (filters.get("min_price") is not None and filters.get("max_price") is not None
+                and filters["min_price"] > filters["max_price"]):
+            raise ValueError("min_price cannot be greater than max_price")
@@ -0,0 +1,184 @@
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# A failed check: (path relative to the validated value, message).
+Failure = Tuple[str, str]
+
+_KINDS: Dict[str, Tuple[str, str]] = {
+    # kind: (type test on `v` that is True for a *wrong* type, description)
+    "string": ("type(v) is not str", "a string"),
+    "number": ("type(v) is not float and type(v) is not int", "a number"),
+    "list": ("type(v) is not list", "a list"),
+    "object": ("type(v) is not dict", "an object"),
+}
+
+
+class Field(NamedTuple):
+    """One key of an object schema."""
+    name: str
+    kind: str
+    required: bool = True
+    non_empty: bool = False
+    items: Optional["Schema"] = None  # for "list" fields, the schema of every element
+
+
+class Schema:
+    """
+    A declarative description of a JSON object: its known fields and their kinds.
+
+    Keys not listed are allowed. Compile a schema once with compile_schema and
+    reuse the resulting validator; the schema itself is never interpreted per value.
+    """
+
+    def __init__(self, name: str, fields: Sequence[Field]) -> None:
+        self.name: str = name
+        self.fields: Tuple[Field, ...] = tuple(fields)
+
+    def require(self, *names: str) -> "Schema":
+        """Return a copy of the schema in which the named fields are required."""
+        unknown = set(names) - {f.name for f in self.fields}
+        if unknown:
+            raise ValueError(f"Unknown fields for schema '{self.name}': {', '.join(sorted(unknown))}")
+        return Schema(self.name, [f._replace(required=True) if f.name in names else f for f in self.fields])
+
+
+class ValidationError(ValueError):
+    """Raised when data does not match a schema. `path` locates the offending value."""
+
+    def __init__(self, path: str, message: str) -> None:
+        super().__init__(f"{path}: {message}" if path else message)
+        self.path: str = path
+        self.message: str = message
+
+
+class Validator:
+    """
+    Specialized check functions generated from a Schema.
+
+    check(value) and check_many(values) return None when everything is valid,
+    which is the fast path; on failure they return where and why, and validate()
+    and validate_many() turn that into a ValidationError with a full path.
+    """
+
+    def __init__(self, schema: Schema, check: Callable[[Any], Optional[Failure]],
+                 check_many: Callable[..., Optional[Tuple[int, str, str]]], source: str) -> None:
+        self.schema = schema
+        self.check = check
+        self.check_many = check_many
+        self.source: str = source
+
+    def validate(self, value: Any, path: str = "") -> None:
+        """Raise ValidationError if `value` does not match the schema."""
+        failure = self.check(value)
+        if failure is not None:
+            raise ValidationError(_join(path, failure[0]), failure[1])
+
+    def validate_many(self, values: Sequence[Any], path: str = "") -> None:
+        """Raise ValidationError for the first element of `values` that does not match the schema."""
+        failure = self.check_many(values)
+        if failure is not None:
+            index, subpath, message = failure
+            raise ValidationError(_join(f"{path}[{index}]", subpath), message)
+
+    def errors(self, values: Sequence[Any], path: str = "", limit: Optional[int] = None) -> List[ValidationError]:
+        """Return a ValidationError for every invalid element of `values`, up to `limit`."""
+        found: List[ValidationError] = []
+        start = 0
+        while limit is None or len(found) < limit:
+            failure = self.check_many(values, start)
+            if failure is None:
+                break
+            index, subpath, message = failure
+            found.append(ValidationError(_join(f"{path}[{index}]", subpath), message))
+            start = index + 1
+        return found
+
+
+def _join(path: str, subpath: str) -> str:
+    if not subpath:
+        return path
+    return f"{path}{subpath}" if subpath.startswith("[") or not path else f"{path}.{subpath}"
+
+
+def _type_name(value: Any) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def compile_schema(schema: Schema, deep: bool = True) -> Validator:
+    """
+    Generate and compile validator functions for a schema.
+
+    Every field check is emitted as straight-line code with exact type tests, so
+    validating a value costs a few dictionary lookups and comparisons. The bulk
+    variant inlines the same checks into its loop to avoid a call per element.
+
+    Args:
+        schema (Schema): The schema to compile.
+        deep (bool): Also validate the elements of list fields that declare an item schema.
+            A shallow validator only checks that such fields are lists.
+
+    Returns:
+        Validator: The compiled validator.
+    """
+    namespace: Dict[str, Any] = {"_MISSING": _MISSING, "_type_name": _type_name, "_islice": islice}
+    body: List[str] = ["if type(value) is not dict:",
+                       "    return FAIL('', 'expected an object, got ' + _type_name(value))"]
+    for number, field in enumerate(schema.fields):
+        wrong_type, description = _KINDS[field.kind]
+        key = repr(field.name)
+        body.append(f"v = value.get({key}, _MISSING)")
+        if field.required:
+            body.append("if v is _MISSING:")
+            body.append(f"    return FAIL({key}, 'missing required field')")
+            body.append(f"if {wrong_type}:")
+            present = ""
+        else:
+            body.append(f"if v is not _MISSING and ({wrong_type}):")
+            present = "v is not _MISSING and "
+        body.append(f"    return FAIL({key}, 'expected {description}, got ' + _type_name(v))")
+        if field.non_empty:
+            test = "not v.strip()" if field.kind == "string" else "not v"
+            body.append(f"if {present}{test}:")
+            body.append(f"    return FAIL({key}, 'must not be empty')")
+        if field.items is not None and deep:
+            namespace[f"_check_items_{number}"] = compile_schema(field.items).check_many
+            body.append(f"failure = {present}_check_items_{number}(v)")
+            body.append("if failure:")
+            body.append(f"    return FAIL({key} + '[' + str(failure[0]) + ']' + "
+                        f"('.' + failure[1] if failure[1] else ''), failure[2])")
+
+    single = ["def check(value):"] + ["    " + line.replace("FAIL(", "(") for line in body] + ["    return None"]
+    many = (["def check_many(values, start=0):",
+             "    for index, value in enumerate(_islice(values, start, None) if start else values, start):"]
+            + ["        " + line.replace("FAIL(", "(index, ") for line in body] + ["    return None"])
+    source = "\n".join(single + [""] + many) + "\n"
+    exec(compile(source, f"<schema {schema.name}>", "exec"), namespace)
+    return Validator(schema, namespace["check"], namespace["check_many"], source)
+
+
+class _Missing:
+    def __repr__(self) -> str:
+        return "<missing>"
+
+
+_MISSING = _Missing()
+
+
+ITEM_SCHEMA = Schema("item", [
+    Field("name", "string", required=True),
+    Field("category", "string", required=False),
+    Field("price", "number", required=False),
+    Field("cover", "string", required=False),  # path of a cover image
+])
+
+COLLECTION_SCHEMA = Schema("collection", [
+    Field("name", "string", required=True, non_empty=True),
+    Field("items", "list", required=True, items=ITEM_SCHEMA),
+    Field("created_at", "string", required=False),
+    Field("last_modified", "string", required=False),
+])
+
+# Compiled once at import and shared by everything that validates library data.
+item_validator: Validator = compile_schema(ITEM_SCHEMA)
+collection_validator: Validator = compile_schema(COLLECTION_SCHEMA)
+shallow_collection_validator: Validator = compile_schema(COLLECTION_SCHEMA, deep=False)
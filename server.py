@@ -0,0 +1,386 @@
+"""
+Local HTTP/JSON API over the library, built on asyncio and the standard library.
+
+Lets several tools share one in-memory copy of the library instead of each
+parsing the library file on its own:
+
+    python server.py --port 8765
+
+Endpoints (all responses are JSON):
+
+    GET  /health
+    GET  /collections
+    GET  /collections/{name}/items?order_by=price&offset=0&limit=50&descending=false
+    GET  /search?q=potter&fuzzy=false&limit=20
+    POST /collections                 {"name": "Books"}
+    POST /collections/{name}/items    an item object, or {"items": [item, ...]} for a bulk add
+
+Connections are HTTP/1.1 keep-alive. Reads run concurrently on a thread
+pool; writes wait for in-flight reads to finish and run one at a time, so
+every read sees the library either before or after a write, never during it.
+Changes are autosaved to the library file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from logger import logger
+from paths import LIBRARY_FILENAME, get_user_data_dir
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    """Raised by endpoint handlers to answer with an error status."""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class _ReadWriteLock:
+    """An asyncio lock that admits many readers or one writer, preferring waiting writers."""
+
+    def __init__(self) -> None:
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    async def acquire_read(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+
+    async def release_read(self) -> None:
+        async with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    async def acquire_write(self) -> None:
+        async with self._condition:
+            self._waiting_writers += 1
+            await self._condition.wait_for(lambda: not self._writer and not self._readers)
+            self._waiting_writers -= 1
+            self._writer = True
+
+    async def release_write(self) -> None:
+        async with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class LibraryServer:
+    """
+    Serves Controller operations as JSON over HTTP/1.1.
+
+    Every Controller call runs on a thread pool so a slow search never stalls
+    the event loop. Responses are encoded inside the read or write section,
+    so no response is built from a half-applied write.
+    """
+
+    def __init__(self, controller: Any, host: str = "127.0.0.1", port: int = 8765,
+                 read_threads: Optional[int] = None) -> None:
+        """
+        Initialize the server without starting it.
+
+        Args:
+            controller (Controller): The controller holding the library.
+            host (str): Interface to listen on. Defaults to loopback only.
+            port (int): TCP port; 0 picks a free port, available as `port` after start().
+            read_threads (Optional[int]): Size of the thread pool running Controller calls.
+        """
+        self.controller = controller
+        self.host: str = host
+        self.port: int = port
+        self.requests_served: int = 0
+        self._executor = ThreadPoolExecutor(max_workers=read_threads or min(8, (os.cpu_count() or 1) + 2),
+                                            thread_name_prefix="library-api")
+        self._lock: Optional[_ReadWriteLock] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes: Dict[Tuple[str, str], Callable[..., Any]] = {
+            ("GET", "health"): self._health,
+            ("GET", "collections"): self._list_collections,
+            ("GET", "items"): self._list_items,
+            ("GET", "search"): self._search,
+            ("POST", "collections"): self._add_collection,
+            ("POST", "items"): self._add_items,
+        }
+
+    async def start(self) -> None:
+        """Start listening for connections."""
+        self._lock = _ReadWriteLock()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Library API listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        """Start the server if needed and serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting connections and release the thread pool."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=True)
+        logger.info(f"Library API stopped after {self.requests_served} requests")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one connection until the client closes it or asks to."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = self._keep_alive(version, headers)
+                writer.write(self._format_response(status, payload, keep_alive))
+                await writer.drain()
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            writer.write(self._format_response(e.status, self._error_body(e), False))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.exception(f"Unexpected error serving connection: {str(e)}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        """Read one request, or return None when the client closed the connection between requests."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(HTTPStatus.NOT_IMPLEMENTED, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    @staticmethod
+    def _keep_alive(version: str, headers: Dict[str, str]) -> bool:
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    @staticmethod
+    def _format_response(status: HTTPStatus, body: bytes, keep_alive: bool) -> bytes:
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + body
+
+    @staticmethod
+    def _error_body(error: HTTPError) -> bytes:
+        return json.dumps({"error": str(error)}).encode("utf-8")
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[HTTPStatus, bytes]:
+        """Route a request to its handler and run it under the read or write lock."""
+        try:
+            url = urlsplit(target)
+            segments = [unquote(segment) for segment in url.path.strip("/").split("/") if segment]
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if len(segments) == 3 and segments[0] == "collections" and segments[2] == "items":
+                route, args = "items", [segments[1]]
+            elif len(segments) == 1:
+                route, args = segments[0], []
+            else:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {url.path}")
+            handler = self._routes.get((method, route))
+            if handler is None:
+                if any(route == known for _, known in self._routes):
+                    raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {url.path}")
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {url.path}")
+            if method == "POST":
+                try:
+                    args.append(json.loads(body or b"null"))
+                except ValueError:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+            else:
+                args.append(query)
+            return await self._run(handler, method == "POST", *args)
+        except HTTPError as e:
+            return e.status, self._error_body(e)
+        except Exception as e:
+            logger.exception(f"Unexpected error handling {method} {target}: {str(e)}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({"error": "internal server error"}).encode("utf-8")
+
+    async def _run(self, handler: Callable[..., Any], write: bool, *args: Any) -> Tuple[HTTPStatus, bytes]:
+        """Run a handler on the thread pool and encode its result while still holding the lock."""
+        def call() -> Tuple[HTTPStatus, bytes]:
+            status, payload = handler(*args)
+            return status, json.dumps(payload, default=str).encode("utf-8")
+
+        acquire, release = ((self._lock.acquire_write, self._lock.release_write) if write
+                            else (self._lock.acquire_read, self._lock.release_read))
+        await acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            await release()
+
+    # Endpoint handlers run on the thread pool and return (status, JSON-serializable payload).
+
+    def _health(self, query: Dict[str, str]) -> Tuple[HTTPStatus, Any]:
+        health = {"ok": True, "requests_served": self.requests_served}
+        paging = self.controller.get_paging_stats()
+        if paging:
+            health["paging"] = paging
+        return HTTPStatus.OK, health
+
+    def _list_collections(self, query: Dict[str, str]) -> Tuple[HTTPStatus, Any]:
+        return HTTPStatus.OK, [
+            {"name": c["name"], "items": len(c["items"]),
+             "created_at": c.get("created_at"), "last_modified": c.get("last_modified")}
+            for c in self.controller.get_collections()
+        ]
+
+    def _list_items(self, name: str, query: Dict[str, str]) -> Tuple[HTTPStatus, Any]:
+        self._require_collection(name)
+        items = self.controller.get_items_in_collection(
+            name, query.get("order_by"), _int_param(query, "offset", 0),
+            _int_param(query, "limit", None), _bool_param(query, "descending"))
+        return HTTPStatus.OK, items
+
+    def _search(self, query: Dict[str, str]) -> Tuple[HTTPStatus, Any]:
+        term = query.get("q")
+        if not term:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing search term 'q'")
+        limit = _int_param(query, "limit", None)
+        if _bool_param(query, "fuzzy"):
+            results = self.controller.fuzzy_search(term, limit=10 if limit is None else limit)
+        else:
+            results = self.controller.search_items(term)
+            if limit is not None:
+                results = results[:limit]
+        return HTTPStatus.OK, {"count": len(results), "results": results}
+
+    def _add_collection(self, body: Any) -> Tuple[HTTPStatus, Any]:
+        if not isinstance(body, dict) or not isinstance(body.get("name"), str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected an object with a string 'name'")
+        if any(c["name"] == body["name"] for c in self.controller.get_collections()):
+            raise HTTPError(HTTPStatus.CONFLICT, f"Collection '{body['name']}' already exists")
+        if not self.controller.add_collection(body["name"]):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Could not add collection '{body['name']}'")
+        return HTTPStatus.CREATED, {"name": body["name"]}
+
+    def _add_items(self, name: str, body: Any) -> Tuple[HTTPStatus, Any]:
+        self._require_collection(name)
+        items = body.get("items") if isinstance(body, dict) and "items" in body else [body]
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected an item object or {\"items\": [objects]}")
+        added = sum(1 for item in items if self.controller.add_item(name, item))
+        return (HTTPStatus.CREATED if added else HTTPStatus.OK), {"added": added, "rejected": len(items) - added}
+
+    def _require_collection(self, name: str) -> None:
+        if not any(c["name"] == name for c in self.controller.get_collections()):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Collection '{name}' not found")
+
+
+def _int_param(query: Dict[str, str], name: str, default: Optional[int]) -> Optional[int]:
+    if name not in query:
+        return default
+    try:
+        value = int(query[name])
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer")
+    if value < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must not be negative")
+    return value
+
+
+def _bool_param(query: Dict[str, str], name: str) -> bool:
+    return query.get(name, "false").lower() in ("1", "true", "yes")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="user data directory; defaults to the GUI's")
+    parser.add_argument("--library", help=f"library file; defaults to {LIBRARY_FILENAME} in the data directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--threads", type=int, default=None, help="threads running library operations")
+    parser.add_argument("--no-autosave", action="store_true", help="keep changes in memory only")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="page least recently used collections out to disk beyond this many megabytes")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args(argv)
+    logger.logger.setLevel(args.log_level)
+
+    from controller import Controller
+    data_dir = os.path.abspath(args.data_dir) if args.data_dir else get_user_data_dir()
+    os.makedirs(data_dir, exist_ok=True)
+    library_file = os.path.abspath(args.library) if args.library else os.path.join(data_dir, LIBRARY_FILENAME)
+    budget = args.memory_budget * 1024 * 1024 if args.memory_budget is not None else None
+    controller = Controller(lambda: data_dir, memory_budget=budget)
+    try:
+        if os.path.exists(library_file) and not controller.load_from_file(library_file):
+            print(f"Could not load library file '{library_file}'; see the log for details", file=sys.stderr)
+            return 1
+        if not args.no_autosave:
+            controller.enable_autosave(library_file)
+        server = LibraryServer(controller, args.host, args.port, args.threads)
+
+        async def run() -> None:
+            await server.start()
+            print(f"Listening on http://{server.host}:{server.port}", flush=True)
+            try:
+                await server.serve_forever()
+            finally:
+                await server.stop()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+        return 0
+    finally:
+        controller.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
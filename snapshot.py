@@ -0,0 +1,376 @@
+import hashlib
+import json
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# File layout (all integers little-endian):
+#
+#   header            MAGIC, version u16, flags u16, collection count u32,
+#                     string table offset u64, collection index offset u64,
+#                     CRC-32 of everything after the header u32
+#   collection blocks one per collection, see _pack_collection
+#   string table      count u32, then per string: byte length u32 + UTF-8 bytes
+#   collection index  one u64 absolute offset per collection block
+#
+# Categories, collection names and timestamps are interned in the string table.
+# Item names are stored per collection as one NUL-joined UTF-8 column, prices as
+# a packed float64 column and categories as a uint32 column of string indices.
+MAGIC: bytes = b"TLIBSNAP"
+VERSION: int = 1
+SNAPSHOT_EXTENSION: str = ".tlsnap"
+
+_HEADER = struct.Struct("<8sHHIQQI")
+_COLLECTION_HEADER = struct.Struct("<IIII")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# Per-item flags.
+_HAS_NAME = 0x01
+_HAS_CATEGORY = 0x02
+_PRICE_FLOAT = 0x04
+_PRICE_INT = 0x08
+_RAW = 0x80  # the whole item lives in the extras document
+_PLAIN = _HAS_NAME | _HAS_CATEGORY | _PRICE_FLOAT
+
+# Packed collection blocks are kept in memory up to this size while writing, then spooled to disk.
+SPOOL_BYTES = 1 << 20
+
+_ITEM_FIELDS = ("name", "category", "price")
+_COLLECTION_FIELDS = ("name", "items", "created_at", "last_modified")
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is truncated, corrupt or of an unsupported version."""
+
+
+class SnapshotBlock(NamedTuple):
+    """One collection of a snapshot, located but not decoded."""
+    name: str
+    digest: bytes  # of the block and the strings it refers to; equal digests mean equal collections
+    decode: Callable[[], Dict[str, Any]]
+
+
+def is_snapshot(data: bytes) -> bool:
+    """Return True if the given leading bytes of a file start a snapshot."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode: str, data: memoryview) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+class _StringTable:
+    """Interns strings and assigns them compact indices."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def intern(self, value: str) -> int:
+        position = self.index.get(value)
+        if position is None:
+            position = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return position
+
+    def pack(self) -> bytes:
+        parts = [_U32.pack(len(self.strings))]
+        for value in self.strings:
+            encoded = value.encode("utf-8")
+            parts.append(_U32.pack(len(encoded)))
+            parts.append(encoded)
+        return b"".join(parts)
+
+
+def _is_plain_item(item: Any) -> bool:
+    return isinstance(item, dict) and not (
+        ("name" in item and (not isinstance(item["name"], str) or "\x00" in item["name"]))
+        or ("category" in item and not isinstance(item["category"], str))
+    )
+
+
+def _pack_collection(collection: Dict[str, Any], strings: _StringTable) -> bytes:
+    """
+    Pack one collection block:
+
+        name, created_at, last_modified string indices u32, item count u32
+        names column:      byte length u32 + NUL-joined UTF-8 names
+        categories column: item count x u32 string index
+        prices column:     item count x float64
+        flags column:      item count x u8
+        extras document:   byte length u32 + UTF-8 JSON (0 length if empty)
+    """
+    items = collection.get("items", [])
+    names: List[str] = []
+    categories = array("I")
+    prices = array("d")
+    flags = bytearray()
+    item_extras: Dict[str, Any] = {}
+    empty = strings.intern("")
+    for position, item in enumerate(items):
+        if not _is_plain_item(item):
+            names.append("")
+            categories.append(empty)
+            prices.append(0.0)
+            flags.append(_RAW)
+            item_extras[str(position)] = item
+            continue
+        flag = 0
+        if "name" in item:
+            flag |= _HAS_NAME
+        names.append(item.get("name", ""))
+        if "category" in item:
+            flag |= _HAS_CATEGORY
+            categories.append(strings.intern(item["category"]))
+        else:
+            categories.append(empty)
+        price = item.get("price")
+        rest = {k: v for k, v in item.items() if k not in _ITEM_FIELDS}
+        if isinstance(price, float):
+            flag |= _PRICE_FLOAT
+            prices.append(price)
+        elif isinstance(price, int) and not isinstance(price, bool) and abs(price) < 2 ** 53:
+            flag |= _PRICE_INT
+            prices.append(float(price))
+        else:
+            prices.append(0.0)
+            if "price" in item:
+                rest["price"] = price
+        if rest:
+            item_extras[str(position)] = rest
+        flags.append(flag)
+
+    collection_extras = {k: v for k, v in collection.items() if k not in _COLLECTION_FIELDS}
+    extras = {}
+    if item_extras:
+        extras["items"] = item_extras
+    if collection_extras:
+        extras["collection"] = collection_extras
+    extras_bytes = json.dumps(extras, separators=(",", ":")).encode("utf-8") if extras else b""
+    names_bytes = "\x00".join(names).encode("utf-8")
+    return b"".join((
+        _COLLECTION_HEADER.pack(
+            strings.intern(str(collection.get("name", ""))),
+            strings.intern(str(collection.get("created_at", ""))),
+            strings.intern(str(collection.get("last_modified", ""))),
+            len(items),
+        ),
+        _U32.pack(len(names_bytes)), names_bytes,
+        _little_endian(categories),
+        _little_endian(prices),
+        bytes(flags),
+        _U32.pack(len(extras_bytes)), extras_bytes,
+    ))
+
+
+def write_snapshot(collections: Iterable[Dict[str, Any]], stream: BinaryIO,
+                   digests: Optional[Dict[str, bytes]] = None) -> int:
+    """
+    Write collections to a binary stream as a snapshot.
+
+    Collections are packed one at a time as they are iterated, and the packed
+    blocks are spooled to a temporary file past SPOOL_BYTES until the header,
+    which records their offsets and checksum, can be written.
+
+    Args:
+        collections (Iterable[Dict[str, Any]]): The collections to write.
+        stream (BinaryIO): A writable binary stream.
+        digests (Optional[Dict[str, bytes]]): If given, filled with the digest of each collection
+            by name, as read_snapshot_blocks will compute it.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    strings = _StringTable()
+    offsets: List[int] = []
+    position = _HEADER.size
+    crc = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        for collection in collections:
+            block = _pack_collection(collection, strings)
+            if digests is not None:
+                view = memoryview(block)
+                digests[str(collection.get("name", ""))] = _block_digest(view, 0, len(block), strings.strings)
+            offsets.append(position)
+            spool.write(block)
+            crc = zlib.crc32(block, crc)
+            position += len(block)
+        string_table = strings.pack()
+        tail = string_table + b"".join(_U64.pack(offset) for offset in offsets)
+        header = _HEADER.pack(MAGIC, VERSION, 0, len(offsets), position,
+                              position + len(string_table), zlib.crc32(tail, crc))
+        stream.write(header)
+        spool.seek(0)
+        shutil.copyfileobj(spool, stream)
+        stream.write(tail)
+    return position + len(tail)
+
+
+def _read_string_table(data: memoryview, offset: int) -> List[str]:
+    (count,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    strings: List[str] = []
+    for _ in range(count):
+        (length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        strings.append(str(data[offset:offset + length], "utf-8"))
+        offset += length
+    return strings
+
+
+def _unpack_collection(data: memoryview, offset: int, strings: List[str]) -> Dict[str, Any]:
+    name, created_at, last_modified, count = _COLLECTION_HEADER.unpack_from(data, offset)
+    offset += _COLLECTION_HEADER.size
+    (names_length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    names = str(data[offset:offset + names_length], "utf-8").split("\x00") if count else []
+    offset += names_length
+    categories = _read_column("I", data[offset:offset + 4 * count])
+    offset += 4 * count
+    prices = _read_column("d", data[offset:offset + 8 * count])
+    offset += 8 * count
+    flags = data[offset:offset + count].tobytes()
+    offset += count
+    (extras_length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    extras = json.loads(str(data[offset:offset + extras_length], "utf-8")) if extras_length else {}
+    if len(names) != count:
+        raise SnapshotError(f"Collection '{strings[name]}' has {len(names)} names for {count} items")
+
+    if flags.count(_PLAIN) == count:
+        items = [{"name": n, "category": strings[c], "price": p} for n, c, p in zip(names, categories, prices)]
+    else:
+        items = []
+        for n, c, p, flag in zip(names, categories, prices, flags):
+            if flag & _RAW:
+                items.append(None)
+                continue
+            item: Dict[str, Any] = {}
+            if flag & _HAS_NAME:
+                item["name"] = n
+            if flag & _HAS_CATEGORY:
+                item["category"] = strings[c]
+            if flag & _PRICE_FLOAT:
+                item["price"] = p
+            elif flag & _PRICE_INT:
+                item["price"] = int(p)
+            items.append(item)
+    for position, value in extras.get("items", {}).items():
+        position = int(position)
+        if flags[position] & _RAW:
+            items[position] = value
+        else:
+            items[position].update(value)
+
+    collection = {"name": strings[name], "items": items,
+                  "created_at": strings[created_at], "last_modified": strings[last_modified]}
+    collection.update(extras.get("collection", {}))
+    return collection
+
+
+def read_snapshot(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Decode a snapshot into collections.
+
+    Args:
+        data (bytes): The complete snapshot file contents.
+
+    Returns:
+        List[Dict[str, Any]]: The decoded collections.
+
+    Raises:
+        SnapshotError: If the data is not a valid snapshot.
+    """
+    view, strings, offsets, _ = _open_snapshot(data)
+    try:
+        return [_unpack_collection(view, offset, strings) for offset in offsets]
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {str(e)}") from e
+
+
+def read_snapshot_blocks(data: bytes) -> List[SnapshotBlock]:
+    """
+    Locate and digest the collections of a snapshot without decoding them.
+
+    A block stores strings as indices into the shared string table, so its
+    digest covers the block bytes and the strings it uses. Comparing digests
+    from two reads of a file tells which collections changed, and only those
+    need decoding.
+
+    Args:
+        data (bytes): The complete snapshot file contents.
+
+    Returns:
+        List[SnapshotBlock]: One block per collection, in file order.
+
+    Raises:
+        SnapshotError: If the data is not a valid snapshot.
+    """
+    view, strings, offsets, strings_offset = _open_snapshot(data)
+    ends = sorted(offsets) + [strings_offset]
+    end_of = {offset: ends[i + 1] for i, offset in enumerate(ends[:-1])}
+    blocks: List[SnapshotBlock] = []
+    try:
+        for offset in offsets:
+            name = _COLLECTION_HEADER.unpack_from(view, offset)[0]
+            blocks.append(SnapshotBlock(strings[name], _block_digest(view, offset, end_of[offset], strings),
+                                        lambda offset=offset: _unpack_collection(view, offset, strings)))
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {str(e)}") from e
+    return blocks
+
+
+def _open_snapshot(data: bytes) -> Tuple[memoryview, List[str], List[int], int]:
+    """Check a snapshot's header and checksum; return a view, its strings, block offsets and the string table offset."""
+    if len(data) < _HEADER.size or not is_snapshot(data):
+        raise SnapshotError("Not a library snapshot")
+    magic, version, _, count, strings_offset, index_offset, checksum = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+    view = memoryview(data)
+    if zlib.crc32(view[_HEADER.size:]) != checksum:
+        raise SnapshotError("Snapshot checksum mismatch")
+    try:
+        strings = _read_string_table(view, strings_offset)
+        offsets = [_U64.unpack_from(view, index_offset + i * _U64.size)[0] for i in range(count)]
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {str(e)}") from e
+    return view, strings, offsets, strings_offset
+
+
+def _block_digest(data: memoryview, offset: int, end: int, strings: List[str]) -> bytes:
+    """Digest the collection block at data[offset:end] and the strings it uses."""
+    _, used = _block_strings(data, offset)
+    digest = hashlib.blake2b(data[offset:end], digest_size=16)
+    for index in sorted(used):
+        digest.update(_U32.pack(index))
+        digest.update(strings[index].encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+
+def _block_strings(data: memoryview, offset: int) -> Tuple[int, Set[int]]:
+    """Return the name index of a collection block and the indices of every string it uses."""
+    name, created_at, last_modified, count = _COLLECTION_HEADER.unpack_from(data, offset)
+    offset += _COLLECTION_HEADER.size
+    (names_length,) = _U32.unpack_from(data, offset)
+    offset += _U32.size + names_length
+    used = set(_read_column("I", data[offset:offset + 4 * count]))
+    used.update((name, created_at, last_modified))
+    return name, used
@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from logger import logger
+
+# Schedules a callback on the UI thread after a delay in milliseconds, like Tk's root.after.
+Scheduler = Callable[[int, Callable[[], None]], Any]
+
+# Frames from these files are plumbing, never the callback to blame for a stall.
+_PLUMBING = (os.sep + "tkinter" + os.sep, os.sep + "customtkinter" + os.sep, "logger.py", "stall_watchdog.py")
+
+
+class Stall(NamedTuple):
+    """One period during which the UI thread did not run its event loop."""
+    started_at: float  # wall-clock time the stall began
+    duration: float  # seconds the heartbeat was late
+    callback: str  # the function blamed for the stall, or "unknown" if no stack was captured
+    stack: str  # the UI thread's stack while it was blocked
+
+
+class StallWatchdog:
+    """
+    Detects when the UI thread stops servicing its event loop, and why.
+
+    A heartbeat is scheduled on the UI thread every `interval` seconds. A
+    monitor thread checks that the heartbeat keeps arriving; once it is more
+    than `threshold` seconds late, the monitor captures the UI thread's stack
+    and blames the first application frame below the toolkit's callback
+    dispatch. The stall is recorded, with its full duration, when the heartbeat
+    finally runs.
+    """
+
+    def __init__(self, schedule: Scheduler, threshold: float = 0.25, interval: float = 0.05,
+                 max_recorded: int = 50) -> None:
+        """
+        Initialize a watchdog without starting it.
+
+        Args:
+            schedule (Scheduler): Schedules a callback on the UI thread, e.g. root.after.
+            threshold (float): Seconds the event loop may be blocked before it counts as a stall.
+            interval (float): Seconds between heartbeats.
+            max_recorded (int): Number of most recent stalls kept with their stacks.
+        """
+        self.schedule: Scheduler = schedule
+        self.threshold: float = threshold
+        self.interval: float = interval
+        self.stalls: Deque[Stall] = deque(maxlen=max_recorded)
+        self.stall_count: int = 0
+        self.heartbeats: int = 0
+        self._by_callback: Dict[str, Dict[str, float]] = {}
+        self._thread_id: Optional[int] = None
+        self._expected: float = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching. Must be called on the UI thread."""
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._expected = time.monotonic() + self.interval
+        self.schedule(int(self.interval * 1000), self._beat)
+        self._monitor = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self._monitor.start()
+        logger.info(f"Stall watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop watching and log a summary of the stalls seen."""
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+        with self._lock:
+            if self._pending is not None:
+                # Still blocked when asked to stop; record the stall so far.
+                pending, self._pending = self._pending, None
+                late = time.monotonic() - self._expected
+                self._record(Stall(pending["started_at"], late, pending["callback"], pending["stack"]))
+        summary = self.summary()
+        logger.info(f"Stall watchdog: {summary['stalls']} stalls over {self.threshold * 1000:.0f}ms, "
+                    f"{summary['total_seconds']:.2f}s blocked in total, longest {summary['max_seconds']:.2f}s")
+        for callback, stats in summary["by_callback"].items():
+            logger.info(f"  {callback}: {stats['count']} stalls, {stats['total_seconds']:.2f}s total, "
+                        f"longest {stats['max_seconds']:.2f}s")
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Return stall statistics.
+
+        Returns:
+            Dict[str, Any]: "stalls", "total_seconds" and "max_seconds" overall, "heartbeats",
+                and the same figures per blamed callback under "by_callback", worst first.
+        """
+        with self._lock:
+            by_callback = {name: dict(stats) for name, stats in
+                           sorted(self._by_callback.items(), key=lambda entry: -entry[1]["total_seconds"])}
+        return {
+            "stalls": self.stall_count,
+            "total_seconds": sum(stats["total_seconds"] for stats in by_callback.values()),
+            "max_seconds": max((stats["max_seconds"] for stats in by_callback.values()), default=0.0),
+            "heartbeats": self.heartbeats,
+            "by_callback": by_callback,
+        }
+
+    def _beat(self) -> None:
+        """Runs on the UI thread: close any open stall and schedule the next heartbeat."""
+        now = time.monotonic()
+        late = now - self._expected
+        self.heartbeats += 1
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is not None or late > self.threshold:
+                if pending is None:
+                    # The monitor never got to run, e.g. a long C call held the GIL.
+                    pending = {"started_at": time.time() - late, "callback": "unknown", "stack": ""}
+                self._record(Stall(pending["started_at"], late, pending["callback"], pending["stack"]))
+            self._expected = now + self.interval
+        if self._stop.is_set():
+            return
+        try:
+            self.schedule(int(self.interval * 1000), self._beat)
+        except Exception as e:
+            logger.debug(f"Stall watchdog heartbeat stopped: {str(e)}")
+            self._stop.set()
+
+    def _watch(self) -> None:
+        """Runs on the monitor thread: capture the UI thread's stack when the heartbeat is late."""
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                late = time.monotonic() - self._expected
+                if late <= self.threshold or self._pending is not None:
+                    continue
+                frame = sys._current_frames().get(self._thread_id)
+                if frame is None:
+                    continue
+                summary = traceback.extract_stack(frame)
+                del frame
+                callback = _blame(summary)
+                self._pending = {"started_at": time.time() - late, "callback": callback,
+                                 "stack": "".join(summary.format())}
+            logger.warning(f"UI thread blocked for more than {self.threshold * 1000:.0f}ms in {callback}")
+
+    def _record(self, stall: Stall) -> None:
+        """Add a finished stall to the statistics. Called with the lock held."""
+        self.stalls.append(stall)
+        self.stall_count += 1
+        stats = self._by_callback.setdefault(stall.callback, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["total_seconds"] += stall.duration
+        stats["max_seconds"] = max(stats["max_seconds"], stall.duration)
+        logger.warning(f"UI thread stalled for {stall.duration * 1000:.0f}ms in {stall.callback}"
+                       + (f"\n{stall.stack}" if stall.stack else ""))
+
+
+def _blame(stack: traceback.StackSummary) -> str:
+    """
+    Name the callback responsible for a blocked stack.
+
+    That is the first application frame after the innermost toolkit frame that
+    dispatched into Python, or the innermost application frame if the stack
+    shows no toolkit dispatch.
+    """
+    frames: List[traceback.FrameSummary] = list(stack)
+    dispatch = max((i for i, f in enumerate(frames) if _is_plumbing(f.filename) and f.name in ("__call__", "callit")),
+                   default=None)
+    if dispatch is not None:
+        candidates = [f for f in frames[dispatch + 1:] if not _is_plumbing(f.filename)]
+        if candidates:
+            return _describe(candidates[0])
+    application = [f for f in frames if not _is_plumbing(f.filename)]
+    return _describe(application[-1]) if application else "unknown"
+
+
+def _is_plumbing(filename: str) -> bool:
+    return any(part in filename for part in _PLUMBING)
+
+
+def _describe(frame: traceback.FrameSummary) -> str:
+    return f"{frame.name} ({os.path.basename(frame.filename)}:{frame.lineno})"
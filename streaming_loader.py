@@ -0,0 +1,231 @@
+import codecs
+import hashlib
+import json
+import mmap
+import os
+from typing import Any, Callable, Container, Dict, Iterator, Optional, Tuple
+
+# Called with (bytes read, total bytes, collections loaded so far).
+ProgressCallback = Callable[[int, int, int], None]
+
+_WHITESPACE = " \t\n\r"
+
+# How an object in a top-level array starts and ends in JSON written with indent=2.
+_ELEMENT_START = '{\n    "'
+_ELEMENT_END = "\n  }"
+
+
+def iter_collections(read: Callable[[int], bytes], total_bytes: int = 0,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally decode a top-level JSON array of collections.
+
+    Only the text of the collection currently being decoded is held in memory:
+    bytes are pulled from `read` in chunks, decoded to text incrementally, and
+    each array element is parsed with JSONDecoder.raw_decode as soon as it is
+    complete. Consumed text is dropped before the next element is read.
+
+    Args:
+        read (Callable[[int], bytes]): Returns up to n bytes, or b"" at end of input.
+        total_bytes (int): Total input size, reported to the progress callback.
+        progress_callback (Optional[ProgressCallback]): Called after every collection.
+        chunk_size (int): Number of bytes to read at a time.
+
+    Yields:
+        Dict[str, Any]: One collection at a time, in file order.
+
+    Raises:
+        json.JSONDecodeError: If the input is not valid JSON.
+        ValueError: If the input is not an array of objects.
+    """
+    for collection, _ in _iter_elements(read, total_bytes, progress_callback, chunk_size, None):
+        yield collection
+
+
+def iter_collection_digests(read: Callable[[int], bytes], known: Container[bytes] = frozenset(),
+                            chunk_size: int = 1 << 20) -> Iterator[Tuple[Optional[Dict[str, Any]], bytes]]:
+    """
+    Incrementally decode a top-level JSON array of collections like iter_collections,
+    pairing each collection with the text_digest() of its JSON text.
+
+    Two collections written alike have the same digest, so comparing digests from
+    two reads of a file tells which collections were rewritten in between. A
+    collection whose digest is in `known` is not decoded: in files indented like
+    CollectionManager writes them, its text is found by searching for its closing
+    brace and digested as is. Other collections are decoded and validated as JSON.
+
+    Args:
+        read (Callable[[int], bytes]): Returns up to n bytes, or b"" at end of input.
+        known (Container[bytes]): Digests of collection texts that need not be decoded.
+            They must be digests of complete JSON objects, such as earlier results.
+        chunk_size (int): Number of bytes to read at a time.
+
+    Yields:
+        Tuple[Optional[Dict[str, Any]], bytes]: A collection, or None if its digest is known,
+            and the digest of its text.
+    """
+    yield from _iter_elements(read, 0, None, chunk_size, known)
+
+
+def text_digest(text: str) -> bytes:
+    """Return the 16-byte BLAKE2b digest of a collection's JSON text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _iter_elements(read: Callable[[int], bytes], total_bytes: int,
+                   progress_callback: Optional[ProgressCallback], chunk_size: int,
+                   known: Optional[Container[bytes]]) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[bytes]]]:
+    """
+    Decode the array for iter_collections and iter_collection_digests. Elements are yielded
+    with their digest if `known` is given, and as None without decoding if it holds the digest.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    bytes_read = 0
+    eof = False
+    loaded = 0
+
+    def fill(minimum: int) -> bool:
+        """Append at least `minimum` more bytes of text to the buffer; False at end of input."""
+        nonlocal buffer, bytes_read, eof
+        if eof:
+            return False
+        data = read(max(minimum, chunk_size))
+        bytes_read += len(data)
+        if not data:
+            eof = True
+            buffer += text_decoder.decode(b"", final=True)
+            return False
+        buffer += text_decoder.decode(data)
+        return True
+
+    def next_token() -> str:
+        """Skip whitespace and return the next character without consuming it, or "" at the end."""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill(chunk_size):
+                return ""
+
+    def error(message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, buffer, position)
+
+    first = next_token()
+    if first == "":
+        raise error("Expecting value")
+    if first != "[":
+        raise ValueError("Loaded data is not a list")
+    position += 1
+
+    expect_element = True
+    expected_size = 0
+    while True:
+        token = next_token()
+        if token == "]":
+            if expect_element and loaded:
+                raise error("Expecting value")
+            position += 1
+            break
+        if not expect_element:
+            if token != ",":
+                raise error("Expecting ',' delimiter")
+            position += 1
+            expect_element = True
+            continue
+        if token == "":
+            raise error("Unterminated array")
+        if token != "{":
+            raise ValueError("Not all items in loaded data are dictionaries")
+
+        # Collections tend to be of similar size, so buffer a little more text than the
+        # previous one took before the first attempt; a failed attempt re-parses the element.
+        while len(buffer) - position < expected_size and fill(expected_size - (len(buffer) - position)):
+            pass
+        collection = digest = None
+        if known and buffer.startswith(_ELEMENT_START, position):
+            # With indent=2 each element ends at the first "}" indented by two spaces, as
+            # strings cannot hold raw newlines. A known digest proves the guess right: it
+            # is that of a complete object, which the element then must be.
+            end = buffer.find(_ELEMENT_END, position)
+            while end < 0:
+                searched = len(buffer) - len(_ELEMENT_END) + 1
+                if not fill(len(buffer) - position):
+                    break
+                end = buffer.find(_ELEMENT_END, max(position, searched))
+            if end >= 0:
+                end += len(_ELEMENT_END)
+                digest = text_digest(buffer[position:end])
+                if digest not in known:
+                    digest = None
+        if digest is None:
+            while True:
+                try:
+                    collection, end = decoder.raw_decode(buffer, position)
+                    break
+                except json.JSONDecodeError:
+                    # The element is probably incomplete: read at least as much again as is
+                    # buffered so repeated attempts stay linear overall.
+                    if not fill(len(buffer) - position):
+                        raise
+            if known is not None:
+                digest = text_digest(buffer[position:end])
+
+        expected_size = (end - position) * 9 // 8
+        buffer = buffer[end:]
+        position = 0
+        loaded += 1
+        expect_element = False
+        if progress_callback is not None:
+            progress_callback(bytes_read, total_bytes, loaded)
+        yield collection, digest
+
+    if next_token() != "":
+        raise error("Extra data")
+    if progress_callback is not None:
+        progress_callback(bytes_read, total_bytes, loaded)
+
+
+def iter_collections_from_file(filename: str, progress_callback: Optional[ProgressCallback] = None,
+                               chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally decode the collections of a JSON library file through a memory map.
+
+    The map is read sequentially, so the kernel can drop pages behind the reader
+    and the file never has to be copied into one large string.
+
+    Args:
+        filename (str): Path to the JSON library file.
+        progress_callback (Optional[ProgressCallback]): Called after every collection.
+        chunk_size (int): Number of bytes to read at a time.
+
+    Yields:
+        Dict[str, Any]: One collection at a time, in file order.
+    """
+    total = os.path.getsize(filename)
+    with open(filename, "rb") as f:
+        if total == 0:
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            can_advise = hasattr(mapped, "madvise")
+            if can_advise and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            released = 0
+
+            def read(size: int) -> bytes:
+                # Pages already copied out of the map are handed back to the kernel so
+                # they stop counting towards this process's resident set.
+                nonlocal released
+                data = mapped.read(size)
+                done = mapped.tell() // mmap.PAGESIZE * mmap.PAGESIZE
+                if can_advise and hasattr(mmap, "MADV_DONTNEED") and done > released:
+                    mapped.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
+                return data
+
+            yield from iter_collections(read, total, progress_callback, chunk_size)
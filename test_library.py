@@ -1,7 +1,42 @@
 import unittest
+from unittest import mock
 from model import CollectionManager
+from parallel_search import ShardedSearchPool
+from streaming_loader import iter_collections
+from autosave import AutosaveService
+import cli
+from server import LibraryServer
+from schema import ValidationError, collection_validator, item_validator
+from data_manager import DataManager
+from exporters import ExportJob, iter_export_rows, read_columnar, write_columnar
+from controller import Controller
+from paging import PagedItems, iter_materialized
+from stall_watchdog import StallWatchdog
+from multi_match import AhoCorasick
+from transaction import TransactionError
+from file_watcher import LibraryWatcher
+import snapshot as snapshot_module
+from access_stats import ACCESS_STATS_FILENAME, MAX_QUERIES, AccessStats
+from benchmarks.synthetic import CATEGORIES, generate_library, install, zipf_weights
+from benchmarks.suite import compare_results
+from benchmarks.bench_parallel_search import build_manager
+from profiler import PROFILE_ENV, OperationProfiler
+try:
+    from PIL import Image
+    from image_cache import ImageCache
+except ImportError:  # Pillow is only needed by the GUI
+    Image = None
 import os
+import io
+import csv
+import gzip
+import asyncio
+import contextlib
 import json
+import pstats
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
 from logger import logger
 
@@ -172,5 +207,1361 @@ class TestCollectionManager(unittest.TestCase):
         self.assertIsInstance(categories, list)
         self.assertTrue(all(isinstance(category, str) for category in categories))
 
+class TestParallelSearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name, parallel_search_threshold=4, search_workers=2)
+        self.manager.add_collection("Books")
+        self.manager.add_collection("Movies")
+        for name in ["Dune", "Harry Potter", "Emma"]:
+            self.manager.add_item("Books", {"name": name, "category": "Book", "price": 10.0})
+        for name in ["Alien", "Heat", "Dune"]:
+            self.manager.add_item("Movies", {"name": name, "category": "Movie", "price": 5.0})
+
+    def tearDown(self):
+        self.manager.close()
+        self.temp_dir.cleanup()
+
+    def test_pool_merges_results_in_library_order(self):
+        pool = ShardedSearchPool(workers=3)
+        try:
+            pool.load(self.manager.collections)
+            self.assertEqual(pool.search("a"), [(0, 1), (0, 2), (1, 0), (1, 1)])
+            self.assertEqual(pool.search("dune"), [(0, 0), (1, 2)])
+        finally:
+            pool.close()
+
+    def test_parallel_search_matches_serial_search(self):
+        serial = CollectionManager(lambda: self.temp_dir.name, parallel_search_threshold=None)
+        serial.collections = self.manager.collections
+        for term in ["dune", "MOVIE", "a", "zzz"]:
+            self.assertEqual(self.manager.search_items(term), serial.search_items(term))
+        self.assertIsNotNone(self.manager._search_pool)
+
+    def test_pool_receives_updates_and_deletes_in_place(self):
+        for name in ["Brazil", "Up", "Jaws", "Big"]:
+            self.manager.add_item("Movies", {"name": name, "category": "Movie", "price": 5.0})
+        self.assertEqual(len(self.manager.search_items("dune")), 2)
+        ids = self.manager.item_ids("Books")
+        self.assertTrue(self.manager.update_item(ids[0], {"name": "Dune Messiah"}))
+        self.assertTrue(self.manager.delete_item(self.manager.item_ids("Movies")[2]))
+        self.assertEqual([item["name"] for item in self.manager.search_items("dune")], ["Dune Messiah"])
+        self.assertEqual([item["name"] for item in self.manager.search_items("emma")], ["Emma"])
+
+    @mock.patch("model.COMPACT_MIN", 0)
+    def test_pool_follows_compaction(self):
+        self.assertEqual(len(self.manager.search_items("dune")), 2)
+        self.assertTrue(self.manager.delete_item(self.manager.item_ids("Books")[0]))
+        self.assertEqual(len(self.manager.collections[0]["items"]), 2)
+        self.assertTrue(self.manager.add_item("Books", {"name": "Dune Messiah", "category": "Book", "price": 12.0}))
+        self.assertEqual([item["name"] for item in self.manager.search_items("e")],
+                         ["Harry Potter", "Emma", "Dune Messiah", "Alien", "Heat", "Dune"])
+
+    def test_pool_receives_incremental_adds(self):
+        self.assertEqual(len(self.manager.search_items("dune")), 2)
+        self.manager.add_item("Books", {"name": "Dune Messiah", "category": "Book", "price": 12.0})
+        self.assertEqual([item["name"] for item in self.manager.search_items("dune")], ["Dune", "Dune Messiah", "Dune"])
+
+class TestFuzzySearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Books")
+        for name in ["Harry Potter", "Harry Potter and the Goblet of Fire", "Pottery Basics", "Dune"]:
+            self.manager.add_item("Books", {"name": name, "category": "Book", "price": 10.0})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_typos_are_tolerated_and_ranked(self):
+        results = self.manager.fuzzy_search("Hary Poter", limit=2)
+        self.assertEqual([item["name"] for item in results], ["Harry Potter", "Harry Potter and the Goblet of Fire"])
+
+    def test_index_is_updated_on_add_item(self):
+        self.assertEqual(self.manager.fuzzy_search("Neuromancer"), [])
+        self.manager.add_item("Books", {"name": "Neuromancer", "category": "Book", "price": 8.0})
+        self.assertEqual(self.manager.fuzzy_search("Neuromancr")[0]["name"], "Neuromancer")
+
+    def test_invalid_limit(self):
+        self.assertEqual(self.manager.fuzzy_search("Dune", limit=0), [])
+
+class TestSortedIndexes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Books")
+        self.manager.add_collection("Movies")
+        for name, price in [("dune", 9.5), ("Emma", 4.0), ("Anna Karenina", 12.0)]:
+            self.manager.add_item("Books", {"name": name, "category": "Book", "price": price})
+        self.manager.add_item("Movies", {"name": "Heat", "category": "Movie", "price": 7.0})
+        self.manager.add_item("Movies", {"name": "Alien", "category": "Movie"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def names(self, items):
+        return [item["name"] for item in items]
+
+    def test_ordered_and_paginated_reads(self):
+        self.assertEqual(self.names(self.manager.get_items_in_collection("Books", order_by="price")),
+                         ["Emma", "dune", "Anna Karenina"])
+        self.assertEqual(self.names(self.manager.get_items_in_collection("Books", order_by="name", offset=1, limit=1)),
+                         ["dune"])
+        self.assertEqual(self.names(self.manager.get_items_in_collection("Books", order_by="price", descending=True, limit=2)),
+                         ["Anna Karenina", "dune"])
+        self.assertEqual(self.names(self.manager.get_items_in_collection("Movies", order_by="price")), ["Heat", "Alien"])
+        self.assertEqual(self.manager.get_items_in_collection("Books", order_by="colour"), [])
+
+    def test_price_range_queries(self):
+        self.assertEqual(self.names(self.manager.get_items_in_price_range(5, 10)), ["Heat", "dune"])
+        self.assertEqual(self.manager.count_items_in_price_range(), 4)
+        self.assertEqual(self.names(self.manager.get_items_in_price_range(min_price=5, collection_name="Books")),
+                         ["dune", "Anna Karenina"])
+        self.assertEqual(self.manager.get_items_in_price_range(10, 5), [])
+
+    def test_indexes_follow_add_item(self):
+        self.manager.get_items_in_price_range()
+        self.manager.add_item("Books", {"name": "Beloved", "category": "Book", "price": 5.0})
+        self.assertEqual(self.names(self.manager.get_items_in_price_range(4, 6)), ["Emma", "Beloved"])
+        self.assertEqual(self.names(self.manager.get_items_in_collection("Books", order_by="name", limit=2)),
+                         ["Anna Karenina", "Beloved"])
+
+class TestQueryPlanner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Shelf")
+        for i in range(40):
+            self.manager.add_item("Shelf", {"name": f"Title {i}", "category": "Book", "price": float(i)})
+        self.manager.add_item("Shelf", {"name": "Potter Box Set", "category": "Game", "price": 30.0})
+        self.manager.add_item("Shelf", {"name": "Harry Potter", "category": "Book", "price": 12.0})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_most_selective_path_drives_the_scan(self):
+        plan = self.manager.plan_query({"category": "book", "min_price": 10, "max_price": 12})
+        self.assertEqual(plan.chosen.kind, "price")
+        plan = self.manager.plan_query({"category": "game", "max_price": 35})
+        self.assertEqual(plan.chosen.kind, "category")
+        plan = self.manager.plan_query({"name_contains": "potter", "max_price": 35})
+        self.assertEqual(plan.chosen.kind, "name")
+        self.assertIn("Drive: name trigrams", plan.explain())
+        self.assertIn("Rejected: price index range", plan.explain())
+
+    def test_query_verifies_every_predicate(self):
+        results = self.manager.query({"category": "Book", "name_contains": "potter", "min_price": 5})
+        self.assertEqual([item["name"] for item in results], ["Harry Potter"])
+        results = self.manager.query({"category": "book", "min_price": 10, "max_price": 12}, limit=2)
+        self.assertEqual([item["name"] for item in results], ["Title 10", "Title 11"])
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.manager.query({"colour": "red"}), [])
+        self.assertEqual(self.manager.query({"collection": "Missing"}), [])
+        self.assertEqual(self.manager.query({"min_price": 5, "max_price": 1}), [])
+
+class TestAutocomplete(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Harry's Shelf")
+        self.manager.add_collection("Shelf 1")
+        self.manager.add_collection("Shelf 2")
+        for name in ["Harry Potter", "Hamlet", "Heat"]:
+            self.manager.add_item("Shelf 1", {"name": name, "category": "Book", "price": 1.0})
+        self.manager.add_item("Shelf 2", {"name": "Harry Potter", "category": "Book", "price": 1.0})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_completions_ranked_by_frequency_then_recency(self):
+        self.assertEqual(self.manager.suggest("ha"), ["Harry Potter", "Hamlet", "Harry's Shelf"])
+        self.assertEqual(self.manager.suggest("HARRY P", limit=1), ["Harry Potter"])
+        self.assertEqual(self.manager.suggest("zz"), [])
+
+    def test_index_maintained_on_insert(self):
+        self.assertEqual(self.manager.suggest("he"), ["Heat"])
+        self.manager.add_item("Shelf 2", {"name": "Hedda Gabler", "category": "Book", "price": 2.0})
+        self.manager.add_collection("Hermits")
+        self.assertEqual(self.manager.suggest("he"), ["Hermits", "Hedda Gabler", "Heat"])
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Books")
+        self.manager.add_collection("Empty")
+        self.manager.add_item("Books", {"name": "Dune", "category": "Book", "price": 9.99})
+        self.manager.add_item("Books", {"name": "Émile", "category": "Book", "price": 3, "isbn": "123"})
+        self.manager.add_item("Books", {"name": "No price", "category": "Book"})
+        self.manager.add_item("Books", {"name": 42, "category": None, "price": "free"})
+        self.manager.collections[0]["owner"] = "me"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_round_trip_with_format_detection(self):
+        self.assertTrue(self.manager.save_to_file(self.path("library.tlsnap")))
+        with open(self.path("library.tlsnap"), "rb") as f:
+            self.assertEqual(f.read(8), b"TLIBSNAP")
+        loaded = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(loaded.load_from_file(self.path("library.tlsnap")))
+        self.assertEqual(loaded.collections, self.manager.collections)
+
+        self.assertTrue(self.manager.save_to_file(self.path("library.json"), file_format="snapshot"))
+        self.assertTrue(loaded.load_from_file(self.path("library.json")))
+        self.assertEqual(loaded.collections, self.manager.collections)
+
+    def test_corrupt_snapshot_is_rejected(self):
+        self.manager.save_to_file(self.path("library.tlsnap"))
+        with open(self.path("library.tlsnap"), "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"xyz")
+        loaded = CollectionManager(lambda: self.temp_dir.name)
+        self.assertFalse(loaded.load_from_file(self.path("library.tlsnap")))
+        self.assertEqual(loaded.collections, [])
+
+class TestStreamingLoader(unittest.TestCase):
+    def read_all(self, text, chunk_size=7):
+        stream = io.BytesIO(text.encode("utf-8"))
+        return list(iter_collections(stream.read, chunk_size=chunk_size))
+
+    def test_collections_decoded_across_chunk_boundaries(self):
+        collections = [{"name": "Émile ]", "items": [{"name": "x" * 50, "price": 1.5}]}, {"name": "B", "items": []}]
+        self.assertEqual(self.read_all(json.dumps(collections, indent=2)), collections)
+        self.assertEqual(self.read_all(" [ ] "), [])
+
+    def test_invalid_documents(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.read_all('[{"name": "A"},]')
+        with self.assertRaises(json.JSONDecodeError):
+            self.read_all('[{"name": "A"}')
+        with self.assertRaises(ValueError):
+            self.read_all('{"name": "A"}')
+        with self.assertRaises(ValueError):
+            self.read_all('[{"name": "A"}, 3]')
+
+    def test_load_from_file_reports_progress(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = CollectionManager(lambda: temp_dir)
+            for name in ["A", "B", "C"]:
+                manager.add_collection(name)
+                manager.add_item(name, {"name": f"{name} item", "category": "Book", "price": 1.0})
+            path = os.path.join(temp_dir, "library_data.json")
+            manager.save_to_file(path)
+            progress = []
+            loaded = CollectionManager(lambda: temp_dir)
+            self.assertTrue(loaded.load_from_file(path, lambda done, total, count: progress.append((done, total, count))))
+            self.assertEqual(loaded.collections, manager.collections)
+            self.assertEqual([count for _, _, count in progress], [1, 2, 3, 3])
+            self.assertEqual(progress[-1][0], os.path.getsize(path))
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name, compression_level=1)
+        self.manager.add_collection("Books")
+        for i in range(50):
+            self.manager.add_item("Books", {"name": f"Book {i}", "category": "Book", "price": float(i)})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_codecs_round_trip_and_are_detected_by_magic_bytes(self):
+        for filename, magic in [("a.json.gz", b"\x1f\x8b"), ("a.json.bz2", b"BZh"), ("a.tlsnap.xz", b"\xfd7zXZ")]:
+            self.assertTrue(self.manager.save_to_file(self.path(filename)))
+            with open(self.path(filename), "rb") as f:
+                self.assertTrue(f.read().startswith(magic))
+            renamed = self.path(filename + ".data")
+            os.replace(self.path(filename), renamed)
+            loaded = CollectionManager(lambda: self.temp_dir.name)
+            progress = []
+            self.assertTrue(loaded.load_from_file(renamed, lambda done, total, count: progress.append((done, total))))
+            self.assertEqual(loaded.collections, self.manager.collections)
+            self.assertEqual(progress[-1], (os.path.getsize(renamed), os.path.getsize(renamed)))
+
+    def test_explicit_codec_and_invalid_settings(self):
+        self.assertTrue(self.manager.save_to_file(self.path("plain.json"), compression="gzip", compression_level=9))
+        with open(self.path("plain.json"), "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+        self.assertFalse(self.manager.save_to_file(self.path("bad.json"), compression="zip"))
+        self.assertFalse(self.manager.save_to_file(self.path("bad.json"), compression="bz2", compression_level=0))
+
+class TestAutosave(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, "library.json")
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Books")
+        self.saved = threading.Event()
+        self.states = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def on_status(self, state, details):
+        self.states.append(state)
+        if state == "saved":
+            self.saved.set()
+
+    def test_burst_of_changes_is_coalesced_into_one_save(self):
+        service = AutosaveService(self.manager, self.filename, delay=0.2, status_callback=self.on_status)
+        service.start()
+        for i in range(20):
+            self.manager.add_item("Books", {"name": f"Book {i}", "category": "Book", "price": float(i)})
+        self.manager.add_collection("Movies")
+        self.assertEqual(service.dirty_collections, {"Books", "Movies"})
+        self.assertTrue(self.saved.wait(5))
+        service.stop()
+        self.assertEqual(service.save_count, 1)
+        self.assertEqual(self.states, ["dirty", "saving", "saved"])
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f), self.manager.collections)
+
+    def test_stop_flushes_pending_changes(self):
+        service = AutosaveService(self.manager, self.filename, delay=60)
+        service.start()
+        self.manager.add_item("Books", {"name": "Dune", "category": "Book", "price": 9.0})
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(service.stop())
+        self.assertEqual(service.dirty_collections, set())
+        loaded = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(loaded.load_from_file(self.filename))
+        self.assertEqual(loaded.collections, self.manager.collections)
+
+    def test_failed_save_keeps_collections_dirty(self):
+        service = AutosaveService(self.manager, os.path.join(self.temp_dir.name, "missing", "library.json"),
+                                  delay=60, status_callback=self.on_status)
+        service.start()
+        self.manager.add_item("Books", {"name": "Dune", "category": "Book", "price": 9.0})
+        self.assertFalse(service.flush())
+        self.assertEqual(service.dirty_collections, {"Books"})
+        self.assertEqual(self.states[-1], "error")
+        service.stop(flush=False)
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "source.json")
+        book = {"name": "Dune", "category": "Book", "price": 9.5}
+        with open(self.source, "w") as f:
+            json.dump([{"name": "Books", "items": [book, dict(book), {"name": "Emma", "category": "Book", "price": 4.0}]}], f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_cli(self, *args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = cli.main(["--data-dir", self.temp_dir.name, *args])
+        return status, json.loads(output.getvalue())
+
+    def test_import_search_and_stats(self):
+        status, result = self.run_cli("import", self.source)
+        self.assertEqual((status, result["total"]), (0, {"collections": 1, "items": 3}))
+        status, result = self.run_cli("search", "emma")
+        self.assertEqual((status, result["count"]), (0, 1))
+        status, result = self.run_cli("stats")
+        self.assertEqual(result["per_collection"], {"Books": 3})
+        self.assertEqual(result["format"], {"format": "json", "compression": "none"})
+
+    def test_verify_and_compact_keep_format(self):
+        self.run_cli("import", self.source)
+        status, result = self.run_cli("verify")
+        self.assertEqual((status, result["problem_count"]), (1, 1))
+        status, result = self.run_cli("compact", "--compression", "gzip")
+        self.assertEqual((status, result["duplicates_removed"]), (0, 1))
+        status, result = self.run_cli("compact")
+        self.assertEqual(result["duplicates_removed"], 0)
+        status, result = self.run_cli("stats")
+        self.assertEqual((result["items"], result["format"]["compression"]), (2, "gzip"))
+        self.assertEqual(self.run_cli("verify")[0], 0)
+
+    def test_failures_are_reported_as_json(self):
+        status, result = self.run_cli("export", os.path.join(self.temp_dir.name, "out.json"))
+        self.assertEqual(status, 1)
+        self.assertFalse(result["ok"])
+        self.assertIn("does not exist", result["error"])
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.controller = Controller(lambda: self.temp_dir.name)
+
+    def tearDown(self):
+        self.controller.close()
+        self.temp_dir.cleanup()
+
+    def exchange(self, requests):
+        """Send (method, path, body) requests over one keep-alive connection and return (status, json) pairs."""
+        async def run():
+            server = LibraryServer(self.controller, port=0)
+            await server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            responses = []
+            for method, path, body in requests:
+                data = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+                writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+                head = (await reader.readuntil(b"\r\n\r\n")).decode().split("\r\n")
+                length = int(next(line.split(":")[1] for line in head if line.startswith("Content-Length")))
+                responses.append((int(head[0].split(" ")[1]), json.loads(await reader.readexactly(length))))
+            writer.close()
+            await server.stop()
+            return responses
+        return asyncio.run(run())
+
+    def test_reads_and_writes_over_one_connection(self):
+        responses = self.exchange([
+            ("POST", "/collections", {"name": "My Books"}),
+            ("POST", "/collections/My%20Books/items", {"items": [{"name": "Dune", "category": "Book", "price": 9.0},
+                                                                 {"name": "Emma", "category": "Book", "price": 4.0}]}),
+            ("POST", "/collections/My%20Books/items", {"name": "Dune", "category": "Book", "price": 9.0}),
+            ("GET", "/collections/My%20Books/items?order_by=price&limit=1", None),
+            ("GET", "/search?q=dune", None),
+            ("GET", "/collections", None),
+        ])
+        self.assertEqual([status for status, _ in responses], [201, 201, 200, 200, 200, 200])
+        self.assertEqual(responses[1][1], {"added": 2, "rejected": 0})
+        self.assertEqual(responses[2][1], {"added": 0, "rejected": 1})
+        self.assertEqual(responses[3][1], [{"name": "Emma", "category": "Book", "price": 4.0}])
+        self.assertEqual(responses[4][1]["count"], 1)
+        self.assertEqual(responses[5][1][0]["items"], 2)
+
+    def test_errors_keep_the_connection_usable(self):
+        responses = self.exchange([
+            ("GET", "/collections/Missing/items", None),
+            ("POST", "/collections", b"{not json"),
+            ("DELETE", "/collections", None),
+            ("GET", "/search?q=x&limit=-1", None),
+            ("POST", "/collections", {"name": "Books"}),
+            ("POST", "/collections", {"name": "Books"}),
+            ("GET", "/health", None),
+        ])
+        self.assertEqual([status for status, _ in responses], [404, 400, 405, 400, 201, 409, 200])
+        self.assertIn("error", responses[0][1])
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Books")
+        self.manager.add_collection("Movies")
+        for i in range(30):
+            self.manager.add_item("Books", {"name": f"Book {i}", "category": "Book", "price": float(i)})
+        self.manager.add_item("Movies", {"name": "Alien, \"Director's Cut\"", "category": "Movie", "price": 7.5, "year": 1979})
+        self.manager.add_item("Movies", {"name": "Untitled", "category": "Movie"})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_csv_and_jsonl_with_filters(self):
+        self.assertTrue(ExportJob(self.manager, self.path("movies.csv.gz"), category="movie").run())
+        with gzip.open(self.path("movies.csv.gz"), "rt", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["collection", "name", "category", "price"])
+        self.assertEqual(rows[1], ["Movies", "Alien, \"Director's Cut\"", "Movie", "7.5"])
+        self.assertEqual(rows[2], ["Movies", "Untitled", "Movie", ""])
+        job = ExportJob(self.manager, self.path("books.jsonl"), collection="Books", search="book 2")
+        self.assertTrue(job.run())
+        with open(self.path("books.jsonl")) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["name"] for line in lines], ["Book 2"] + [f"Book {i}" for i in range(20, 30)])
+        self.assertEqual(job.rows_written, 11)
+
+    def test_columnar_round_trip_in_chunks(self):
+        job = ExportJob(self.manager, self.path("all.tlcols"))
+        job.run()
+        with open(self.path("all.tlcols"), "rb") as f:
+            chunks = list(read_columnar(f))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(len(chunks[0]["name"]), 32)
+        self.assertEqual(chunks[0]["price"][-2:], [7.5, None])
+        stream = io.BytesIO()
+        write_columnar(iter_export_rows(self.manager.collections), stream, lambda: None, chunk_rows=10)
+        stream.seek(0)
+        self.assertEqual([len(chunk["name"]) for chunk in read_columnar(stream)], [10, 10, 10, 2])
+
+    def test_background_export_reports_progress(self):
+        progress = []
+        job = ExportJob(self.manager, self.path("items.csv"), progress_callback=lambda done, total: progress.append((done, total)),
+                        progress_interval=10)
+        job.start()
+        self.assertTrue(job.wait(10))
+        self.assertEqual(progress, [(10, 32), (20, 32), (30, 32), (32, 32)])
+        self.assertGreater(job.rows_per_second, 0)
+        with self.assertRaises(ValueError):
+            ExportJob(self.manager, self.path("items.xlsx"))
+
+    def test_paged_out_collections_are_exported_without_faulting_them_in(self):
+        manager = CollectionManager(lambda: self.temp_dir.name, memory_budget=20000)
+        try:
+            for c in range(4):
+                manager.add_collection(f"Shelf {c}")
+                for i in range(100):
+                    manager.add_item(f"Shelf {c}", {"name": f"Item {c}-{i}", "category": "Book", "price": float(i)})
+            self.assertTrue(manager.delete_item(manager.item_ids("Shelf 3")[0]))
+            before = manager.paging_stats()
+            self.assertGreater(before["paged_collections"], 0)
+            self.assertTrue(ExportJob(manager, self.path("shelves.jsonl")).run())
+            with open(self.path("shelves.jsonl")) as f:
+                names = [json.loads(line)["name"] for line in f]
+            self.assertEqual(names, [f"Item {c}-{i}" for c in range(4) for i in range(100) if (c, i) != (3, 0)])
+            self.assertEqual(manager.paging_stats()["faults"], before["faults"])
+        finally:
+            manager.close()
+
+class TestSchemaValidation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, "library.json")
+        self.data = [
+            {"name": "Books", "items": [{"name": "Dune", "category": "Book", "price": 9.5}]},
+            {"name": "Movies", "items": [{"name": "Heat", "category": "Movie", "price": 7.0},
+                                         {"name": "Alien", "category": "Movie", "price": "cheap"}]},
+        ]
+        with open(self.filename, "w") as f:
+            json.dump(self.data, f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_errors_name_the_offending_value(self):
+        with self.assertRaises(ValidationError) as raised:
+            collection_validator.validate_many(self.data, "collections")
+        self.assertEqual(str(raised.exception), "collections[1].items[1].price: expected a number, got str")
+        errors = item_validator.errors([{"name": 1}, {"category": "Book"}, "x", {"name": "ok", "price": True}], "items")
+        self.assertEqual([str(e) for e in errors], [
+            "items[0].name: expected a string, got int",
+            "items[1].name: missing required field",
+            "items[2]: expected an object, got str",
+            "items[3].price: expected a number, got bool",
+        ])
+
+    def test_eager_and_deferred_loading(self):
+        manager = CollectionManager(lambda: self.temp_dir.name)
+        self.assertFalse(manager.load_from_file(self.filename))
+        deferred = CollectionManager(lambda: self.temp_dir.name, defer_validation=True)
+        self.assertTrue(deferred.load_from_file(self.filename))
+        self.assertEqual(deferred.get_items_in_collection("Books"), self.data[0]["items"])
+        self.assertEqual(deferred.get_items_in_collection("Movies"), [])
+        self.assertEqual(deferred.search_items("dune"), [])
+        self.assertFalse(deferred.add_item("Movies", {"name": "Ran", "category": "Movie", "price": 5.0}))
+
+    def test_collections_are_validated_as_they_stream_in(self):
+        consumed = []
+        def stream():
+            for index, collection in enumerate(self.data + [{"name": "Late", "items": []}]):
+                consumed.append(index)
+                yield collection
+        with self.assertRaises(ValidationError) as raised:
+            CollectionManager(lambda: self.temp_dir.name)._validated(stream())
+        self.assertEqual(str(raised.exception), "collections[1].items[1].price: expected a number, got str")
+        self.assertEqual(consumed, [0, 1])
+        with open(self.filename, "w") as f:
+            f.write('[{"name": 1, "items": []}, {"name": "Truncated", "items": [')
+        with self.assertLogs(logger.logger, "ERROR") as logs:
+            self.assertFalse(CollectionManager(lambda: self.temp_dir.name).load_from_file(self.filename))
+        self.assertIn("collections[0].name: expected a string, got int", logs.output[0])
+
+    def test_incoming_items_are_validated(self):
+        manager = CollectionManager(lambda: self.temp_dir.name)
+        manager.add_collection("Books")
+        self.assertFalse(manager.add_item("Books", {"category": "Book"}))
+        self.assertFalse(manager.add_item("Books", {"name": "Dune", "price": "9"}))
+        self.assertTrue(manager.add_item("Books", {"name": "Dune", "price": 9, "year": 1965}))
+        legacy = DataManager()
+        legacy.add_collection("Books")
+        self.assertFalse(legacy.add_item("Books", {"name": "Dune", "category": "Book"}))
+        self.assertTrue(legacy.add_item("Books", {"name": "Dune", "category": "Book", "price": 9.0}))
+
+class TestPaging(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name, memory_budget=40000)
+        for c in range(5):
+            self.manager.add_collection(f"Shelf {c}")
+            for i in range(100):
+                self.assertTrue(self.manager.add_item(f"Shelf {c}", {"name": f"Item {c}-{i}", "category": "Book", "price": float(i)}))
+
+    def tearDown(self):
+        self.manager.close()
+        self.temp_dir.cleanup()
+
+    def test_cold_collections_are_paged_out_and_faulted_in(self):
+        stats = self.manager.paging_stats()
+        self.assertGreater(stats["evictions"], 0)
+        self.assertGreater(stats["paged_collections"], 0)
+        self.assertLessEqual(stats["resident_bytes"], stats["budget_bytes"])
+        self.assertIsInstance(self.manager.collections[0]["items"], PagedItems)
+        self.assertEqual(len(self.manager.collections[0]["items"]), 100)
+
+        items = self.manager.get_items_in_collection("Shelf 0")
+        self.assertIsInstance(items, list)
+        self.assertEqual(items[5], {"name": "Item 0-5", "category": "Book", "price": 5.0})
+        self.assertEqual(self.manager.paging_stats()["faults"], 1)
+        self.assertTrue(self.manager.add_item("Shelf 1", {"name": "Extra", "category": "Book", "price": 1.0}))
+        self.assertEqual(len(self.manager.get_items_in_collection("Shelf 1")), 101)
+
+    def test_searches_and_saves_see_paged_out_items(self):
+        self.assertEqual(len(self.manager.search_items("item 0-")), 100)
+        self.assertEqual(self.manager.get_items_in_price_range(99, 99), [
+            {"name": f"Item {c}-99", "category": "Book", "price": 99.0} for c in range(5)])
+        self.assertEqual(self.manager.fuzzy_search("Item 2-42", limit=1)[0]["name"], "Item 2-42")
+        self.assertEqual(self.manager.paging_stats()["faults"], 0)
+
+        filename = os.path.join(self.temp_dir.name, "library.json")
+        self.assertTrue(self.manager.save_to_file(filename))
+        loaded = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(loaded.load_from_file(filename))
+        self.assertEqual([len(c["items"]) for c in loaded.collections], [100] * 5)
+        self.assertEqual(loaded.paging_stats(), {})
+
+    def test_snapshot_reads_paged_out_collections_after_they_change(self):
+        with self.manager.snapshot() as view:
+            self.assertIsInstance(view[0]["items"], PagedItems)
+            self.assertTrue(self.manager.add_item("Shelf 0", {"name": "Late", "category": "Book", "price": 1.0}))
+            self.assertTrue(self.manager.delete_item(self.manager.item_ids("Shelf 1")[0]))
+            for _ in range(3):
+                self.manager.get_items_in_collection(f"Shelf {_ + 2}")
+            self.assertTrue(self.manager._pager._orphans)
+            self.assertEqual([len(c["items"]) for c in iter_materialized(view)], [100] * 5)
+        self.assertEqual(self.manager._pager._orphans, set())
+        self.assertEqual([len(c["items"]) for c in self.manager.snapshot_collections()], [101, 99, 100, 100, 100])
+
+    def test_saves_read_paged_out_collections_without_faulting_them_in(self):
+        before = self.manager.paging_stats()
+        for filename in ["library.json", "library.tlsnap"]:
+            path = os.path.join(self.temp_dir.name, filename)
+            self.assertTrue(self.manager.save_to_file(path))
+            loaded = CollectionManager(lambda: self.temp_dir.name)
+            self.assertTrue(loaded.load_from_file(path))
+            self.assertEqual(loaded.collections, self.manager.snapshot_collections())
+        stats = self.manager.paging_stats()
+        self.assertEqual(stats["faults"], before["faults"])
+        self.assertLessEqual(stats["resident_bytes"], stats["budget_bytes"])
+
+class TestMerkleDiff(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.here = CollectionManager(lambda: self.temp_dir.name)
+        self.there = CollectionManager(lambda: self.temp_dir.name)
+        for manager in (self.here, self.there):
+            manager.add_collection("Books")
+            for i in range(300):
+                manager.add_item("Books", {"name": f"Book {i}", "category": "Book", "price": float(i)})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_root_hash_tracks_content_not_order(self):
+        self.assertEqual(self.here.root_hash(), self.there.root_hash())
+        self.there.add_item("Books", {"price": 1.0, "name": "Extra", "category": "Book"})
+        changed = self.there.root_hash()
+        self.assertNotEqual(self.here.root_hash(), changed)
+        self.here.add_item("Books", {"name": "Extra", "category": "Book", "price": 1.0})
+        self.assertEqual(self.here.root_hash(), changed)
+        filename = os.path.join(self.temp_dir.name, "library.json")
+        self.assertTrue(self.here.save_to_file(filename))
+        reloaded = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(reloaded.load_from_file(filename))
+        self.assertEqual(reloaded.root_hash(), changed)
+
+    def test_diff_walks_mismatches_and_merge_converges(self):
+        self.here.add_item("Books", {"name": "Only here", "category": "Book", "price": 2.0})
+        self.there.add_item("Books", {"name": "Only there", "category": "Book", "price": 3.0})
+        self.there.add_collection("Games")
+        delta = self.here.diff(self.there)
+        self.assertEqual(delta, {"collections": [{"name": "Books", "items": [
+            {"name": "Only here", "category": "Book", "price": 2.0}]}], "item_count": 1})
+        mismatched = sum(a != b for a, b in zip(self.here.bucket_hashes("Books"), self.there.bucket_hashes("Books")))
+        self.assertIn(mismatched, (1, 2))
+        self.assertEqual(self.here.apply_delta(self.there.diff(self.here)), {"collections": 1, "items": 1})
+        self.assertEqual(self.there.apply_delta(delta), {"collections": 0, "items": 1})
+        self.assertEqual(self.here.root_hash(), self.there.root_hash())
+        self.assertEqual(self.here.diff(self.there), {"collections": [], "item_count": 0})
+
+    def test_cli_diff_and_merge(self):
+        other = os.path.join(self.temp_dir.name, "other.json")
+        self.there.add_item("Books", {"name": "Only there", "category": "Book", "price": 3.0})
+        self.there.save_to_file(other)
+        self.here.save_to_file(os.path.join(self.temp_dir.name, "library_data.json"))
+        run = lambda *args: cli.main(["--data-dir", self.temp_dir.name, *args])
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(run("diff", other, "--summary"), 1)
+        result = json.loads(output.getvalue())
+        self.assertEqual((result["only_here"], result["only_there"]),
+                         ({"collections": 0, "items": 0}, {"collections": 1, "items": 1}))
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(run("import", other, "--merge"), 0)
+        self.assertEqual(json.loads(output.getvalue())["added"], {"collections": 0, "items": 1})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(run("diff", other), 0)
+
+class TestStallWatchdog(unittest.TestCase):
+    """Drives the watchdog with a minimal event loop standing in for Tk's."""
+
+    def setUp(self):
+        self.timers = []
+
+    def schedule(self, delay_ms, callback):
+        self.timers.append((time.monotonic() + delay_ms / 1000, callback))
+
+    def run_loop(self, seconds, work=None):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            due = [timer for timer in self.timers if timer[0] <= time.monotonic()]
+            for timer in due:
+                self.timers.remove(timer)
+                timer[1]()
+            if work is not None:
+                work()
+                work = None
+            time.sleep(0.005)
+
+    def test_stall_is_captured_with_stack_and_blamed_callback(self):
+        def slow_callback():
+            time.sleep(0.4)
+
+        watchdog = StallWatchdog(self.schedule, threshold=0.15, interval=0.02)
+        watchdog.start()
+        self.run_loop(0.1)
+        self.run_loop(0.6, work=slow_callback)
+        summary = watchdog.stop()
+        self.assertEqual(summary["stalls"], 1)
+        stall = watchdog.stalls[0]
+        self.assertTrue(stall.callback.startswith("slow_callback (test_library.py:"), stall.callback)
+        self.assertIn("time.sleep(0.4)", stall.stack)
+        self.assertGreaterEqual(stall.duration, 0.3)
+        self.assertEqual(list(summary["by_callback"]), [stall.callback])
+
+    def test_responsive_loop_records_nothing(self):
+        watchdog = StallWatchdog(self.schedule, threshold=0.15, interval=0.02)
+        watchdog.start()
+        self.run_loop(0.3)
+        summary = watchdog.stop()
+        self.assertEqual((summary["stalls"], summary["max_seconds"]), (0, 0.0))
+        self.assertGreater(summary["heartbeats"], 5)
+
+@unittest.skipUnless(Image, "Pillow is not installed")
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "cover.jpg")
+        Image.new("RGB", (640, 480), (200, 30, 30)).save(self.source)
+        self.cache_dir = os.path.join(self.temp_dir.name, "thumbnails")
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        self.temp_dir.cleanup()
+
+    def make_cache(self):
+        cache = ImageCache(self.cache_dir, lambda image: ("wrapped", image.size, threading.get_ident()))
+        self.caches.append(cache)
+        return cache
+
+    def wait_for(self, cache, ready):
+        deadline = time.monotonic() + 10
+        while not ready and time.monotonic() < deadline:
+            cache.deliver()
+            time.sleep(0.01)
+
+    def test_decodes_in_background_and_caches_in_memory(self):
+        cache = self.make_cache()
+        ready = []
+        self.assertIsNone(cache.get(self.source, (48, 48), ready.append))
+        self.assertIsNone(cache.get(self.source, (48, 48), ready.append))
+        self.wait_for(cache, ready)
+        self.assertEqual(ready, [("wrapped", (48, 36), threading.get_ident())] * 2)
+        self.assertIs(cache.get(self.source, (48, 48)), ready[0])
+        self.assertEqual(cache.stats()["decodes"], 1)
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_disk_cache_is_keyed_by_source_mtime_and_size(self):
+        ready = []
+        self.make_cache().get(self.source, (48, 48), ready.append)
+        self.wait_for(self.caches[0], ready)
+        second = self.make_cache()
+        self.assertEqual(second.load(self.source, (48, 48))[1], (48, 36))
+        self.assertEqual((second.stats()["disk_hits"], second.stats()["decodes"]), (1, 0))
+        Image.new("RGB", (100, 400)).save(self.source)
+        os.utime(self.source, ns=(0, 10 ** 9))
+        self.assertEqual(second.load(self.source, (48, 48))[1], (12, 48))
+        self.assertEqual(second.stats()["decodes"], 1)
+        self.assertIsNone(second.load(os.path.join(self.temp_dir.name, "missing.png"), (48, 48)))
+
+class TestWantListMatching(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Shelf")
+        for name, category in [("The Hobbit", "Book"), ("Hobbit Extended", "Movie"), ("Dune", "Book"), ("Heat", "Movie")]:
+            self.manager.add_item("Shelf", {"name": name, "category": category, "price": 1.0})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_automaton_finds_overlapping_patterns(self):
+        automaton = AhoCorasick()
+        for pattern in ["he", "she", "his", "hers", "e"]:
+            automaton.add(pattern)
+        automaton.build()
+        self.assertEqual(automaton.search("ushers"), {0, 1, 3, 4})
+        self.assertEqual(automaton.search("xyz"), set())
+        with self.assertRaises(ValueError):
+            automaton.add("late")
+
+    def test_matches_agree_with_search_items(self):
+        terms = ["hobbit", "HOBBIT", "movie", "dun", "  ", "Zelda", "e"]
+        matches = self.manager.match_terms(iter(terms))
+        self.assertEqual(list(matches), ["hobbit", "movie", "dun", "Zelda", "e"])
+        for term, items in matches.items():
+            self.assertEqual(items, self.manager.search_items(term))
+        self.assertEqual(matches["Zelda"], [])
+
+    def test_want_list_is_streamed_from_a_compressed_file(self):
+        wants = os.path.join(self.temp_dir.name, "wants.txt.gz")
+        with gzip.open(wants, "wt", encoding="utf-8") as f:
+            f.write("the hobbit\nHeat\nUlysses\n")
+        self.manager.save_to_file(os.path.join(self.temp_dir.name, "library_data.json"))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = cli.main(["--data-dir", self.temp_dir.name, "match", wants, "--items"])
+        result = json.loads(output.getvalue())
+        self.assertEqual((status, result["terms"], result["matched_terms"]), (0, 3, 2))
+        self.assertEqual(result["hits"], {"the hobbit": 1, "Heat": 1, "Ulysses": 0})
+        self.assertEqual(result["items"]["Heat"][0]["name"], "Heat")
+
+class TestTransactions(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.controller = Controller(lambda: self.temp_dir.name)
+        self.controller.add_collection("Books")
+        self.controller.add_item("Books", {"name": "Dune", "category": "Book", "price": 9.5})
+        self.changes = []
+        self.controller.collection_manager.add_change_listener(self.changes.append)
+
+    def tearDown(self):
+        self.controller.close()
+        self.temp_dir.cleanup()
+
+    def test_commit_applies_everything_and_announces_once(self):
+        with self.controller.transaction() as txn:
+            txn.add_collection("Comics")
+            for i in range(50):
+                txn.add_item("Comics", {"name": f"Issue {i}", "category": "Book", "price": 3.0})
+            txn.add_item("Books", {"name": "Emma", "category": "Book", "price": 4.0})
+            self.assertEqual(self.controller.get_collections()[-1]["name"], "Books")
+        self.assertEqual(txn.result, {"collections": 1, "items": 51})
+        self.assertEqual(len(self.controller.get_items_in_collection("Comics")), 50)
+        self.assertEqual(len(self.controller.search_items("issue")), 50)
+        self.assertEqual(sorted(self.changes), ["Books", "Comics"])
+
+    def test_invalid_operation_rolls_back_the_whole_batch(self):
+        before = json.dumps(self.controller.collection_manager.snapshot_collections())
+        for bad in [{"category": "Book"}, {"name": "Dune", "category": "Book", "price": 9.5}]:
+            with self.assertRaises(TransactionError):
+                with self.controller.transaction() as txn:
+                    txn.add_collection("Comics")
+                    txn.add_item("Comics", {"name": "Issue 1", "category": "Book", "price": 3.0})
+                    txn.add_item("Books", bad)
+        with self.assertRaises(RuntimeError):
+            with self.controller.transaction() as txn:
+                txn.add_collection("Comics")
+                raise RuntimeError("caller failed")
+        self.assertEqual(json.dumps(self.controller.collection_manager.snapshot_collections()), before)
+        self.assertEqual(self.changes, [])
+
+    def test_failure_while_applying_restores_state(self):
+        manager = self.controller.collection_manager
+        manager.search_items("dune")
+        manager._ensure_fuzzy_index()
+        original = manager._item_added
+        def failing(collection_index, item_index, item):
+            if item["name"] == "Boom":
+                raise RuntimeError("index failure")
+            original(collection_index, item_index, item)
+        manager._item_added = failing
+        with self.assertRaises(RuntimeError):
+            manager.apply_batch([("add_collection", "Comics"), ("add_item", "Books", {"name": "Emma", "price": 1.0}),
+                                 ("add_item", "Books", {"name": "Boom", "price": 1.0})])
+        manager._item_added = original
+        self.assertEqual([c["name"] for c in manager.collections], ["Books"])
+        self.assertEqual(len(manager.collections[0]["items"]), 1)
+        self.assertEqual(manager.fuzzy_search("Emma"), [])
+
+class TestItemIds(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.controller = Controller(lambda: self.temp_dir.name)
+        self.manager = self.controller.collection_manager
+        for name in ["Books", "Movies"]:
+            self.controller.add_collection(name)
+            for i in range(10):
+                self.controller.add_item(name, {"name": f"{name} {i}", "category": "Book", "price": float(i)})
+
+    def tearDown(self):
+        self.controller.close()
+        self.temp_dir.cleanup()
+
+    def test_update_and_delete_keep_ids_and_order(self):
+        ids = self.controller.get_item_ids("Books")
+        self.assertEqual(len(set(ids + self.controller.get_item_ids("Movies"))), 20)
+        root = self.manager.root_hash()
+        self.assertTrue(self.controller.update_item(ids[3], {"price": 99.0}))
+        self.assertEqual(self.manager.get_item(ids[3]), {"name": "Books 3", "category": "Book", "price": 99.0})
+        self.assertFalse(self.controller.update_item(ids[3], {"price": "cheap"}))
+        self.assertTrue(self.controller.delete_item(ids[5]))
+        self.assertFalse(self.controller.delete_item(ids[5]))
+        self.assertIsNone(self.manager.get_item(ids[5]))
+        self.assertEqual(len(self.controller.search_items("books")), 9)
+        self.assertEqual(self.controller.get_items_in_price_range(90, 100), [self.manager.get_item(ids[3])])
+        names = [item["name"] for item in self.controller.get_items_in_collection("Books")]
+        self.assertEqual(names, [f"Books {i}" for i in range(10) if i != 5])
+        self.assertEqual(self.controller.get_item_ids("Books"), ids[:5] + ids[6:])
+        self.assertTrue(self.controller.delete_item(ids[6]))
+        self.assertEqual(self.manager.get_item(ids[7])["name"], "Books 7")
+        self.assertTrue(self.controller.update_item(ids[3], {"price": 3.0}))
+        self.assertTrue(self.controller.add_item("Books", {"name": "Books 5", "category": "Book", "price": 5.0}))
+        self.assertTrue(self.controller.add_item("Books", {"name": "Books 6", "category": "Book", "price": 6.0}))
+        self.assertEqual(self.manager.root_hash(), root)
+
+    def test_update_and_delete_maintain_built_indexes(self):
+        ids = self.controller.get_item_ids("Books")
+        self.manager.fuzzy_search("books")
+        self.manager.suggest("boo")
+        self.manager.faceted_search("books")
+        self.manager.get_items_in_collection("Books", order_by="price")
+        built = (self.manager._fuzzy_index, self.manager._prefix_index, self.manager._category_index,
+                 self.manager._sorted_indexes)
+        self.assertTrue(self.controller.update_item(ids[2], {"name": "Dune", "category": "Movie", "price": 50.0}))
+        self.assertTrue(self.controller.delete_item(ids[4]))
+        self.assertEqual((self.manager._fuzzy_index, self.manager._prefix_index, self.manager._category_index,
+                          self.manager._sorted_indexes), built)
+        self.assertEqual([item["name"] for item in self.manager.fuzzy_search("dune", limit=1)], ["Dune"])
+        self.assertEqual(self.manager.suggest("dun"), ["Dune"])
+        self.assertEqual(self.manager.faceted_search("books")["facets"], {"Book": 8})
+        self.assertEqual(self.manager.faceted_search("", category="movie")["total"], 1)
+        prices = [item["price"] for item in self.manager.get_items_in_collection("Books", order_by="price")]
+        self.assertEqual(prices, [0.0, 1.0, 3.0, 5.0, 6.0, 7.0, 8.0, 9.0, 50.0])
+        self.assertEqual(self.manager.get_items_in_price_range(40, 60), [self.manager.get_item(ids[2])])
+
+    def test_reads_skip_deleted_slots_without_compacting(self):
+        ids = self.controller.get_item_ids("Books")
+        self.manager.fuzzy_search("books")
+        self.assertTrue(self.controller.delete_item(ids[1]))
+        expected = [f"Books {i}" for i in range(10) if i != 1]
+        self.assertEqual([item["name"] for item in self.manager.get_items_in_collection("Books")], expected)
+        self.assertEqual([item["name"] for item in self.manager.get_items_in_collection("Books", offset=1, limit=2)],
+                         expected[1:3])
+        self.assertEqual([item["name"] for item in self.manager.get_items_in_collection("Books", descending=True,
+                                                                                        limit=2)],
+                         expected[:-3:-1])
+        self.assertEqual([item["name"] for item in self.manager.get_collections()[0]["items"]], expected)
+        self.assertIs(self.manager.get_collections()[1], self.manager.collections[1])
+        self.assertEqual(self.controller.get_item_ids("Books"), ids[:1] + ids[2:])
+        self.assertEqual(len(self.manager.collections[0]["items"]), 10)
+        self.assertIsNotNone(self.manager._fuzzy_index)
+
+    def test_small_collections_are_not_compacted_on_every_delete(self):
+        ids = self.controller.get_item_ids("Movies")
+        for item_id in ids[:3]:
+            self.assertTrue(self.controller.delete_item(item_id))
+        self.assertEqual(len(self.manager.collections[1]["items"]), 10)
+        self.assertEqual(self.controller.get_item_ids("Movies"), ids[3:])
+
+    @mock.patch("model.COMPACT_MIN", 0)
+    def test_compaction_renumbers_built_indexes_in_place(self):
+        ids = self.controller.get_item_ids("Books")
+        self.manager.fuzzy_search("books")
+        self.manager.faceted_search("books")
+        self.manager.get_items_in_collection("Books", order_by="price")
+        built = (self.manager._fuzzy_index, self.manager._category_index, self.manager._sorted_indexes)
+        for item_id in ids[:3]:
+            self.assertTrue(self.controller.delete_item(item_id))
+        self.assertEqual(len(self.manager.collections[0]["items"]), 7)
+        self.assertEqual((self.manager._fuzzy_index, self.manager._category_index, self.manager._sorted_indexes),
+                         built)
+        self.assertEqual([item["name"] for item in self.manager.fuzzy_search("books 4", limit=1)], ["Books 4"])
+        self.assertEqual(self.manager.faceted_search("books")["total"], 7)
+        prices = [item["price"] for item in self.manager.get_items_in_collection("Books", order_by="price",
+                                                                                 descending=True, limit=2)]
+        self.assertEqual(prices, [9.0, 8.0])
+        self.assertEqual([item["name"] for item in self.manager.get_items_in_price_range(3, 4)],
+                         ["Books 3", "Movies 3", "Books 4", "Movies 4"])
+        self.assertTrue(self.controller.update_item(ids[9], {"name": "Last"}))
+        self.assertEqual([item["name"] for item in self.manager.fuzzy_search("last", limit=1)], ["Last"])
+
+    @mock.patch("model.COMPACT_MIN", 0)
+    def test_compaction_preserves_order_and_ids(self):
+        ids = self.controller.get_item_ids("Movies")
+        for item_id in ids[:3]:
+            self.assertTrue(self.controller.delete_item(item_id))
+        self.assertEqual(len(self.manager.collections[1]["items"]), 7)
+        self.assertEqual([self.manager.get_item(i)["name"] for i in ids[3:]], [f"Movies {i}" for i in range(3, 10)])
+        self.assertEqual(self.controller.get_item_ids("Movies"), ids[3:])
+
+    def test_ids_survive_save_and_load(self):
+        ids = self.controller.get_item_ids("Books")
+        self.controller.delete_item(ids[0])
+        self.controller.add_item("Books", {"name": "Late", "category": "Book", "price": 1.0})
+        for filename in ["library.json", "library.tlsnap"]:
+            path = os.path.join(self.temp_dir.name, filename)
+            self.assertTrue(self.controller.save_to_file(path))
+            other = CollectionManager(lambda: self.temp_dir.name)
+            self.assertTrue(other.load_from_file(path))
+            self.assertEqual(other.item_ids("Books"), self.controller.get_item_ids("Books"))
+            self.assertEqual(other.item_ids("Movies"), self.controller.get_item_ids("Movies"))
+            self.assertNotIn("item_ids", other.collections[0])
+            self.assertEqual(other.collections, self.manager.get_collections())
+            self.assertTrue(other.add_item("Movies", {"name": "New", "category": "Movie"}))
+            self.assertNotIn(other.item_ids("Movies")[-1], ids + self.controller.get_item_ids("Movies"))
+
+    def test_released_ids_are_not_reused_after_reload(self):
+        last = self.controller.get_item_ids("Movies")[-1]
+        self.assertTrue(self.controller.delete_item(last))
+        for filename in ["library.json", "library.tlsnap"]:
+            path = os.path.join(self.temp_dir.name, filename)
+            self.assertTrue(self.controller.save_to_file(path))
+            other = CollectionManager(lambda: self.temp_dir.name)
+            self.assertTrue(other.load_from_file(path))
+            self.assertNotIn("next_item_id", other.collections[0])
+            self.assertTrue(other.add_item("Movies", {"name": "New", "category": "Movie"}))
+            self.assertEqual(other.item_ids("Movies")[-1], last + 1)
+            other.close()
+
+class TestLibraryWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, "library.json")
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        for name in ["Books", "Movies", "Music"]:
+            self.manager.add_collection(name)
+            self.manager.add_item(name, {"name": f"{name} 1", "category": "Book", "price": 1.0})
+        self.assertTrue(self.manager.save_to_file(self.filename))
+        self.changes = []
+        self.watcher = LibraryWatcher(self.manager, self.filename, settle=0, on_change=self.changes.append)
+
+    def tearDown(self):
+        self.manager.close()
+        self.temp_dir.cleanup()
+
+    def rewrite(self, edit, filename=None):
+        """Change the file the way another program would, through a second manager."""
+        filename = filename or self.filename
+        other = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(other.load_from_file(filename))
+        edit(other)
+        self.assertTrue(other.save_to_file(filename))
+        return other
+
+    def test_only_changed_collections_are_swapped_in(self):
+        movies = self.manager.collections[1]
+        self.assertIsNone(self.watcher.check())
+        self.rewrite(lambda other: other.add_item("Books", {"name": "Emma", "category": "Book", "price": 2.0}))
+        result = self.watcher.check()
+        self.assertEqual(result, {"added": [], "updated": ["Books"], "removed": [], "conflicts": []})
+        self.assertEqual(self.changes, [result])
+        self.assertIs(self.manager.collections[1], movies)
+        self.assertEqual(len(self.manager.search_items("emma")), 1)
+        self.assertEqual(len(self.manager.item_ids("Books")), 2)
+        self.manager.add_item("Movies", {"name": "Alien", "category": "Movie"})
+        self.assertTrue(self.manager.save_to_file(self.filename))
+        self.assertIsNone(self.watcher.check())
+
+    def test_unsaved_local_changes_are_kept(self):
+        self.manager.add_item("Books", {"name": "Local", "category": "Book"})
+        self.rewrite(lambda other: (other.add_item("Books", {"name": "Remote", "category": "Book"}),
+                                    other.add_item("Music", {"name": "Remote", "category": "Music"})))
+        result = self.watcher.check()
+        self.assertEqual(result["updated"], ["Music"])
+        self.assertEqual(result["conflicts"], ["Books"])
+        self.assertEqual([i["name"] for i in self.manager.get_items_in_collection("Books")], ["Books 1", "Local"])
+        self.assertIsNone(self.watcher.check())
+
+    def rename(self, collection, name, filename=None):
+        """Rename the first item of a collection in the file, leaving item ids as they are."""
+        self.rewrite(lambda other: other.update_item(other.item_ids(collection)[0], {"name": name}), filename)
+
+    def test_only_rewritten_collections_are_decoded(self):
+        decodes = mock.patch.object(json.JSONDecoder, "raw_decode", autospec=True,
+                                    side_effect=json.JSONDecoder.raw_decode)
+        with decodes as raw_decode:
+            self.assertIsNone(self.watcher.check())  # digests taken from the manager's own save
+        self.assertEqual(raw_decode.call_count, 0)
+        self.rename("Books", "Emma")
+        with decodes as raw_decode:
+            self.assertEqual(self.watcher.check()["updated"], ["Books"])
+        self.assertEqual(raw_decode.call_count, 1)
+        self.manager.update_item(self.manager.item_ids("Movies")[0], {"price": 2.0})
+        self.assertTrue(self.manager.save_to_file(self.filename))
+        self.assertIsNone(self.watcher.check())
+        self.rename("Music", "Remote")
+        with decodes as raw_decode:
+            self.assertEqual(self.watcher.check()["updated"], ["Music"])
+        self.assertEqual(raw_decode.call_count, 1)
+
+        snapshot = os.path.join(self.temp_dir.name, "library.tlsnap")
+        self.assertTrue(self.manager.save_to_file(snapshot))
+        watcher = LibraryWatcher(self.manager, snapshot, settle=0)
+        self.assertIsNone(watcher.check())
+        self.rename("Books", "Persuasion", snapshot)
+        with mock.patch("snapshot._unpack_collection", wraps=snapshot_module._unpack_collection) as unpack:
+            self.assertEqual(watcher.check()["updated"], ["Books"])
+        self.assertEqual(unpack.call_count, 1)
+
+    def test_first_check_digests_a_file_it_did_not_write(self):
+        other = CollectionManager(lambda: self.temp_dir.name)
+        self.assertTrue(other.load_from_file(self.filename))
+        watcher = LibraryWatcher(other, self.filename, settle=0)
+        self.assertIsNone(watcher.check())
+        self.rename("Music", "Remote")
+        with mock.patch.object(CollectionManager, "collection_equals", autospec=True,
+                               side_effect=CollectionManager.collection_equals) as compare:
+            self.assertEqual(watcher.check()["updated"], ["Music"])
+        self.assertEqual(compare.call_count, 1)
+        other.close()
+
+    def test_snapshot_collections_added_and_removed(self):
+        snapshot = os.path.join(self.temp_dir.name, "library.tlsnap")
+        self.assertTrue(self.manager.save_to_file(snapshot))
+        watcher = LibraryWatcher(self.manager, snapshot, settle=0)
+        def edit(other):
+            other.replace_collections({"Movies": None}, other.collection_versions())
+            other.add_collection("Games")
+        self.rewrite(edit, snapshot)
+        result = watcher.check()
+        self.assertEqual(result["added"], ["Games"])
+        self.assertEqual(result["removed"], ["Movies"])
+        self.assertEqual([c["name"] for c in self.manager.get_collections()], ["Books", "Music", "Games"])
+        self.assertEqual(self.manager.get_items_in_collection("Music")[0]["name"], "Music 1")
+
+class TestAccessStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.now = 0.0
+        self.filename = os.path.join(self.temp_dir.name, ACCESS_STATS_FILENAME)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_recent_use_outranks_old_use_and_survives_a_restart(self):
+        stats = AccessStats(self.filename, half_life=10.0, clock=lambda: self.now)
+        for _ in range(4):
+            stats.record_collection("Books")
+        stats.record_query("fuzzy", "hary")
+        self.now = 30.0  # Books' four accesses now count as half of one
+        stats.record_collection("Movies")
+        self.assertEqual(stats.hot_collections(5), ["Movies", "Books"])
+        self.assertEqual(stats.hot_collections(1), ["Movies"])
+        self.assertTrue(stats.save())
+        reloaded = AccessStats(self.filename, half_life=10.0, clock=lambda: self.now)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.hot_collections(5), ["Movies", "Books"])
+        self.assertEqual(reloaded.hot_queries(5), [("fuzzy", "hary")])
+        self.now = 1000.0
+        self.assertTrue(reloaded.save())
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.hot_collections(5), [])
+
+    def test_distinct_queries_are_trimmed_as_they_are_recorded(self):
+        stats = AccessStats(self.filename, half_life=10.0, clock=lambda: self.now)
+        for _ in range(3):
+            stats.record_query("search", "emma")
+        for i in range(5 * MAX_QUERIES):
+            self.now += 0.001
+            stats.record_query("fuzzy", str(i))
+            self.assertLessEqual(len(stats._queries), 2 * MAX_QUERIES)
+        self.assertEqual(stats.hot_queries(1), [("search", "emma")])
+        self.assertIn(("fuzzy", str(5 * MAX_QUERIES - 1)), stats.hot_queries(2 * MAX_QUERIES))
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.filename, "w") as f:
+            f.write("{not json")
+        stats = AccessStats(self.filename)
+        self.assertFalse(stats.load())
+        self.assertEqual(stats.hot_collections(3), [])
+
+    def test_controller_warms_up_what_was_used_last_session(self):
+        library = os.path.join(self.temp_dir.name, "library.json")
+        controller = Controller(lambda: self.temp_dir.name, track_access=True)
+        for name in ["Books", "Movies"]:
+            controller.add_collection(name)
+            controller.add_item(name, {"name": f"{name} 1", "category": "Book", "price": 1.0})
+        controller.get_items_in_collection("Movies")
+        controller.fuzzy_search("movis")
+        self.assertTrue(controller.save_to_file(library))
+        controller.close()
+        self.assertTrue(os.path.exists(self.filename))
+
+        controller = Controller(lambda: self.temp_dir.name, track_access=True)
+        manager = controller.collection_manager
+        manager.defer_validation = True
+        self.assertTrue(controller.load_from_file(library))
+        self.assertEqual(manager._unvalidated, {0, 1})
+        self.assertIn("collection:Movies", manager.warm_up(["Movies", "Gone"], []))
+        self.assertEqual(manager._unvalidated, {0})
+        self.assertIsNone(manager._fuzzy_index)
+        self.assertIsNone(controller.warm_up(background=False))
+        self.assertEqual(manager._unvalidated, set())
+        self.assertIsNotNone(manager._fuzzy_index)
+        self.assertEqual(controller.access_stats.hot_collections(5), ["Movies"])
+        controller.close()
+
+        untracked = Controller(lambda: self.temp_dir.name)
+        self.assertIsNone(untracked.access_stats)
+        self.assertIsNone(untracked.warm_up())
+        untracked.close()
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_generated_library_is_reproducible_and_valid(self):
+        first = generate_library(3, 200, (1, 4), zipf_weights(CATEGORIES, 2.0), seed=7)
+        self.assertEqual(first, generate_library(3, 200, (1, 4), zipf_weights(CATEGORIES, 2.0), seed=7))
+        self.assertNotEqual(first, generate_library(3, 200, (1, 4), zipf_weights(CATEGORIES, 2.0), seed=8))
+        for collection in first:
+            collection_validator.validate(collection)
+        categories = [item["category"] for collection in first for item in collection["items"]]
+        self.assertGreater(categories.count("Book"), categories.count("Movie"))
+        self.assertTrue(all(2 <= len(item["name"].split()) <= 5 for item in first[0]["items"]))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = install(CollectionManager(lambda: temp_dir), first)
+            self.assertTrue(manager.add_item("Collection 0", {"name": "Extra", "category": "Book"}))
+            self.assertEqual(len(manager.item_ids("Collection 0")), 201)
+            manager.close()
+
+    def test_parallel_search_benchmark_library_has_item_ids(self):
+        manager = build_manager(40, 4, seed=3)
+        try:
+            ids = manager.item_ids("Collection 2")
+            self.assertEqual(len(ids), 10)
+            self.assertTrue(manager.update_item(ids[0], {"price": 1.0}))
+            self.assertTrue(manager.delete_item(ids[1]))
+            self.assertTrue(manager.add_item("Collection 2", {"name": "Extra", "category": "Book"}))
+            current = manager.item_ids("Collection 2")
+            self.assertEqual(current[:-1], ids[:1] + ids[2:])
+            self.assertNotIn(current[-1], ids)
+        finally:
+            manager.close()
+
+    def test_compare_flags_only_real_slowdowns(self):
+        baseline = {"model.add_item@1000": 1e-5, "model.search_items@1000": 1e-3, "model.gone@1000": 1.0}
+        current = {"model.add_item@1000": 1.5e-5, "model.search_items@1000": 1.5e-3, "model.new@1000": 1.0}
+        self.assertEqual(compare_results(current, baseline, 0.2),
+                         [("model.add_item@1000", 1e-5, 1.5e-5), ("model.search_items@1000", 1e-3, 1.5e-3)])
+        self.assertEqual(compare_results(current, baseline, 0.6), [])
+        self.assertEqual(compare_results(current, baseline, 0.2, noise_floor=1e-4),
+                         [("model.search_items@1000", 1e-3, 1.5e-3)])
+
+class TestOperationProfiler(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.profiles = os.path.join(self.temp_dir.name, "profiles")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def reports(self):
+        return sorted(os.listdir(self.profiles)) if os.path.isdir(self.profiles) else []
+
+    def test_operations_are_profiled_only_while_enabled(self):
+        controller = Controller(lambda: self.temp_dir.name)
+        controller.add_collection("Books")
+        controller.add_item("Books", {"name": "Emma", "category": "Book", "price": 4.0})
+        self.assertEqual(self.reports(), [])
+        self.assertTrue(controller.enable_profiling())
+        self.assertEqual(len(controller.search_items("emma")), 1)
+        reports = self.reports()
+        self.assertEqual([name.split("-")[-1] for name in reports], ["search_items.alloc.txt", "search_items.prof"])
+        stats = pstats.Stats(os.path.join(self.profiles, reports[1]))
+        self.assertTrue(any(function[2] == "search_items" for function in stats.stats))
+        with open(os.path.join(self.profiles, reports[0])) as f:
+            self.assertTrue(f.readline().startswith("search_items: "))
+        controller.disable_profiling()
+        controller.search_items("emma")
+        self.assertEqual(self.reports(), reports)
+        controller.close()
+
+    def test_reports_are_bounded_and_overlapping_calls_skipped(self):
+        profiler = OperationProfiler(self.profiles, max_reports=3)
+        profiler.enable(cpu=True, memory=False)
+        for i in range(5):
+            self.assertEqual(profiler.run("outer", lambda i=i: profiler.run("inner", lambda: i)), i)
+        profiler.disable()
+        self.assertEqual(len(self.reports()), 3)
+        self.assertTrue(all(name.endswith("-outer.prof") for name in self.reports()))
+        self.assertEqual((profiler.reports, profiler.skipped), (5, 5))
+
+    def test_enabled_from_environment_and_cli(self):
+        previous = os.environ.get(PROFILE_ENV)
+        os.environ[PROFILE_ENV] = "memory"
+        try:
+            controller = Controller(lambda: self.temp_dir.name)
+        finally:
+            if previous is None:
+                del os.environ[PROFILE_ENV]
+            else:
+                os.environ[PROFILE_ENV] = previous
+        self.assertEqual((controller.profiler.cpu, controller.profiler.memory), (False, True))
+        controller.get_collections()
+        controller.close()
+        self.assertEqual([name.split("-")[-1] for name in self.reports()], ["get_collections.alloc.txt"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(cli.main(["--data-dir", self.temp_dir.name, "--profile", "cpu", "stats"]), 0)
+        self.assertTrue(any(name.endswith(".prof") for name in self.reports()))
+
+class TestFacetedSearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = CollectionManager(lambda: self.temp_dir.name)
+        self.manager.add_collection("Shelf")
+        self.manager.add_collection("Attic")
+        for name, category in [("Star Wars", "Movie"), ("Star Trek", "Movie"), ("Dune", "Book")]:
+            self.manager.add_item("Shelf", {"name": name, "category": category, "price": 1.0})
+        self.manager.add_item("Attic", {"name": "Star Maps", "category": "Book", "price": 2.0})
+
+    def tearDown(self):
+        self.manager.close()
+        self.temp_dir.cleanup()
+
+    def test_counts_filters_and_pages(self):
+        result = self.manager.faceted_search("star", limit=2)
+        self.assertEqual(result["facets"], {"Movie": 2, "Book": 1})
+        self.assertEqual(result["total"], 3)
+        self.assertEqual([i["name"] for i in result["items"]], ["Star Wars", "Star Trek"])
+        result = self.manager.faceted_search("star", category="book")
+        self.assertEqual([i["name"] for i in result["items"]], ["Star Maps"])
+        self.assertEqual(result["facets"], {"Movie": 2, "Book": 1})
+        self.assertEqual(self.manager.faceted_search("star", category="Game")["total"], 0)
+        self.assertEqual(self.manager.faceted_search("star", offset=-1), {"items": [], "total": 0, "facets": {}})
+
+    def test_index_follows_inserts_into_earlier_collections(self):
+        self.manager.faceted_search("star")
+        self.manager.add_item("Shelf", {"name": "Star Guide", "category": "Book", "price": 3.0})
+        result = self.manager.faceted_search("star", category="Book")
+        self.assertEqual([i["name"] for i in result["items"]], ["Star Guide", "Star Maps"])
+        self.assertEqual(result["facets"], {"Book": 2, "Movie": 2})
+        self.assertEqual([i["name"] for i in self.manager.query({"category": "Book"})],
+                         ["Dune", "Star Guide", "Star Maps"])
+        self.manager.delete_item(self.manager.item_ids("Shelf")[0])
+        self.assertEqual(self.manager.faceted_search("star")["facets"], {"Book": 2, "Movie": 1})
+
+    def test_fuzzy_hits_keep_their_rank(self):
+        result = self.manager.faceted_search("star wrs", fuzzy=True)
+        self.assertEqual(result["items"][0]["name"], "Star Wars")
+        self.assertEqual(sum(result["facets"].values()), result["total"])
+        filtered = self.manager.faceted_search("star wrs", category="Movie", fuzzy=True)
+        self.assertEqual(filtered["items"][0]["name"], "Star Wars")
+        self.assertTrue(all(i["category"] == "Movie" for i in filtered["items"]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
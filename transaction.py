@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Tuple
+
+from logger import logger
+
+# A staged mutation: ("add_collection", name) or ("add_item", collection name, item).
+Operation = Tuple[Any, ...]
+
+
+class TransactionError(ValueError):
+    """A transaction was rejected; none of its operations were applied."""
+
+
+class Transaction:
+    """
+    Stages library mutations and applies them together.
+
+    Nothing touches the library until commit(). The staged operations are then
+    validated as a whole and applied by CollectionManager.apply_batch under its
+    lock: all of them or, on any error, none. Listeners hear about each changed
+    collection once. Usually obtained from Controller.transaction().
+    """
+
+    def __init__(self, manager: Any) -> None:
+        self.manager = manager
+        self.operations: List[Operation] = []
+        self.committed: bool = False
+        self.result: Dict[str, int] = {"collections": 0, "items": 0}
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def add_collection(self, name: str) -> None:
+        """Stage the creation of a collection."""
+        self._check_open()
+        self.operations.append(("add_collection", name))
+
+    def add_item(self, collection_name: str, item: Dict[str, Any]) -> None:
+        """Stage adding an item. The item is copied, so later changes to it are not committed."""
+        self._check_open()
+        self.operations.append(("add_item", collection_name, dict(item) if isinstance(item, dict) else item))
+
+    def commit(self) -> Dict[str, int]:
+        """
+        Validate and apply every staged operation at once.
+
+        Returns:
+            Dict[str, int]: The number of "collections" and "items" added, also kept in `result`.
+
+        Raises:
+            TransactionError: If any operation is invalid; the library is left unchanged.
+        """
+        self._check_open()
+        self.committed = True
+        self.result = self.manager.apply_batch(self.operations)
+        return self.result
+
+    def rollback(self) -> None:
+        """Discard the staged operations."""
+        if not self.committed and self.operations:
+            logger.info(f"Transaction rolled back: {len(self.operations)} staged operations discarded")
+        self.operations = []
+        self.committed = True
+
+    def _check_open(self) -> None:
+        if self.committed:
+            raise TransactionError("Transaction is already finished")